@@ -50,7 +50,7 @@ def get_resource_and_connected_resources(uri):
 
 karlsruhe_uri = "http://dbpedia.org/resource/Karlsruhe"
 karlsruhe = get_resource_and_connected_resources(uri=karlsruhe_uri)
-print("Print Karlsruhe Resource object --> Number of properties:", len(karlsruhe.__dict__.keys()))
+print("Print Karlsruhe Resource object --> Number of properties:", len(karlsruhe.get_properties()))
 
 print("Karlsruhe rdf:type s:")
 for typ in list(karlsruhe.rdf_type):
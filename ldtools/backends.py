@@ -1,19 +1,29 @@
 # -*- coding: utf-8 -*-
 from ldtools import __version__, url, author_email
 
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
 import datetime
 import logging
 import mimetypes
 import os
 import shutil
 import socket
+import time
 import rdflib
+import six
+from six.moves import http_client
 
+from ldtools import serializers
+from ldtools.connectionpool import (
+    ConnectionPool, DeadlineExceeded, KeepAliveHandler
+)
+from ldtools.crawler import CircuitBreaker
 from ldtools.utils import urllib2
 
-# set socket timeout. URLError will occur if time passed
-socket.setdefaulttimeout(5)
-
 __useragent__ = 'ldtools-{version} ({url}, {author_email})'.format(
     version=__version__, url=url, author_email=author_email
 )
@@ -32,6 +42,15 @@ class ContentNegotiationError(Exception):
     pass
 
 
+class ResponseSizeLimitExceeded(Exception):
+    "The document is bigger than the max_bytes passed to GET"
+
+
+# Returned by GET(conditional=True) if the data did not change since the
+# last GET of the backend
+NOT_MODIFIED = object()
+
+
 logger = logging.getLogger("ldtools")
 
 
@@ -55,12 +74,88 @@ def guess_format_from_filename(file_name):
         return file_extension
 
 
+class SizeLimitedReader(object):
+    """Reads from fp and raises ResponseSizeLimitExceeded as soon as
+    more than max_bytes were read"""
+
+    def __init__(self, fp, max_bytes):
+        self.fp = fp
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def _count(self, data):
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_bytes:
+            self.close()
+            raise ResponseSizeLimitExceeded(
+                "More than %s bytes" % self.max_bytes)
+        return data
+
+    def read(self, amt=None):
+        if amt is not None:
+            return self._count(self.fp.read(amt))
+        chunks = []
+        while True:
+            chunk = self._count(
+                self.fp.read(self.max_bytes - self.bytes_read + 1))
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def readline(self, *args):
+        return self._count(self.fp.readline(*args))
+
+    def close(self):
+        self.fp.close()
+
+
+def is_streamed(data):
+    """PUT accepts the document or an iterable of encoded chunks"""
+    return not isinstance(data, (bytes, unicode))
+
+
+def patch_document(data, format, uri, added, removed):
+    """Returns the utf-8 encoded document data with the triples removed
+    and added"""
+    graph = rdflib.Graph()
+    if data:
+        graph.parse(data=data, format=format, publicID=uri)
+    for triple in removed:
+        graph.remove(triple)
+    for triple in added:
+        graph.add(triple)
+    return graph.serialize(format=format, encoding="utf-8")
+
+
 class AbstractBackend(object):
     """Abstract Backend. Overwrite in subclasses"""
-    pass
+
+    # True if PATCH(added, removed) can be used instead of PUT to store
+    # only the changed triples
+    supports_patch = False
 
 
 class RestBackend(AbstractBackend):
+    # shared by all RestBackend instances: Origins on the same host reuse
+    # keep-alive connections. Replace to configure size and idle timeout
+    connection_pool = ConnectionPool()
+
+    # shared as well: once a host failed repeatedly, the requests of all
+    # Origins on it fail fast with crawler.HostUnavailable. None disables it
+    circuit_breaker = CircuitBreaker()
+
+    # seconds to wait for the connection and the response headers, for
+    # every read of the body and for the whole GET including the body.
+    # URLError or DeadlineExceeded are raised when they pass, None waits
+    # forever
+    connect_timeout = 5
+    read_timeout = 5
+    request_timeout = 60
+
+    # an ldtools.httpcache.HTTPCache shared by all RestBackend instances.
+    # Fresh responses are served from it without a request
+    cache = None
+
     GET_headers = {
         'User-agent': __useragent__,
         'Accept': (
@@ -76,13 +171,34 @@ class RestBackend(AbstractBackend):
 
     PUT_headers = {"User-Agent": __useragent__}
 
+    # not every server understands SPARQL Update, enable per instance or
+    # subclass
+    supports_patch = False
+    patch_method = "PATCH"
+
+    def get_opener(self):
+        return urllib2.build_opener(KeepAliveHandler(self.connection_pool))
+
     def GET(
         self,
         uri,
         extra_headers=None,
         httphandler=None,
+        conditional=False,
+        stream=False,
+        max_bytes=None,
     ):
-        """Lookup URI and follow redirects. Return data"""
+        """Lookup URI and follow redirects. Return data.
+
+        conditional sends the validators of the last response and returns
+        NOT_MODIFIED if the server answers 304 Not Modified. With a cache,
+        fresh responses are not requested again and stale ones are
+        revalidated.
+
+        stream returns a file-like object to read the document from instead
+        of the document. Documents bigger than max_bytes raise
+        ResponseSizeLimitExceeded, before the download if the server sends
+        a Content-Length"""
 
         if not hasattr(self, "uri"):
             self.uri = uri
@@ -97,19 +213,56 @@ class RestBackend(AbstractBackend):
             else:
                 opener = urllib2.build_opener(httphandler)
         else:
-            opener = urllib2.build_opener()
+            opener = self.get_opener()
 
         if extra_headers:
             self.GET_headers.update(extra_headers)
 
         reference_time = datetime.datetime.now()
 
-        request = urllib2.Request(url=uri, headers=self.GET_headers)
-
+        headers = dict(self.GET_headers)
+
+        # debugging handlers always see the request
+        cache = self.cache if not httphandler else None
+        entry = None
+        if cache is not None:
+            entry = cache.get(uri, headers)
+            if entry is not None and entry.is_fresh(headers):
+                logger.info("%s is fresh in the HTTP cache" % uri)
+                return self._cached_response(
+                    entry, conditional, stream, max_bytes)
+
+        validators = entry.validators() if entry is not None else {}
+        if validators:
+            headers.update(validators)
+        elif conditional:
+            if getattr(self, "etag", None):
+                headers["If-None-Match"] = self.etag
+            if getattr(self, "last_modified", None):
+                headers["If-Modified-Since"] = self.last_modified
+
+        request = urllib2.Request(url=uri, headers=headers)
+        request.read_timeout = self.read_timeout
+        if self.request_timeout is not None:
+            request.deadline = time.time() + self.request_timeout
+
+        request_time = time.time()
         try:
-            resultF = opener.open(request)
+            resultF = self._open(opener, request)
         except (UnicodeEncodeError, socket.timeout):
             return None
+        except urllib2.HTTPError as e:
+            if e.code == 304 and validators:
+                e.close()
+                logger.info("%s was revalidated" % uri)
+                entry = cache.revalidate(entry, e.info(), request_time)
+                return self._cached_response(
+                    entry, conditional, stream, max_bytes)
+            if e.code == 304 and conditional:
+                e.close()
+                logger.info("%s was not modified" % uri)
+                return NOT_MODIFIED
+            raise
 
         now = datetime.datetime.now()
         self.lookup_time = now - reference_time
@@ -119,6 +272,87 @@ class RestBackend(AbstractBackend):
                 "%s was redirected. Content url: %r" % (
                     uri, resultF.geturl()))
 
+        try:
+            self.format = self._get_format(resultF)
+        except Exception:
+            # do not leave the pooled connection dangling
+            resultF.close()
+            raise
+
+        self.etag = resultF.headers.get("ETag")
+        self.last_modified = resultF.headers.get("Last-Modified")
+
+        content_length = resultF.headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit():
+            if max_bytes is not None and int(content_length) > max_bytes:
+                resultF.close()
+                raise ResponseSizeLimitExceeded(
+                    "Content-Length of %s is %s bytes, limit is %s" % (
+                        uri, content_length, max_bytes))
+            if int(content_length) == 0:
+                resultF.read()
+                return b""
+
+        if cache is not None:
+            resultF = cache.store(uri, headers, resultF, request_time)
+        if max_bytes is not None:
+            resultF = SizeLimitedReader(resultF, max_bytes)
+        if stream:
+            return resultF
+        return resultF.read()
+
+    def _open(self, opener, request):
+        """Opens request and tells the circuit_breaker whether the host
+        answered"""
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return opener.open(request, timeout=self.connect_timeout)
+
+        uri = request.get_full_url()
+        breaker.before_request(uri)
+        try:
+            response = opener.open(request, timeout=self.connect_timeout)
+        except urllib2.HTTPError as e:
+            if e.code >= 500:
+                breaker.failed(uri)
+            else:
+                breaker.succeeded(uri)
+            raise
+        except (urllib2.URLError, socket.error, http_client.HTTPException):
+            # includes socket.timeout
+            breaker.failed(uri)
+            raise
+        except Exception:
+            breaker.cancelled(uri)
+            raise
+        breaker.succeeded(uri)
+        return response
+
+    def _cached_response(self, entry, conditional, stream, max_bytes):
+        """Returns the body of the HTTPCache entry like GET returns the
+        body of a response"""
+        self.lookup_time = datetime.timedelta(0)
+        self.format = self._get_format(entry)
+
+        validators = (getattr(self, "etag", None),
+                      getattr(self, "last_modified", None))
+        self.etag = entry.headers.get("ETag")
+        self.last_modified = entry.headers.get("Last-Modified")
+        if conditional and any(validators) and validators == (
+                self.etag, self.last_modified):
+            # this backend returned the same response before
+            return NOT_MODIFIED
+
+        if max_bytes is not None and entry.size > max_bytes:
+            raise ResponseSizeLimitExceeded(
+                "%s is %s bytes, limit is %s" % (
+                    entry.url, entry.size, max_bytes))
+        if stream:
+            return entry.open()
+        return entry.read()
+
+    def _get_format(self, resultF):
+        """Maps the response's Content-Type to a rdflib parser format"""
         if "Content-Length" in resultF.headers:
             logger.info(
                 "Content-Length: %s" % resultF.headers["Content-Length"])
@@ -154,28 +388,63 @@ class RestBackend(AbstractBackend):
         # check if rdflib parser exists for format
         assure_parser_plugin_exists(format)
 
-        self.format = format
-        return resultF.read()
+        return format
 
     def PUT(self, data):
         assert self.uri, "GET has to be called before PUT possible"
 
-        self.PUT_headers.update({
-            "Content-Type": self.content_type,
-            "Content-Length": str(len(data)),
-        })
+        headers = dict(self.PUT_headers)
+        headers["Content-Type"] = self.content_type
+
+        if is_streamed(data) and six.PY2:
+            # httplib cannot send chunked requests
+            data = b"".join(data)
+        if isinstance(data, unicode):
+            data = data.encode("utf8")
+        if not is_streamed(data):
+            headers["Content-Length"] = str(len(data))
+        # else: urllib2 sends the chunks with chunked transfer encoding
 
-        opener = urllib2.build_opener(urllib2.HTTPHandler)
         request = urllib2.Request(self.uri,
                                   data=data,
-                                  headers=self.PUT_headers)
+                                  headers=headers)
         request.get_method = lambda: 'PUT'
-        response = opener.open(request)
+        request.read_timeout = self.read_timeout
+        response = self.get_opener().open(request,
+                                          timeout=self.connect_timeout)
+        # read the answer to hand the connection back to the pool
+        response.read()
+        if self.cache is not None:
+            self.cache.invalidate(self.uri)
+        return response
+
+    def PATCH(self, added, removed):
+        """Sends the changed triples as SPARQL Update. Set supports_patch
+        if the server accepts patch_method requests with
+        application/sparql-update bodies"""
+        assert self.uri, "GET has to be called before PATCH possible"
+
+        data = serializers.sparql_update(added=added, removed=removed)
+        headers = dict(self.PUT_headers)
+        headers.update({
+            "Content-Type": "application/sparql-update",
+            "Content-Length": str(len(data)),
+        })
+
+        request = urllib2.Request(self.uri, data=data, headers=headers)
+        request.get_method = lambda: self.patch_method
+        request.read_timeout = self.read_timeout
+        response = self.get_opener().open(request,
+                                          timeout=self.connect_timeout)
+        response.read()
+        if self.cache is not None:
+            self.cache.invalidate(self.uri)
         return response
 
 
 class FileBackend(AbstractBackend):
     """Manages one xml file as a data basis"""
+    supports_patch = True
 
     def __init__(self, filename,
                  format=None,
@@ -193,6 +462,9 @@ class FileBackend(AbstractBackend):
             uri,
             extra_headers=None,
             httphandler=None,
+            conditional=False,
+            stream=False,
+            max_bytes=None,
             ):
         assert not extra_headers, "Not Implemented"
         assert not httphandler, "Not Implemented"
@@ -203,6 +475,20 @@ class FileBackend(AbstractBackend):
                 raise Exception("You cannot pass different uris to the same "
                                 "backend")
 
+        mtime = os.path.getmtime(self.filename)
+        if conditional and mtime == getattr(self, "mtime", None):
+            return NOT_MODIFIED
+
+        if max_bytes is not None:
+            size = os.path.getsize(self.filename)
+            if size > max_bytes:
+                raise ResponseSizeLimitExceeded(
+                    "%s is %s bytes, limit is %s" % (
+                        self.filename, size, max_bytes))
+
+        self.mtime = mtime
+        if stream:
+            return open(self.filename, "rb")
         with open(self.filename, "r") as f:
             data = f.read()
         return data
@@ -224,8 +510,19 @@ class FileBackend(AbstractBackend):
             self.old_version = old_version
             shutil.copy(self.filename, old_version)
 
-        with open(self.filename, "w") as f:
-            f.write(data)
+        if not is_streamed(data):
+            data = [data]
+        with open(self.filename, "wb") as f:
+            for chunk in data:
+                if isinstance(chunk, unicode):
+                    chunk = chunk.encode("utf8")
+                f.write(chunk)
+
+    def PATCH(self, added, removed):
+        with open(self.filename, "rb") as f:
+            data = f.read()
+        self.PUT(data=patch_document(data, self.format, self.uri,
+                                     added=added, removed=removed))
 
     def revert_to_old_version(self):
         assert self.store_old_versions, (
@@ -238,6 +535,8 @@ class FileBackend(AbstractBackend):
 
 
 class MemoryBackend(AbstractBackend):
+    supports_patch = True
+
     def __init__(self, data=None, format="xml"):
         self.data = data if data else ""
         assure_parser_plugin_exists(format)
@@ -247,10 +546,27 @@ class MemoryBackend(AbstractBackend):
             uri,
             extra_headers=None,
             httphandler=None,
+            conditional=False,
+            stream=False,
+            max_bytes=None,
             ):
         assert not extra_headers, "Not Implemented"
         assert not httphandler, "Not Implemented"
+        if max_bytes is not None and len(self.data) > max_bytes:
+            raise ResponseSizeLimitExceeded(
+                "Data is %s bytes, limit is %s" % (len(self.data), max_bytes))
+        # data is replaced, never modified --> identity means unchanged
+        if conditional and self.data is getattr(self, "_last_data", None):
+            return NOT_MODIFIED
+        self._last_data = self.data
+        self.uri = uri
         return self.data
 
     def PUT(self, data):
+        if is_streamed(data):
+            data = b"".join(data)
         self.data = data
+
+    def PATCH(self, added, removed):
+        self.data = patch_document(self.data, self.format, self.uri,
+                                   added=added, removed=removed)
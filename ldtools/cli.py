@@ -2,7 +2,6 @@ from __future__ import print_function
 
 import logging
 import pprint
-import datetime
 import sys
 
 import argparse
@@ -13,10 +12,14 @@ from ldtools.utils import (
     get_rdflib_uriref,
     urllib2,
 )
+from ldtools.crawler import CrawlFrontier, HostScheduler
 from ldtools.helpers import set_colored_logger
-from ldtools.backends import __version__
+from ldtools.backends import __version__, RestBackend
+from ldtools.httpcache import HTTPCache
 from ldtools.origin import Origin
+from ldtools.parsing import GraphCache, ParsePool
 from ldtools.resource import Resource
+from ldtools.storage import open_sqlite
 
 logger = logging.getLogger("ldtools.cli")
 
@@ -33,6 +36,35 @@ def get_parser():
     parser.add_argument(
         '-d', '--depth', action="store", default=0, type=int,
         help="Crawl discovered Origins x times")
+    parser.add_argument(
+        '-w', '--workers', action="store", default=1, type=int,
+        help="Number of Origins fetched concurrently while crawling")
+    parser.add_argument(
+        '--host-concurrency', action="store", type=int,
+        help="Fetch at most x Origins of the same host concurrently")
+    parser.add_argument(
+        '--host-delay', action="store", type=float,
+        help="Wait at least x seconds between requests to the same host")
+    parser.add_argument(
+        '--robots', action="store_true",
+        help="Respect the Crawl-delay of the hosts' robots.txt")
+    parser.add_argument(
+        '--parse-processes', action="store", default=0, type=int,
+        help="Parse documents in a pool of x processes")
+    parser.add_argument(
+        '--store', action="store", metavar="PATH",
+        help="Keep Origins and Resources in the SQLite database PATH. "
+             "Continues the crawl stored there")
+    parser.add_argument(
+        '--lazy', action="store_true",
+        help="Build Resources from the crawled graphs only when accessed")
+    parser.add_argument(
+        '--http-cache', action="store", metavar="DIR",
+        help="Cache HTTP responses in DIR, fresh ones are not fetched again")
+    parser.add_argument(
+        '--graph-cache', action="store", metavar="DIR",
+        help="Cache parsed graphs in DIR, documents parsed before are not "
+             "parsed again")
 
     follow_group = parser.add_mutually_exclusive_group()
     follow_group.add_argument(
@@ -52,8 +84,14 @@ def get_parser():
         '--only-print-uri-content', action="store_true",
         help='Only prints data retrieved from URIs and exists')
     parser.add_argument(
-        '--socket-timeout', action="store", type=int,
-        help="Set the socket timeout")
+        '--socket-timeout', action="store", type=float,
+        help="Seconds to wait for a connection and for every read")
+    parser.add_argument(
+        '--request-timeout', action="store", type=float,
+        help="Seconds a single GET may take including the download")
+    parser.add_argument(
+        '--crawl-timeout', action="store", type=float,
+        help="Do not start new GETs x seconds after the crawl started")
     parser.add_argument(
         '-o', '--only-negotiate', action="store_true",
         help='Only do content negotiation for given URIs and print the '
@@ -77,9 +115,20 @@ def execute_ldtools(
     verbosity,
     origin_urls,
     depth,
+    workers,
+    host_concurrency,
+    host_delay,
+    robots,
+    parse_processes,
+    store,
+    lazy,
+    http_cache,
+    graph_cache,
     follow_all,
     follow_uris,
     socket_timeout,
+    request_timeout,
+    crawl_timeout,
     GRAPH_SIZE_LIMIT,
     print_all_resources,
     only_print_uris,
@@ -88,12 +137,6 @@ def execute_ldtools(
 ):
     set_colored_logger(verbosity)
 
-    # customize Origin.objects.post_create_hook for performance reasons
-    def custom_post_create_hook(origin):
-        origin.timedelta = datetime.timedelta(minutes=5)
-        return origin
-    Origin.objects.post_create_hook = custom_post_create_hook
-
     url_count = len(origin_urls)
 
     if url_count > 1:
@@ -110,14 +153,34 @@ def execute_ldtools(
         only_follow_uris = []
 
     if socket_timeout:
-        import socket
         logger.info("Setting socket timeout to %s" % socket_timeout)
-        socket.setdefaulttimeout(socket_timeout)
-
-    kw = dict(raise_errors=False)
+        RestBackend.connect_timeout = socket_timeout
+        RestBackend.read_timeout = socket_timeout
+    if request_timeout:
+        RestBackend.request_timeout = request_timeout
+
+    if http_cache:
+        logger.info("Caching HTTP responses in %s" % http_cache)
+        RestBackend.cache = HTTPCache(http_cache)
+
+    kw = dict()
+    if crawl_timeout:
+        kw["crawl_timeout"] = crawl_timeout
     if GRAPH_SIZE_LIMIT:
         kw["GRAPH_SIZE_LIMIT"] = GRAPH_SIZE_LIMIT
 
+    if store:
+        logger.info("Using the store %s" % store)
+        open_sqlite(store)
+
+    # the seed urls are depth 0, discovered Origins are crawled once each
+    frontier = CrawlFrontier()
+    if store:
+        # Origins discovered by an earlier run are crawled first
+        for origin in Origin.objects.all():
+            if not origin.processed:
+                frontier.add(origin, depth=0)
+
     for url in origin_urls:
         url = get_slash_url(url)
         origin, created = Origin.objects.get_or_create(url)
@@ -134,15 +197,35 @@ def execute_ldtools(
             if only_print_uri_content:
                 print('\n', data, '\n')
         else:
-            origin.GET(only_follow_uris=only_follow_uris, **kw)
+            frontier.add(origin, depth=0)
 
     if only_negotiate or only_print_uri_content:
         sys.exit(0)
 
-    if depth:
-        for round in range(depth):
-            for origin in Origin.objects.all():
-                origin.GET(only_follow_uris=only_follow_uris, **kw)
+    if lazy:
+        kw["lazy"] = True
+
+    if graph_cache:
+        kw["graph_cache"] = GraphCache(graph_cache)
+
+    if host_concurrency or host_delay or robots:
+        kw["scheduler"] = HostScheduler(concurrency=host_concurrency or 1,
+                                        delay=host_delay or 0,
+                                        robots=robots)
+
+    if parse_processes:
+        kw["parse_pool"] = ParsePool(processes=parse_processes)
+
+    try:
+        Origin.objects.GET_all(
+            depth=depth + 1, workers=workers, frontier=frontier,
+            only_follow_uris=only_follow_uris, **kw)
+    finally:
+        if "parse_pool" in kw:
+            kw["parse_pool"].shutdown()
+        if store:
+            Origin.objects.flush()
+            Resource.objects.flush()
 
     for orig_url in origin_urls:
         url = get_slash_url(orig_url)
@@ -151,11 +234,7 @@ def execute_ldtools(
             if r._uri == get_rdflib_uriref(orig_url):
                 logger.info(u"Printing all available information "
                     "about {0}".format(r._uri))
-                if hasattr(r, "_has_changes"):
-                    delattr(r, "_has_changes")
-                if hasattr(r, "pk"):
-                    delattr(r, "pk")
-                pprint.pprint(r.__dict__)
+                pprint.pprint(r.as_dict())
 
     if print_all_resources:
         all_resources = Resource.objects.all()
@@ -164,11 +243,7 @@ def execute_ldtools(
                 print(resource)
         else:
             for r in all_resources:
-                if hasattr(r, "_has_changes"):
-                    delattr(r, "_has_changes")
-                if hasattr(r, "pk"):
-                    delattr(r, "pk")
-                pprint.pprint(r.__dict__)
+                pprint.pprint(r.as_dict())
 
 
 def main():
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+
+import logging
+import socket
+import threading
+import time
+
+from six.moves import http_client
+
+from ldtools.utils import urllib2
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """Keeps idle keep-alive connections per scheme and host.
+
+    maxsize is the number of idle connections kept per host, connections
+    idle for longer than idle_timeout seconds are closed instead of being
+    reused"""
+
+    def __init__(self, maxsize=4, idle_timeout=30):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @property
+    def stats(self):
+        return dict(created=self.created,
+                    reused=self.reused,
+                    discarded=self.discarded)
+
+    def get(self, scheme, host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """Returns an idle connection to host or a new one and whether the
+        connection was reused"""
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get((scheme, host), [])
+            while idle:
+                conn, released = idle.pop()
+                if now - released > self.idle_timeout:
+                    conn.close()
+                    self.discarded += 1
+                    continue
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(
+                        None if timeout is socket._GLOBAL_DEFAULT_TIMEOUT
+                        else timeout)
+                self.reused += 1
+                return conn, True
+            self.created += 1
+
+        if scheme == "https":
+            conn = http_client.HTTPSConnection(host, timeout=timeout)
+        else:
+            conn = http_client.HTTPConnection(host, timeout=timeout)
+        return conn, False
+
+    def release(self, scheme, host, conn):
+        """Hands a connection with a completely read response back"""
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host), [])
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+                return
+            self.discarded += 1
+        conn.close()
+
+    def discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        conn.close()
+
+    def clear(self):
+        """Closes all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _released in connections:
+                conn.close()
+
+
+class DeadlineExceeded(socket.timeout):
+    "The request took longer than its deadline"
+
+
+class Deadline(object):
+    """Shuts the connection down once the deadline (a time.time() value)
+    passed. Unlike socket timeouts, this also ends responses sent so
+    slowly that every single read finishes in time"""
+
+    def __init__(self, conn, deadline):
+        self.expired = False
+        self._conn = conn
+        self._timer = threading.Timer(max(0, deadline - time.time()),
+                                      self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        self.expired = True
+        sock = self._conn.sock
+        if sock is not None:
+            try:
+                # wakes up a blocked read in the other thread
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def cancel(self):
+        self._timer.cancel()
+
+
+class PooledResponse(object):
+    """File-like response that hands its connection back to the pool as
+    soon as the body was read completely"""
+
+    def __init__(self, response, url, release, discard, deadline=None):
+        self._response = response
+        self._release = release
+        self._discard = discard
+        self._deadline = deadline
+        self._done = False
+        self.url = url
+        self.code = self.status = response.status
+        self.msg = response.reason
+        self.headers = response.msg
+
+    def _check_done(self):
+        if (not self._done and self._deadline is not None and
+                self._deadline.expired):
+            # also responses without length end early when shut down
+            self.close()
+            raise DeadlineExceeded("Deadline of %s exceeded" % self.url)
+        if not self._done and self._response.isclosed():
+            self._done = True
+            if self._deadline is not None:
+                self._deadline.cancel()
+            if self._response.will_close:
+                self._discard()
+            else:
+                self._release()
+
+    def read(self, amt=None):
+        try:
+            if amt is None:
+                data = self._response.read()
+            else:
+                data = self._response.read(amt)
+        except (socket.error, http_client.HTTPException):
+            # the deadline shut the connection down
+            self._check_done()
+            raise
+        self._check_done()
+        return data
+
+    def readline(self, *args):
+        try:
+            line = self._response.readline(*args)
+        except (socket.error, http_client.HTTPException):
+            self._check_done()
+            raise
+        self._check_done()
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.code
+
+    def close(self):
+        if self._done:
+            return
+        if self._deadline is not None:
+            self._deadline.cancel()
+        if self._response.length == 0 and not (
+                self._deadline is not None and self._deadline.expired):
+            # empty bodies (304, 204, redirects) are drained for free
+            self._response.read()
+            self._check_done()
+            return
+        self._done = True
+        self._response.close()
+        self._discard()
+
+
+class KeepAliveHandler(urllib2.HTTPHandler):
+    """urllib2 handler that sends http and https requests over connections
+    taken from a ConnectionPool"""
+    handler_order = 400
+
+    def __init__(self, pool, debuglevel=0):
+        urllib2.HTTPHandler.__init__(self, debuglevel=debuglevel)
+        self.pool = pool
+
+    def http_open(self, req):
+        return self._open("http", req)
+
+    def https_open(self, req):
+        return self._open("https", req)
+
+    https_request = urllib2.AbstractHTTPHandler.do_request_
+
+    def _open(self, scheme, req):
+        host = req.host if hasattr(req, "host") else req.get_host()
+        selector = (req.selector if hasattr(req, "selector")
+                    else req.get_selector())
+        data = req.data if hasattr(req, "data") else req.get_data()
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict(
+            (k, v) for k, v in req.headers.items() if k not in headers))
+        headers["Connection"] = "keep-alive"
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        # a streamed body is consumed by the first attempt, it is not resent
+        kwargs = {}
+        if headers.get("Transfer-Encoding") == "chunked":
+            kwargs["encode_chunked"] = True
+
+        # set on the request by RestBackend: the socket timeout while
+        # reading the body and the time.time() the request has to be done
+        read_timeout = getattr(req, "read_timeout", None)
+        deadline_time = getattr(req, "deadline", None)
+
+        for attempt in range(2):
+            conn, reused = self.pool.get(scheme, host, timeout=req.timeout)
+            conn.set_debuglevel(self._debuglevel)
+            deadline = (Deadline(conn, deadline_time)
+                        if deadline_time is not None else None)
+            try:
+                conn.request(req.get_method(), selector, data, headers,
+                             **kwargs)
+                response = conn.getresponse()
+            except socket.timeout as e:
+                self.pool.discard(conn)
+                if deadline is not None:
+                    deadline.cancel()
+                raise urllib2.URLError(e)
+            except (socket.error, http_client.HTTPException) as e:
+                self.pool.discard(conn)
+                if deadline is not None:
+                    deadline.cancel()
+                    if deadline.expired:
+                        raise urllib2.URLError(DeadlineExceeded(
+                            "Deadline of %s exceeded" % req.get_full_url()))
+                if reused and attempt == 0 and not kwargs:
+                    # the server closed the idle connection in the meantime
+                    logger.debug("Stale connection to %s, reconnecting" % host)
+                    continue
+                raise urllib2.URLError(e)
+            break
+
+        if read_timeout is not None and conn.sock is not None:
+            conn.sock.settimeout(read_timeout)
+
+        return PooledResponse(
+            response,
+            url=req.get_full_url(),
+            release=lambda: self.pool.release(scheme, host, conn),
+            discard=lambda: self.pool.discard(conn),
+            deadline=deadline)
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import collections
+import logging
+import threading
+import time
+
+from six.moves import queue
+from six.moves.urllib import robotparser
+
+from ldtools.utils import urllib2, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def deadline_passed(deadline):
+    return deadline is not None and time.time() >= deadline
+
+
+def crawl_concurrently(func, items, workers=1, scheduler=None,
+                       deadline=None):
+    """Calls func(item) for every item using a pool of worker threads.
+
+    Blocks until every item is processed. The first exception raised by
+    func is re-raised in the calling thread once all workers stopped.
+
+    Without scheduler the items are processed in order, a HostScheduler
+    decides which item a worker gets next. Once the time.time() deadline
+    passed, no more items are started. Returns the number of items that
+    were not processed because of it"""
+    items = list(items)
+    if scheduler is None and (workers <= 1 or len(items) <= 1):
+        for i, item in enumerate(items):
+            if deadline_passed(deadline):
+                return len(items) - i
+            func(item)
+        return 0
+
+    if scheduler is None:
+        jobs = queue.Queue()
+        for item in items:
+            jobs.put(item)
+    else:
+        scheduler.add(items)
+
+    stop = threading.Event()
+    errors = []
+    processed = []
+
+    def next_item():
+        if scheduler is not None:
+            return scheduler.acquire(stop)
+        try:
+            return jobs.get_nowait()
+        except queue.Empty:
+            return None
+
+    def worker():
+        while not stop.is_set():
+            item = next_item()
+            if item is None:
+                return
+            if deadline_passed(deadline):
+                if scheduler is not None:
+                    scheduler.release(item)
+                stop.set()
+                return
+            processed.append(item)
+            try:
+                func(item)
+            except Exception as e:
+                logger.error("Crawling %s failed: %r" % (item, e))
+                errors.append(e)
+                stop.set()
+            finally:
+                if scheduler is not None:
+                    scheduler.release(item)
+
+    if workers <= 1:
+        try:
+            worker()
+        finally:
+            if scheduler is not None:
+                scheduler.clear()
+        if errors:
+            raise errors[0]
+        return len(items) - len(processed)
+
+    threads = [
+        threading.Thread(target=worker, name="ldtools-crawler-%s" % i)
+        for i in range(min(workers, len(items)))
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for thread in threads:
+            # join with timeout to keep the main thread interruptible
+            while thread.is_alive():
+                thread.join(0.1)
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+    finally:
+        if scheduler is not None:
+            # items left after an error are not crawled
+            scheduler.clear()
+
+    if errors:
+        raise errors[0]
+    return len(items) - len(processed)
+
+
+class CrawlFrontier(object):
+    """Remembers the depth at which every Origin was discovered.
+
+    Origins are grouped by depth so a crawl round only has to look at the
+    Origins discovered in the previous round instead of every Origin known
+    so far. Each Origin is scheduled at most once."""
+
+    def __init__(self):
+        self.depths = {}
+        self._rounds = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.depths)
+
+    def __contains__(self, origin):
+        return origin.uri in self.depths
+
+    def add(self, origin, depth=0):
+        """Schedules origin at depth. Returns False if already known"""
+        with self._lock:
+            if origin.uri in self.depths:
+                return False
+            self.depths[origin.uri] = depth
+            self._rounds[depth].append(origin)
+            return True
+
+    def depth_of(self, origin):
+        return self.depths.get(origin.uri)
+
+    def pop_round(self, depth):
+        """Returns and forgets the Origins discovered at depth"""
+        with self._lock:
+            return self._rounds.pop(depth, [])
+
+
+def get_host(item):
+    """The host of an Origin or of an URI"""
+    return urlparse.urlparse(
+        unicode(getattr(item, "uri", item))).netloc.lower()
+
+
+class HostScheduler(object):
+    """Hands out the items of crawl_concurrently with one queue per host.
+
+    At most concurrency items of a host are crawled at the same time and
+    their starts are at least delay seconds apart. With robots, the
+    Crawl-delay robots.txt asks for is used if it is longer. Hosts take
+    turns, so workers crawl different hosts instead of waiting for one.
+    The timing of a host is kept across crawl rounds"""
+
+    user_agent = "ldtools"
+    robots_timeout = 5
+
+    def __init__(self, concurrency=1, delay=0, robots=False):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.robots = robots
+        self._condition = threading.Condition()
+        # host --> deque of items, the next host to take a turn first
+        self._queues = collections.OrderedDict()
+        self._active = collections.defaultdict(int)
+        self._next_start = {}
+        self._crawl_delays = {}
+
+    def add(self, items):
+        with self._condition:
+            for item in items:
+                host = get_host(item)
+                self._queues.setdefault(host, collections.deque()).append(
+                    item)
+            self._condition.notify_all()
+
+    def clear(self):
+        with self._condition:
+            self._queues.clear()
+            self._condition.notify_all()
+
+    def _delay_of(self, host):
+        return max(self.delay, self._crawl_delays.get(host) or 0)
+
+    def _pop(self, now):
+        """Returns the next item that may start now and its host, or the
+        seconds to wait for one"""
+        wait = None
+        for host, items in self._queues.items():
+            if self._active[host] >= self.concurrency:
+                continue
+            ready = self._next_start.get(host, 0) - now
+            if ready > 0:
+                wait = ready if wait is None else min(wait, ready)
+                continue
+
+            item = items.popleft()
+            del self._queues[host]
+            if items:
+                # the other hosts take their turns first
+                self._queues[host] = items
+            self._active[host] += 1
+            self._next_start[host] = now + self._delay_of(host)
+            return item, host, None
+        return None, None, wait
+
+    def acquire(self, stop=None):
+        """Blocks until an item may be crawled and returns it. Returns None
+        if no items are left or stop is set"""
+        with self._condition:
+            while self._queues and not (stop is not None and stop.is_set()):
+                item, host, wait = self._pop(time.time())
+                if item is not None:
+                    break
+                # wake up regularly to check stop
+                self._condition.wait(0.1 if wait is None else min(wait, 0.1))
+            else:
+                return None
+            fetch_robots = self.robots and host not in self._crawl_delays
+            if fetch_robots:
+                self._crawl_delays[host] = None
+                # no other item of host starts before its crawl delay is
+                # known
+                self._next_start[host] = float("inf")
+
+        if fetch_robots:
+            crawl_delay = self.get_crawl_delay(item)
+            with self._condition:
+                self._crawl_delays[host] = crawl_delay
+                if crawl_delay:
+                    logger.info("%s asks for a crawl delay of %ss"
+                                % (host, crawl_delay))
+                # item starts now, after the robots.txt
+                self._next_start[host] = time.time() + self._delay_of(host)
+                self._condition.notify_all()
+        return item
+
+    def release(self, item):
+        """Marks item as crawled"""
+        with self._condition:
+            self._active[get_host(item)] -= 1
+            self._condition.notify_all()
+
+    def get_crawl_delay(self, item):
+        """Returns the Crawl-delay of the robots.txt of item's host in
+        seconds, 0 if there is none"""
+        parts = urlparse.urlparse(unicode(getattr(item, "uri", item)))
+        url = "%s://%s/robots.txt" % (parts.scheme, parts.netloc)
+        try:
+            response = urllib2.urlopen(url, timeout=self.robots_timeout)
+            try:
+                lines = response.read().decode("utf-8", "replace")
+            finally:
+                response.close()
+        except Exception as e:
+            logger.debug("No robots.txt at %s: %r" % (url, e))
+            return 0
+
+        parser = robotparser.RobotFileParser(url)
+        parser.parse(lines.splitlines())
+        # Python 2 does not know Crawl-delay
+        crawl_delay = getattr(parser, "crawl_delay", lambda agent: None)
+        try:
+            return float(crawl_delay(self.user_agent) or 0)
+        except ValueError:
+            return 0
+
+
+class HostUnavailable(urllib2.URLError):
+    "The circuit of the host is open: it failed too often recently"
+
+
+class CircuitBreaker(object):
+    """Tracks consecutive failures per host: timeouts, connection errors
+    and 5xx responses.
+
+    After threshold failures the circuit of the host opens and requests
+    to it raise HostUnavailable without waiting for the host. After
+    reset_timeout seconds one request is let through as probe. If it
+    succeeds the circuit closes again, otherwise it stays open for
+    another reset_timeout"""
+
+    def __init__(self, threshold=5, reset_timeout=60):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = collections.defaultdict(int)
+        # host --> time its circuit opened
+        self._opened = {}
+        self._probing = set()
+
+    def is_open(self, uri):
+        with self._lock:
+            return get_host(uri) in self._opened
+
+    def before_request(self, uri):
+        """Raises HostUnavailable if the request must not be sent"""
+        host = get_host(uri)
+        with self._lock:
+            opened = self._opened.get(host)
+            if opened is None:
+                return
+            if (host not in self._probing and
+                    time.time() - opened >= self.reset_timeout):
+                logger.info("Probing %s again" % host)
+                self._probing.add(host)
+                return
+            failures = self._failures[host]
+        raise HostUnavailable("%s failed %s times in a row, not requesting "
+                              "%s" % (host, failures, uri))
+
+    def succeeded(self, uri):
+        """The host answered the request"""
+        host = get_host(uri)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._probing.discard(host)
+            if self._opened.pop(host, None) is not None:
+                logger.info("%s is available again" % host)
+
+    def failed(self, uri):
+        host = get_host(uri)
+        with self._lock:
+            self._probing.discard(host)
+            self._failures[host] += 1
+            if host in self._opened:
+                self._opened[host] = time.time()
+            elif self._failures[host] >= self.threshold:
+                logger.warning(
+                    "%s failed %s times in a row, failing its requests for "
+                    "%ss" % (host, self._failures[host], self.reset_timeout))
+                self._opened[host] = time.time()
+
+    def cancelled(self, uri):
+        """The request failed before the host was contacted"""
+        with self._lock:
+            self._probing.discard(get_host(uri))
+
+    def reset(self):
+        with self._lock:
+            self._failures.clear()
+            self._opened.clear()
+            self._probing.clear()
@@ -6,6 +6,7 @@ try:
 except NameError:
     basestring = unicode = str  # Python 3
 
+import hashlib
 import logging
 import rdflib
 from rdflib import compare
@@ -58,6 +59,44 @@ def set_colored_logger(verbosity_level):
     return logger
 
 
+def _triple_digest(triple):
+    line = " ".join(term.n3() for term in triple)
+    return int(hashlib.sha1(line.encode("utf8")).hexdigest(), 16)
+
+
+def graph_fingerprint(graph):
+    """Returns a canonical digest of the content of graph: Isomorphic graphs
+    have the same fingerprint.
+
+    Graphs without blank nodes are hashed triple by triple and the hashes
+    are combined independent of their order. Only graphs containing blank
+    nodes need the (expensive) canonical isomorphic form"""
+    digest = 0
+    for triple in graph:
+        if any(isinstance(term, rdflib.BNode) for term in triple):
+            return "isomorphic:%x" % compare.to_isomorphic(graph).graph_digest()
+        digest = (digest + _triple_digest(triple)) % (1 << 160)
+    return "triples:%s:%x" % (len(graph), digest)
+
+
+def update_graph_fingerprint(fingerprint, added, removed):
+    """Returns the fingerprint of a graph after adding and removing the
+    given triples without hashing the whole graph. Returns None if the
+    fingerprint has to be computed again"""
+    if fingerprint is None or not fingerprint.startswith("triples:"):
+        return None
+    _tag, length, digest = fingerprint.split(":")
+    length, digest = int(length), int(digest, 16)
+    for triple in added:
+        if any(isinstance(term, rdflib.BNode) for term in triple):
+            return None
+        digest += _triple_digest(triple)
+    for triple in removed:
+        digest -= _triple_digest(triple)
+    length += len(added) - len(removed)
+    return "triples:%s:%x" % (length, digest % (1 << 160))
+
+
 def my_graph_diff(graph1, graph2):
     """Compares graph2 to graph1 and highlights everything that changed.
     Colored if pygments available"""
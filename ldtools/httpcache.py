@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""A disk cache of the responses of RestBackend.GET.
+
+Responses are stored per URL and Accept header following the caching
+rules of RFC 7234: Cache-Control max-age, Expires, heuristic freshness
+from Last-Modified, no-store and no-cache. Fresh responses are served
+without a request, stale ones are revalidated with their ETag or
+Last-Modified. Use it for all RestBackends with::
+
+    RestBackend.cache = HTTPCache("~/.cache/ldtools")
+"""
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import collections
+import email.message
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# heuristic freshness is 10% of the time since Last-Modified, but not more
+# than a day (RFC 7234, section 4.2.2)
+HEURISTIC_FRACTION = 0.1
+MAX_HEURISTIC_LIFETIME = 24 * 60 * 60
+
+# headers of the connection, not of the stored response
+_hop_by_hop_headers = frozenset([
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade"])
+
+
+def parse_cache_control(value):
+    """Returns the directives of a Cache-Control header as dict, directives
+    without argument map to None"""
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _sep, argument = directive.partition("=")
+        name = name.strip().lower()
+        if name:
+            directives[name] = argument.strip().strip('"') or None
+    return directives
+
+
+def parse_http_date(value):
+    """Returns the seconds since the epoch of an HTTP date or None"""
+    if not value:
+        return None
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return email.utils.mktime_tz(parsed)
+
+
+def _delta_seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_key(url, accept):
+    # Origins sharing a url prefix are found by the first part
+    url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    accept_hash = hashlib.sha1((accept or "").encode("utf-8")).hexdigest()
+    return "%s-%s" % (url_hash, accept_hash[:16])
+
+
+def _message(header_items):
+    headers = email.message.Message()
+    for name, value in header_items:
+        headers[name] = value
+    return headers
+
+
+class CacheEntry(object):
+    """A stored response. headers behaves like the headers of a response,
+    the body is read with open()"""
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.url = meta["url"]
+        self.headers = _message(meta["headers"])
+        self.request_time = meta["request_time"]
+        self.response_time = meta["response_time"]
+        self.size = meta["size"]
+
+    def open(self):
+        return open(self.cache._body_path(self.key), "rb")
+
+    def read(self):
+        with self.open() as f:
+            return f.read()
+
+    def freshness_lifetime(self):
+        """Seconds the response is fresh after it was generated"""
+        cache_control = parse_cache_control(
+            self.headers.get("Cache-Control"))
+        max_age = _delta_seconds(cache_control.get("max-age"))
+        if max_age is not None:
+            return max_age
+
+        date = parse_http_date(self.headers.get("Date"))
+        if date is None:
+            date = self.response_time
+        if "Expires" in self.headers:
+            # invalid dates like "0" mean already expired
+            expires = parse_http_date(self.headers["Expires"])
+            return 0 if expires is None else max(0, expires - date)
+
+        last_modified = parse_http_date(self.headers.get("Last-Modified"))
+        if last_modified is not None:
+            return min(MAX_HEURISTIC_LIFETIME,
+                       max(0, (date - last_modified) * HEURISTIC_FRACTION))
+        return 0
+
+    def current_age(self, now=None):
+        """Seconds since the response was generated by the server (RFC
+        7234, section 4.2.3)"""
+        if now is None:
+            now = time.time()
+        date = parse_http_date(self.headers.get("Date"))
+        apparent_age = 0
+        if date is not None:
+            apparent_age = max(0, self.response_time - date)
+        age = _delta_seconds(self.headers.get("Age")) or 0
+        response_delay = self.response_time - self.request_time
+        corrected_initial_age = max(apparent_age, age + response_delay)
+        return corrected_initial_age + (now - self.response_time)
+
+    def is_fresh(self, request_headers=None, now=None):
+        """True if the entry can be used without asking the server"""
+        request_directives = parse_cache_control(
+            (request_headers or {}).get("Cache-Control"))
+        if "no-cache" in request_directives:
+            return False
+        cache_control = parse_cache_control(
+            self.headers.get("Cache-Control"))
+        if "no-cache" in cache_control:
+            return False
+        if ("Cache-Control" not in self.headers and
+                "no-cache" in (self.headers.get("Pragma") or "")):
+            return False
+        return self.freshness_lifetime() > self.current_age(now)
+
+    def validators(self):
+        """The headers for a conditional request revalidating the entry"""
+        validators = {}
+        if self.headers.get("ETag"):
+            validators["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+
+class _CachingReader(object):
+    """Passes a response through and writes it to a temporary file. The
+    response is stored in the cache when it was read completely, closing
+    it earlier discards it"""
+
+    def __init__(self, fp, cache, key, meta):
+        self.fp = fp
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        content_length = meta.pop("content_length", None)
+        self.content_length = (int(content_length)
+                               if content_length and content_length.isdigit()
+                               else None)
+        fd, self.temporary_path = tempfile.mkstemp(
+            dir=cache.directory, suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+        self.size = 0
+
+    def _write(self, data, complete):
+        if self.file is None:
+            return data
+        self.file.write(data)
+        self.size += len(data)
+        if complete or self.size == self.content_length:
+            self.file.close()
+            self.file = None
+            self.meta["size"] = self.size
+            self.cache._add(self.key, self.meta, self.temporary_path)
+        return data
+
+    def read(self, amt=None):
+        if amt is None:
+            return self._write(self.fp.read(), complete=True)
+        data = self.fp.read(amt)
+        return self._write(data, complete=not data and amt != 0)
+
+    def readline(self, *args):
+        data = self.fp.readline(*args)
+        return self._write(data, complete=not data)
+
+    def close(self):
+        if self.file is not None:
+            # incomplete responses are not stored
+            self.file.close()
+            self.file = None
+            os.remove(self.temporary_path)
+        self.fp.close()
+
+
+class HTTPCache(object):
+    """Stores responses in directory. When the bodies take more than
+    max_size bytes, the least recently used responses are removed"""
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._lock = threading.Lock()
+        # key --> size of the body, least recently used first
+        self._entries = collections.OrderedDict()
+        self.size = 0
+        self._load_index()
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, key + ".body")
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _load_index(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.endswith(".tmp"):
+                # left behind by an interrupted download
+                os.remove(path)
+            elif filename.endswith(".body"):
+                key = filename[:-len(".body")]
+                if os.path.exists(self._meta_path(key)):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, key, stat.st_size))
+        for _mtime, key, size in sorted(entries):
+            self._entries[key] = size
+            self.size += size
+
+    def get(self, url, request_headers):
+        """Returns the CacheEntry for a GET of url with request_headers,
+        fresh or not, or None"""
+        if "no-store" in parse_cache_control(
+                request_headers.get("Cache-Control")):
+            return None
+        key = _cache_key(url, request_headers.get("Accept"))
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                with open(self._meta_path(key)) as f:
+                    meta = json.load(f)
+            except (IOError, OSError, ValueError):
+                self._remove(key)
+                return None
+            self._use(key)
+        return CacheEntry(self, key, meta)
+
+    def _use(self, key):
+        self._entries[key] = self._entries.pop(key)
+        try:
+            # the order of use survives restarts
+            os.utime(self._body_path(key), None)
+        except OSError:
+            pass
+
+    def store(self, url, request_headers, response, request_time):
+        """Returns response, wrapped to be stored while it is read if it
+        may be cached"""
+        if not self.is_storable(request_headers, response.headers):
+            return response
+        meta = dict(
+            url=url,
+            headers=[(name, value) for name, value in response.headers.items()
+                     if name.lower() not in _hop_by_hop_headers],
+            request_time=request_time,
+            response_time=time.time(),
+            content_length=response.headers.get("Content-Length"))
+        key = _cache_key(url, request_headers.get("Accept"))
+        return _CachingReader(response, self, key, meta)
+
+    def is_storable(self, request_headers, response_headers):
+        if "no-store" in parse_cache_control(
+                request_headers.get("Cache-Control")):
+            return False
+        cache_control = parse_cache_control(
+            response_headers.get("Cache-Control"))
+        if "no-store" in cache_control:
+            return False
+        if (response_headers.get("Vary") or "").strip() == "*":
+            return False
+        # a response that is never fresh and cannot be revalidated is of
+        # no use
+        return bool("max-age" in cache_control or
+                    "Expires" in response_headers or
+                    response_headers.get("ETag") or
+                    response_headers.get("Last-Modified"))
+
+    def _add(self, key, meta, temporary_path):
+        if meta["size"] > self.max_size:
+            os.remove(temporary_path)
+            return
+        with self._lock:
+            self._remove(key)
+            os.rename(temporary_path, self._body_path(key))
+            self._write_meta(key, meta)
+            self._entries[key] = meta["size"]
+            self.size += meta["size"]
+            while self.size > self.max_size:
+                oldest = next(iter(self._entries))
+                logger.debug("Evicting %s from the HTTP cache" % oldest)
+                self._remove(oldest)
+
+    def _write_meta(self, key, meta):
+        fd, temporary_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        if os.path.exists(self._meta_path(key)):
+            os.remove(self._meta_path(key))
+        os.rename(temporary_path, self._meta_path(key))
+
+    def _remove(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.size -= size
+        for path in (self._body_path(key), self._meta_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def revalidate(self, entry, response_headers, request_time):
+        """Updates entry with the headers of a 304 Not Modified response
+        (RFC 7234, section 4.3.4) and returns it"""
+        headers = [(name, value) for name, value in entry.headers.items()
+                   if name not in response_headers]
+        headers.extend(
+            (name, value) for name, value in response_headers.items()
+            if name.lower() not in _hop_by_hop_headers and
+            name.lower() != "content-length")
+        meta = dict(url=entry.url,
+                    headers=headers,
+                    request_time=request_time,
+                    response_time=time.time(),
+                    size=entry.size)
+        with self._lock:
+            if entry.key in self._entries:
+                self._write_meta(entry.key, meta)
+        return CacheEntry(self, entry.key, meta)
+
+    def invalidate(self, url):
+        """Removes the responses for url, e.g. after it was changed by PUT"""
+        prefix = _cache_key(url, None).split("-")[0] + "-"
+        with self._lock:
+            for key in [key for key in self._entries
+                        if key.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+
+__all__ = ["CacheEntry", "HTTPCache"]
@@ -6,8 +6,34 @@ try:
 except NameError:
     basestring = unicode = str  # Python 3
 
+import logging
+import threading
+
 import six
 
+logger = logging.getLogger(__name__)
+
+# Guards the object stores of all managers. Reentrant because populating
+# an Origin may trigger processing of another Origin (owl:imports)
+store_lock = threading.RLock()
+
+# Model classes by name, to resolve references to stored objects
+models = {}
+
+
+# values of these types are indexed by every member
+_collection_types = (list, set, tuple, frozenset)
+
+
+def _freeze(value):
+    """Indexed sets and lists are stored as frozenset and tuple: changing
+    them in place would leave the index outdated"""
+    if type(value) is set:
+        return frozenset(value)
+    if type(value) is list:
+        return tuple(value)
+    return value
+
 
 class DoesNotExist(Exception):
     "The requested object does not exist"
@@ -36,6 +62,53 @@ class Options(object):
             if isinstance(obj, Field):
                 fields.append((obj_name, obj))
         self.fields = dict(fields)
+        # fields are indexed automatically, Meta.indexes adds attributes
+        self.indexes = frozenset(
+            list(self.fields.keys()) + list(getattr(meta, 'indexes', ())))
+
+
+class _NotPinned(object):
+    """The block of MemoryStorage.pinned(), objects are never evicted"""
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_not_pinned = _NotPinned()
+
+
+class MemoryStorage(dict):
+    """The default storage engine of managers: a dict of pk --> object.
+
+    Other engines (see ldtools.storage) implement the same mapping and the
+    methods below"""
+
+    def bind(self, model):
+        pass
+
+    def is_stored(self, instance):
+        return self.get(getattr(instance, 'pk', None)) is instance
+
+    def changed(self, instance):
+        """Called after instance was modified"""
+
+    def pinned(self):
+        """Context manager for a modification of several objects: they
+        stay loaded until the block ends"""
+        return _not_pinned
+
+    def flush(self):
+        pass
+
+    def iter_indexed(self, keys):
+        """Yields (pk, key, value) for the indexed attributes"""
+        for pk, instance in list(self.items()):
+            for key in keys:
+                if key in instance.__dict__:
+                    yield pk, key, instance.__dict__[key]
 
 
 class ManagerDescriptor(object):
@@ -58,54 +131,211 @@ class Manager(object):
 
     def contribute_to_class(self, model, name):
         self.model = model
+        model._default_manager = self
         setattr(model, name, ManagerDescriptor(self))
 
     def reset_store(self):
-        self._storage = {}
+        self._storage = MemoryStorage()
+        # attribute name --> {value: pk or set of pks}. Unique values store
+        # the pk itself, most values (uris) are unique. Set-valued
+        # attributes are indexed by every member
+        self._indexes = {}
+        self._unhashable = set()
+
+    def set_storage(self, storage):
+        """Keeps the objects in storage, e.g. an ldtools.storage.SQLiteStorage.
+        The indexes are rebuilt from the objects storage already holds"""
+        with store_lock:
+            self._storage = storage
+            self._indexes = {}
+            self._unhashable = set()
+            storage.bind(self.model)
+            for pk, key, value in storage.iter_indexed(
+                    self.model._meta.indexes):
+                self._add_to_index(key, value, pk)
+
+    def flush(self):
+        """Writes pending changes to the storage"""
+        with store_lock:
+            self._storage.flush()
+
+    def changed(self, instance):
+        self._storage.changed(instance)
+
+    def pinned(self):
+        """Keeps the objects used in the block loaded: a storage evicting
+        objects waits until their changes were reported with changed()"""
+        return self._storage.pinned()
 
     def all(self):
         return self._storage.values()
 
+    def _is_stored(self, instance):
+        return self._storage.is_stored(instance)
+
+    def _index_values(self, value):
+        if type(value) in _collection_types:
+            return value
+        return (value,)
+
+    def index_add(self, instance, key, value):
+        """Registers value of instance's attribute key in the index"""
+        if key not in self.model._meta.indexes or key in self._unhashable:
+            return
+        if not self._is_stored(instance):
+            return
+        self._add_to_index(key, value, instance.pk)
+
+    def _add_to_index(self, key, value, pk):
+        if key in self._unhashable:
+            return
+        index = self._indexes.setdefault(key, {})
+        try:
+            for v in self._index_values(value):
+                pks = index.get(v)
+                if pks is None:
+                    index[v] = pk
+                elif isinstance(pks, set):
+                    pks.add(pk)
+                elif pks != pk:
+                    index[v] = set([pks, pk])
+        except TypeError:
+            # unhashable values cannot be indexed, filter() falls back to
+            # checking every object for this attribute
+            logger.debug("Cannot index %s.%s" % (self.model.__name__, key))
+            self._unhashable.add(key)
+            self._indexes.pop(key, None)
+
+    def index_remove(self, instance, key, value):
+        if key not in self._indexes or not self._is_stored(instance):
+            return
+        index = self._indexes[key]
+        for v in self._index_values(value):
+            pks = index.get(v)
+            if isinstance(pks, set):
+                pks.discard(instance.pk)
+                if len(pks) == 1:
+                    index[v] = pks.pop()
+            elif pks is not None and pks == instance.pk:
+                del index[v]
+
+    def _lookup(self, key, value):
+        """Returns the pks of objects matching key=value or None if the
+        attribute is not indexed"""
+        if key not in self.model._meta.indexes or key in self._unhashable:
+            return None
+        try:
+            pks = self._indexes.get(key, {}).get(value)
+        except TypeError:
+            return None
+        if pks is None:
+            return set()
+        if isinstance(pks, set):
+            return pks
+        return set([pks])
+
     def filter_has_key(self, key):
         key = unicode(key)
         return [
             obj for obj in self.all()
-            if key in [unicode(k) for k in obj.__dict__.keys()]
+            if key in [unicode(k) for k in obj._attribute_names()]
         ]
 
-    def filter(self, **kwargs):
-        def check_if_equals_or_in_set(key_n_value):
-            """helper method for loop. Convenient but maybe hacky: checks
-            if value is in attr or if iterable inside the set/list"""
-            key, value = key_n_value
-            if hasattr(item, key):
-                items_value = getattr(item, key)
-                if type(items_value) in (list, set):
-                    for items_value in items_value:
-                        if items_value == value:
-                            return True
-                else:
+    def _matches(self, item, key, value):
+        """Convenient but maybe hacky: checks if value is in attr or if
+        iterable inside the set/list"""
+        if hasattr(item, key):
+            items_value = getattr(item, key)
+            if type(items_value) in _collection_types:
+                for items_value in items_value:
                     if items_value == value:
                         return True
-            return False
+            else:
+                if items_value == value:
+                    return True
+        return False
+
+    def filter(self, **kwargs):
+        # indexed attributes narrow down the candidates
+        candidates = None
+        for key, value in kwargs.items():
+            pks = self._lookup(key, value)
+            if pks is None:
+                continue
+            elif candidates is None:
+                candidates = set(pks)
+            else:
+                candidates &= pks
 
-        for item in self.all():
-            if all(map(check_if_equals_or_in_set, kwargs.items())):
+        if candidates is None:
+            # checking an attribute may add objects to the store
+            items = list(self._storage.values())
+        else:
+            # get() reads every object once, even from a database
+            items = [item for item in map(self._storage.get, candidates)
+                     if item is not None]
+
+        # the candidates are checked as well, the index of an attribute
+        # that was changed without setattr is outdated
+        for item in items:
+            if all(self._matches(item, key, value)
+                   for key, value in kwargs.items()):
                 yield item
 
     def create(self, pk, **kwargs):
         kwargs['pk'] = pk
         instance = self.model(**kwargs)
-        assert pk not in self._storage, (
-            "%s object with pk %s already exists!" % (self.model, pk))
-        self._storage[pk] = instance
+        with store_lock:
+            assert pk not in self._storage, (
+                "%s object with pk %s already exists!" % (self.model, pk))
+            self._storage[pk] = instance
+            for key in self.model._meta.indexes:
+                if key in instance.__dict__:
+                    self.index_add(instance, key, instance.__dict__[key])
         return instance
 
+    def bulk_create(self, objects):
+        """Creates and stores many objects at once. objects is a list of
+        (pk, kwargs) tuples"""
+        instances = [self.model(pk=pk, **kwargs) for pk, kwargs in objects]
+        with store_lock:
+            for instance in instances:
+                assert instance.pk not in self._storage, (
+                    "%s object with pk %s already exists!" % (
+                        self.model, instance.pk))
+                self._storage[instance.pk] = instance
+            for key in self.model._meta.indexes:
+                for instance in instances:
+                    if key in instance.__dict__:
+                        self.index_add(instance, key, instance.__dict__[key])
+        return instances
+
+    def add(self, instance):
+        """Stores an instance that was created before and removed from
+        the store with delete()"""
+        with store_lock:
+            assert instance.pk not in self._storage, (
+                "%s object with pk %s already exists!" % (
+                    self.model, instance.pk))
+            self._storage[instance.pk] = instance
+            for key in self.model._meta.indexes:
+                if key in instance.__dict__:
+                    self.index_add(instance, key, instance.__dict__[key])
+
+    def delete(self, pk):
+        """Removes the object with pk from the store and the indexes"""
+        with store_lock:
+            instance = self._storage[pk]
+            for key in list(self._indexes.keys()):
+                if key in instance.__dict__:
+                    self.index_remove(instance, key, instance.__dict__[key])
+            del self._storage[pk]
+
     def get(self, pk):
-        if pk in self._storage:
-            return self._storage[pk]
-        else:
+        instance = self._storage.get(pk)
+        if instance is None:
             raise self.model.DoesNotExist
+        return instance
 
 
 class ModelMeta(type):
@@ -118,7 +348,10 @@ class ModelMeta(type):
 
         module = attrs.pop('__module__')
 
-        new_cls = super_new(cls, name, bases, {'__module__': module})
+        new_attrs = {'__module__': module}
+        if '__classcell__' in attrs:
+            new_attrs['__classcell__'] = attrs.pop('__classcell__')
+        new_cls = super_new(cls, name, bases, new_attrs)
 
         attr_meta = attrs.pop('Meta', None)
         if not attr_meta:
@@ -140,12 +373,14 @@ class ModelMeta(type):
             new_cls.__str__ = lambda self: self.__unicode__()
         new_cls.__repr__ = lambda self: u'<%s: %s>' % (
             self.__class__.__name__, self.__unicode__())
+        models[name] = new_cls
         return new_cls
 
 
 class Model(six.with_metaclass(ModelMeta)):
     MultipleObjectsReturned = MultipleObjectsReturned
     DoesNotExist = DoesNotExist
+    _default_manager = None
 
     def __init__(self, pk=None, **kwargs):
         self.pk = pk
@@ -168,6 +403,34 @@ class Model(six.with_metaclass(ModelMeta)):
                 '%s are not part of the schema for %s' % (
                     ', '.join(kwargs.keys()), self.__class__.__name__))
 
+    def __setattr__(self, key, value):
+        manager = self._default_manager
+        if manager is not None and key in self._meta.indexes:
+            value = _freeze(value)
+            if key in self.__dict__:
+                manager.index_remove(self, key, self.__dict__[key])
+            object.__setattr__(self, key, value)
+            manager.index_add(self, key, value)
+        else:
+            object.__setattr__(self, key, value)
+        if manager is not None:
+            manager.changed(self)
+
+    def __delattr__(self, key):
+        object.__delattr__(self, key)
+        if self._default_manager is not None:
+            self._default_manager.changed(self)
+
+    def __getstate__(self):
+        return self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _attribute_names(self):
+        """Names of the attributes stored on the instance"""
+        return list(self.__dict__.keys())
+
     def __eq__(self, other):
         if not type(other) == type(self):
             return False
@@ -6,24 +6,38 @@ try:
 except NameError:
     basestring = unicode = str  # Python 3
 
+import collections
 import datetime
+import functools
+import time
 import rdflib
 from xml.sax._exceptions import SAXParseException
 import logging
 
-from rdflib import compare
-
-from ldtools.backends import RestBackend, ContentNegotiationError
-from ldtools.resource import Resource
-from ldtools.metamodels import Manager, Model
+from ldtools.backends import (
+    RestBackend, ContentNegotiationError, DeadlineExceeded,
+    ResponseSizeLimitExceeded, NOT_MODIFIED
+)
+from ldtools.crawler import (
+    crawl_concurrently, CrawlFrontier, HostUnavailable
+)
+from ldtools.resource import Resource, is_resource_uri, iter_pairs
+from ldtools.metamodels import Manager, Model, store_lock
 from ldtools.models import URIRefField, ObjectField
+from ldtools.parsing import (
+    parse_graph, graph_from_batch, graph_to_batch, GraphSizeLimitExceeded
+)
+from ldtools import serializers
+from ldtools.terms import intern_triple
 from ldtools.utils import (
     get_rdflib_uriref, get_slash_url,
-    catchKeyboardInterrupt, is_valid_url, reverse_dict, safe_dict,
-    pyattr2predicate,
+    catchKeyboardInterrupt, canonicalize_url, safe_dict,
+    get_predicate_translator,
     urllib2
 )
-from ldtools.helpers import my_graph_diff
+from ldtools.helpers import (
+    my_graph_diff, graph_fingerprint, update_graph_fingerprint
+)
 
 logger = logging.getLogger(__name__)
 
@@ -36,11 +50,12 @@ class OriginManager(Manager):
 
     def create(self, uri, BACKEND=None):
         uri = get_rdflib_uriref(uri)
-        if not uri == get_slash_url(uri):
+        slash_uri = get_slash_url(uri)
+        if not uri == slash_uri:
             msg = ("URI passed to Origin Manager was not a slash URI: %s. "
                    "Fixed now." % uri)
             logger.debug(msg)
-            uri = get_slash_url(uri)
+            uri = slash_uri
 
         backend = BACKEND if BACKEND else RestBackend()
         origin = super(OriginManager, self).create(
@@ -56,11 +71,12 @@ class OriginManager(Manager):
     def get_or_create(self, uri, **kwargs):
 
         uri = get_rdflib_uriref(uri)
-        if not uri == get_slash_url(uri):
+        slash_uri = get_slash_url(uri)
+        if not uri == slash_uri:
             msg = ("URI passed to Origin Manager was not a slash URI: %s. "
                    "Fixed now." % uri)
             logger.warning(msg)
-            uri = get_slash_url(uri)
+            uri = slash_uri
 
         try:
             if kwargs:
@@ -69,17 +85,55 @@ class OriginManager(Manager):
         except self.model.DoesNotExist:
             return self.create(uri, **kwargs), True
 
+    def save_snapshot(self, path):
+        """Writes all Origins and Resources to path, see ldtools.snapshot"""
+        from ldtools.snapshot import save_snapshot
+        save_snapshot(path)
+
+    def load_snapshot(self, path, lazy=False):
+        """Replaces all Origins and Resources with the snapshot at path"""
+        from ldtools.snapshot import load_snapshot
+        load_snapshot(path, lazy=lazy)
+
     @catchKeyboardInterrupt
-    def GET_all(self, depth=2, **kwargs):
-        """Crawls or Re-Crawls all Origins. Passes Arguments to GET"""
-        func = lambda origin: True if not origin.processed else False
-        for _i in range(depth):
-            crawl = filter(func, self.all())
-            if not isinstance(crawl, list):  # py3
-                crawl = list(crawl)
+    def GET_all(self, depth=2, workers=1, frontier=None, scheduler=None,
+                crawl_timeout=None, **kwargs):
+        """Crawls or Re-Crawls all Origins. Passes Arguments to GET.
+
+        workers > 1 fetches and parses that many Origins concurrently,
+        populating the Resource store stays serialized. A
+        crawler.HostScheduler limits the concurrency and rate per host.
+        No GET is started crawl_timeout seconds after the crawl began,
+        the Origins not crawled stay unprocessed.
+
+        Every round only processes the Origins discovered in the previous
+        round. Pass a CrawlFrontier to continue a crawl, otherwise all
+        unprocessed Origins are scheduled for the first round"""
+        if frontier is None:
+            frontier = CrawlFrontier()
+            with store_lock:
+                for origin in self.all():
+                    if not origin.processed:
+                        frontier.add(origin, depth=0)
+
+        deadline = (time.time() + crawl_timeout
+                    if crawl_timeout is not None else None)
+        for current_depth in range(depth):
+            crawl = [origin for origin in frontier.pop_round(current_depth)
+                     if not origin.processed]
             if crawl:
-                for origin in crawl:
-                    origin.GET(raise_errors=False, **kwargs)
+                skipped = crawl_concurrently(
+                    lambda origin: origin.GET(
+                        raise_errors=False, frontier=frontier, **kwargs),
+                    crawl,
+                    workers=workers,
+                    scheduler=scheduler,
+                    deadline=deadline)
+                if skipped:
+                    logger.warning("Crawl timeout of %ss reached, %s Origins "
+                                   "were not crawled"
+                                   % (crawl_timeout, skipped))
+                    return
 
 
 def triple_yield(resource, property, v):
@@ -108,11 +162,32 @@ class Origin(Model):
         if not hasattr(self, 'errors'):
             self.errors = []
         self.errors.append(error)
+        self._default_manager.changed(self)
 
     def __init__(self, pk=None, **kwargs):
+        # Resources of this Origin with _has_changes, maintained by
+        # Resource.__setattr__
+        self._dirty_resources = set()
+        # URIs of the Resources deleted since the graph was retrieved or
+        # saved, maintained by Resource.delete. Like changed Resources,
+        # they have to be saved with PUT before the next GET
+        self._deleted_resources = set()
         super(Origin, self).__init__(pk=pk, **kwargs)
         self.processed = False
 
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if "_graph" in state:
+            # the graph's store cannot be pickled
+            state["_graph"] = graph_to_batch(state["_graph"])
+        return state
+
+    def __setstate__(self, state):
+        if "_graph" in state:
+            state["_graph"] = graph_from_batch(state["uri"], *state["_graph"])
+        state.setdefault("_deleted_resources", set())
+        super(Origin, self).__setstate__(state)
+
     def __unicode__(self):
         extras = []
         if hasattr(self, 'errors'):
@@ -129,11 +204,17 @@ class Origin(Model):
     def GET(
         self,
         GRAPH_SIZE_LIMIT=30000,
+        BYTE_SIZE_LIMIT=None,
         only_follow_uris=None,
         handle_owl_imports=False,
         raise_errors=True,
         skip_urls=None,
         httphandler=None,
+        frontier=None,
+        incremental=False,
+        parse_pool=None,
+        lazy=False,
+        graph_cache=None,
     ):
 
         if not self.uri:
@@ -146,7 +227,9 @@ class Origin(Model):
 
         logger.info(u"GET %s..." % self.uri)
 
-        if self.has_unsaved_changes():
+        with store_lock:
+            unsaved_changes = self.has_unsaved_changes()
+        if unsaved_changes:
             if self.processed:
                 raise Exception("Please save all changes before querying "
                                 "again. Merging not supported yet")
@@ -164,8 +247,21 @@ class Origin(Model):
                 return
             self.last_processed = now
 
+        # only revalidate if the last GET was handled successfully
+        conditional = (hasattr(self, "_graph") and
+                       not getattr(self, "errors", None))
+
         try:
-            data = self.backend.GET(self.uri, httphandler=httphandler)
+            data = self.backend.GET(self.uri, httphandler=httphandler,
+                                    conditional=conditional, stream=True,
+                                    max_bytes=BYTE_SIZE_LIMIT)
+        except ResponseSizeLimitExceeded as e:
+            self.add_error("ResponseSizeLimitExceeded")
+            logger.error("ResponseSizeLimitExceeded: %s" % e)
+            if raise_errors:
+                raise e
+            else:
+                return
         except urllib2.HTTPError as e:
             if e.code in [
                 401,
@@ -178,6 +274,14 @@ class Origin(Model):
                 raise e
             else:
                 return
+        except HostUnavailable as e:
+            # the host failed repeatedly, it was not asked again
+            self.add_error("HostUnavailable")
+            logger.error("HostUnavailable: %s" % e.reason)
+            if raise_errors:
+                raise e
+            else:
+                return
         except urllib2.URLError as e:
             self.add_error("timeout")
             if raise_errors:
@@ -191,23 +295,54 @@ class Origin(Model):
             else:
                 return
 
-        graph = rdflib.graph.ConjunctiveGraph(identifier=self.uri)
+        if data is NOT_MODIFIED:
+            # nothing to parse, compare or populate
+            logger.info(u"%s not modified since last GET" % self.uri)
+            self.processed = True
+            return
 
         try:
             if data:
-                # Important: Do not pass data=data without publicID=uri because
-                # relative URIs (#deri) won't be an absolute uri in that case!
-                publicID = self.uri
-
                 reference_time = datetime.datetime.now()
 
-                graph.parse(data=data, publicID=publicID, format=self.backend.format)
+                # a streamed document is downloaded while parsing, a
+                # parsing.ParsePool parses in another process
+                parse = (parse_pool.parse_graph if parse_pool is not None
+                         else parse_graph)
+                if graph_cache is not None:
+                    # documents parsed before are loaded from the
+                    # parsing.GraphCache
+                    parse = functools.partial(graph_cache.parse_graph,
+                                              parse=parse)
+                graph = parse(
+                    identifier=self.uri,
+                    data=data,
+                    format=self.backend.format,
+                    limit=GRAPH_SIZE_LIMIT)
 
                 now = datetime.datetime.now()
                 self.graph_parse_time = now - reference_time
 
                 # normal rdflib.compare does not work correctly with
                 # ConjunctiveGraph, unless there is only one graph within that
+            else:
+                graph = rdflib.graph.ConjunctiveGraph(identifier=self.uri)
+        except GraphSizeLimitExceeded:
+            logger.error("Maximum graph size exceeded. The graph of %s has "
+                         "more than %s triples, parsing was aborted. Pass "
+                         "GRAPH_SIZE_LIMIT to set it differently."
+                         % (self.uri, GRAPH_SIZE_LIMIT))
+            self.processed = True
+            if hasattr(self, "errors"):
+                delattr(self, "errors")
+            return
+        except ResponseSizeLimitExceeded as e:
+            self.add_error("ResponseSizeLimitExceeded")
+            logger.error("ResponseSizeLimitExceeded: %s" % e)
+            if raise_errors:
+                raise e
+            else:
+                return
         except SAXParseException as e:
             self.add_error("SAXParseException")
             logger.error("SAXParseException: %s" % self)
@@ -222,6 +357,14 @@ class Origin(Model):
                 raise e
             else:
                 return
+        except DeadlineExceeded as e:
+            # the body was sent too slowly
+            self.add_error("timeout")
+            logger.error("DeadlineExceeded: %s" % e)
+            if raise_errors:
+                raise e
+            else:
+                return
         except IOError as e:
             self.add_error("IOError")
             logger.error("IOError: %s" % self)
@@ -229,15 +372,16 @@ class Origin(Model):
                 raise e
             else:
                 return
+        finally:
+            if hasattr(data, "close"):
+                data.close()
 
         self.processed = True
 
         if hasattr(self, "errors"):
             delattr(self, "errors")
 
-        g_length = len(graph)
-
-        if g_length > 0:
+        if len(graph) > 0:
             if len(list(graph.contexts())) > 1:
                 # detect problems with graph contexts: rdflib can only
                 # compare graphs with one context. If a graph has more
@@ -246,24 +390,82 @@ class Origin(Model):
                 logger.error("The graph has more than one context. This"
                              "might cause problems comparing the graphs!")
 
-        if g_length > GRAPH_SIZE_LIMIT:
-            logger.error("Maximum graph size exceeded. Thr graph is %s "
-                         "triples big. Limit is set to %s. The aquired "
-                         "graph exceeds that! Pass GRAPH_SIZE_LIMIT to set it "
-                         "differently." % (g_length, GRAPH_SIZE_LIMIT))
-            return
-
+        # fetching and parsing may run in concurrent crawler threads,
+        # modifying the stores is serialized
+        with store_lock:
+            self._handle_graph(
+                graph,
+                only_follow_uris=only_follow_uris,
+                handle_owl_imports=handle_owl_imports,
+                frontier=frontier,
+                incremental=incremental,
+                lazy=lazy)
+
+    def _get_graph_fingerprint(self):
+        if getattr(self, "_graph_fingerprint", None) is None:
+            self._graph_fingerprint = graph_fingerprint(self._graph)
+        return self._graph_fingerprint
+
+    def _get_graph_delta(self, graph):
+        """Returns the triples (added, removed) by graph compared to _graph.
+        Returns None if the delta cannot be applied to the existing
+        Resources: BNodes are not comparable between two parsed documents
+        and changed namespaces change the python attribute names"""
+        if (dict(self._graph.namespace_manager.namespaces()) !=
+                dict(graph.namespace_manager.namespaces())):
+            return None
+        old_triples = set(self._graph)
+        new_triples = set(graph)
+        added = new_triples - old_triples
+        removed = old_triples - new_triples
+        for triple in added | removed:
+            if any(isinstance(term, rdflib.BNode) for term in triple):
+                return None
+        return added, removed
+
+    def _handle_graph(self, graph, only_follow_uris, handle_owl_imports,
+                      frontier=None, incremental=False, lazy=False):
+        fingerprint = None
         if hasattr(self, "_graph"):
             # we already assured that there are no unsaved_changes
             # --> get_graph() == _graph
 
             logger.info(u"Already crawled: %s. Comparing graphs..." % self.uri)
 
-            if compare.to_isomorphic(self._graph) ==\
-               compare.to_isomorphic(graph):
+            # the fingerprint of _graph was computed when it was stored,
+            # only the new graph has to be hashed
+            fingerprint = graph_fingerprint(graph)
+            if fingerprint == self._get_graph_fingerprint():
+                return
+
+            logging.warning("GET retrieved updates for %s!" % self.uri)
+            lazy = lazy or Resource.objects.is_lazy(self)
+            delta = (self._get_graph_delta(graph)
+                     if incremental and not lazy else None)
+            if lazy:
+                # the views are built from the new graph when accessed
+                Resource.objects.discard_views(self)
+                for resource in Resource.objects.get_loaded(self):
+                    resource.delete()
+                delattr(self, "handled")
+            elif delta is not None:
+                added, removed = delta
+                logger.info(u"Applying %s added and %s removed triples to "
+                            u"%s" % (len(added), len(removed), self.uri))
+                graph_handler = GraphHandler(
+                    only_follow_uris=only_follow_uris,
+                    handle_owl_imports=handle_owl_imports,
+                    origin=self,
+                    frontier=frontier)
+                changed = graph_handler.remove_triples(graph=graph,
+                                                       triples=removed)
+                graph_handler.populate_resources(graph=graph, triples=added)
+                graph_handler.delete_empty_resources(changed)
+                self._graph = graph
+                self._graph_fingerprint = fingerprint
+                self._deleted_resources = set()
                 return
             else:
-                logging.warning("GET retrieved updates for %s!" % self.uri)
                 my_graph_diff(self._graph, graph)
 
                 for resource in self.get_resources():
@@ -274,12 +476,17 @@ class Origin(Model):
             return
 
         self._graph = graph
+        self._graph_fingerprint = fingerprint or graph_fingerprint(graph)
+        self._deleted_resources = set()
+        if lazy:
+            Resource.objects.add_lazy_origin(self)
 
         graph_handler = GraphHandler(
             only_follow_uris=only_follow_uris,
             handle_owl_imports=handle_owl_imports,
-            origin=self)
-        graph_handler.populate_resources(graph=graph)
+            origin=self,
+            frontier=frontier)
+        graph_handler.populate_resources(graph=graph, lazy=lazy)
 
         self.handled = True
 
@@ -301,7 +508,7 @@ class Origin(Model):
         #     isomorphic graphs but the resulting graph is is different
         #     if they miss
         #  2) doesn't detect duplicate definitions of namespaces
-        namespace_dict = safe_dict(dict(self._graph.namespace_manager.namespaces()))
+        namespace_dict = self.get_namespaces()
 
         for prefix, namespace in safe_dict(namespace_dict).items():
             graph.bind(prefix=prefix, namespace=namespace)
@@ -309,46 +516,82 @@ class Origin(Model):
 
         assert namespace_dict == new_ns, [(k, v) for k, v in safe_dict(namespace_dict).items() if not k in safe_dict(new_ns).keys()]
 
-        for resource in self.get_resources():
-            # __dict__ converts rdflib.urirefs to strings for keys -->
-            # convert back the dict's items back to uriref
-            # {'foaf': 'http:/....', ...}
-
-            for property, values in resource.__dict__.items():
+        for triple in self.iter_triples():
+            graph.add(triple)
 
-                # skip internals
-                if str(property).startswith("_") or property == "pk":
-                    continue
-
-                if property.startswith("http://"):
-                    property = rdflib.URIRef(property)
-                else:
-                    property = pyattr2predicate(property, namespace_dict)
-
-                assert isinstance(property, rdflib.URIRef), "property %s is not a URIRef object" % property
+        return graph
 
-                if isinstance(values, set):
-                    for v in values:
-                        graph.add(triple_yield(resource, property, v))
+    def get_namespaces(self):
+        """Returns the namespace bindings of the origin's graph"""
+        return safe_dict(dict(self._graph.namespace_manager.namespaces()))
+
+    def iter_triples(self):
+        """Generates the triples of every Resource of the origin without
+        building a graph"""
+        predicates = self._get_predicate_lookup()
+
+        if Resource.objects.is_lazy(self):
+            # Resources that were not loaded are unchanged, their triples
+            # are taken from the graph. Deleted Resources have none
+            resources = Resource.objects.get_loaded(self)
+            skipped = set(resource._uri for resource in resources)
+            skipped.update(self._deleted_resources)
+            for triple in self._graph:
+                if triple[0] not in skipped:
+                    yield triple
+        else:
+            resources = self.get_resources()
+
+        for resource in resources:
+            for triple in self._resource_triples(resource, predicates):
+                yield triple
+
+    def _get_predicate_lookup(self):
+        """Returns a function mapping attribute names of Resources to
+        predicates, memoized for one pass over the Resources"""
+        translator = get_predicate_translator(self.get_namespaces())
+        predicates = {}
+
+        def get_predicate(name):
+            predicate = predicates.get(name)
+            if predicate is None:
+                if name.startswith("http://"):
+                    predicate = rdflib.URIRef(name)
                 else:
-                    v = values
-                    graph.add(triple_yield(resource, property, v))
-
-        return graph
+                    predicate = translator.pyattr2predicate(name)
+                assert isinstance(predicate, rdflib.URIRef), "property %s is not a URIRef object" % predicate
+                predicates[name] = predicate
+            return predicate
+        return get_predicate
+
+    def _resource_triples(self, resource, get_predicate):
+        for name, value in iter_pairs(resource._properties):
+            yield triple_yield(resource, get_predicate(name), value)
+
+    def get_changes(self):
+        """Returns the triples (added, removed) by the changed and deleted
+        Resources compared to the last retrieved graph"""
+        predicates = self._get_predicate_lookup()
+        added, removed = set(), set()
+        dirty_uris = set()
+        for resource in self._dirty_resources:
+            current = set(self._resource_triples(resource, predicates))
+            stored = set(self._graph.triples((resource._uri, None, None)))
+            added |= current - stored
+            removed |= stored - current
+            dirty_uris.add(resource._uri)
+        for uri in self._deleted_resources - dirty_uris:
+            # unless it was created again, all statements about a deleted
+            # Resource are gone
+            removed.update(self._graph.triples((uri, None, None)))
+        return added, removed
 
     def get_resources(self):
         return Resource.objects.filter(_origin=self)
 
     def has_unsaved_changes(self):
-        # objects with changed attributes exist
-        if any(
-            resource._has_changes
-            for resource in self.get_resources()
-            if (hasattr(resource, '_has_changes') and
-                resource._has_changes is True)
-        ):
-            return True
-        return False
+        # objects with changed attributes exist or objects were deleted
+        return bool(self._dirty_resources or self._deleted_resources)
 
     def PUT(self):
         assert self.processed
@@ -360,13 +603,36 @@ class Origin(Model):
             logging.error("Nothing to PUT for %s!" % self.uri)
             return
 
-        graph = self.get_graph()
-        data = graph.serialize(format=self.backend.format)
-
-        self.backend.PUT(data=data)
-
-        for resource in Resource.objects.filter(_has_changes=True):
+        added, removed = self.get_changes()
+        has_bnodes = any(isinstance(term, rdflib.BNode)
+                         for triple in added | removed for term in triple)
+
+        if self.backend.supports_patch and not has_bnodes:
+            # only the changed triples are sent
+            if added or removed:
+                self.backend.PATCH(added=added, removed=removed)
+        elif self.backend.format in serializers.STREAMING_FORMATS:
+            # the document is written chunk by chunk while the triples are
+            # generated
+            data = serializers.serialize(self.iter_triples(),
+                                         format=self.backend.format,
+                                         namespaces=self.get_namespaces())
+            self.backend.PUT(data=data)
+        else:
+            data = self.get_graph().serialize(format=self.backend.format)
+            self.backend.PUT(data=data)
+
+        # the stored graph reflects the saved state again
+        for triple in removed:
+            self._graph.remove(triple)
+        for triple in added:
+            self._graph.add(triple)
+        self._graph_fingerprint = update_graph_fingerprint(
+            getattr(self, "_graph_fingerprint", None), added, removed)
+
+        for resource in list(self._dirty_resources):
             resource._has_changes = False
+        self._deleted_resources = set()
 
         assert not self.has_unsaved_changes(), "something went wrong"
 
@@ -384,9 +650,11 @@ def check_shortcut_consistency():
 
 
 class GraphHandler(object):
-    def __init__(self, origin, only_follow_uris, handle_owl_imports):
+    def __init__(self, origin, only_follow_uris, handle_owl_imports,
+                 frontier=None):
         self.origin = origin
         self.handle_owl_imports = handle_owl_imports
+        self.frontier = frontier
         if only_follow_uris is not None:
             only_follow_uris = [
                 rdflib.URIRef(u) if not
@@ -394,20 +662,38 @@ class GraphHandler(object):
             ]
         self.only_follow_uris = only_follow_uris
 
-    def populate_resources(self, graph):
-        namespace_short_notation_reverse_dict = {
-            unicode(rdflib_url): prefix
-            for rdflib_url, prefix in reverse_dict(
-                safe_dict(dict(graph.namespace_manager.namespaces()))
-            ).items()
-        }
+    def _get_translator(self, graph):
+        return get_predicate_translator(
+            safe_dict(dict(graph.namespace_manager.namespaces())))
+
+    def populate_resources(self, graph, triples=None, lazy=False):
+        """Creates the Resources of graph. If triples is given, only these
+        triples of graph are added to the existing Resources. With lazy,
+        only the discovered Origins are created"""
+        translator = self._get_translator(graph)
         reference_time = datetime.datetime.now()
 
-        for subject, predicate, obj_ect in graph:
+        if self.frontier is not None:
+            discovered_depth = (self.frontier.depth_of(self.origin) or 0) + 1
+
+        # Group the triples by subject and resolve every distinct
+        # predicate, followed uri and Resource only once
+        triples_by_subject = collections.defaultdict(list)
+        pyattrs = {}
+        resource_uris = set()
+        checked_objects = set()
+        followed_origin_uris = set()
+
+        for triple in (graph if triples is None else triples):
+            # the graph is accepted, its new terms are shared from now on
+            subject, predicate, obj_ect = intern_triple(triple)
             assert hasattr(subject, "n3")
 
-            # workaround for rdflib's unicode problems
-            assert predicate.encode('utf8')
+            if predicate not in pyattrs:
+                # workaround for rdflib's unicode problems
+                assert predicate.encode('utf8')
+                assert isinstance(predicate, rdflib.URIRef), "Not an URIRef: %s" % predicate
+                pyattrs[predicate] = translator.predicate2pyattr(predicate)
 
             if self.handle_owl_imports:
                 if (predicate == rdflib.OWL.imports and type(obj_ect) == rdflib.URIRef):
@@ -422,16 +708,70 @@ class GraphHandler(object):
                 self.only_follow_uris is not None and predicate in self.only_follow_uris
             ) or self.only_follow_uris is None):
                 if type(obj_ect) == rdflib.URIRef:
-                    # wrong scheme mailto, tel, callto --> should be Literal?
-                    if is_valid_url(obj_ect):
-                        obj_uriref = get_slash_url(obj_ect)
-                        Origin.objects.get_or_create(uri=obj_uriref)
-
-            resource, _created = Resource.objects.get_or_create(uri=subject, origin=self.origin)
-            resource._add_property(predicate, obj_ect, namespace_short_notation_reverse_dict)
+                    followed_origin_uris.add(obj_ect)
+
+            if lazy:
+                continue
+
+            if obj_ect not in checked_objects:
+                checked_objects.add(obj_ect)
+                if is_resource_uri(obj_ect):
+                    resource_uris.add(obj_ect)
+
+            triples_by_subject[subject].append((predicate, obj_ect))
+
+        origin_uris = set()
+        for obj_ect in followed_origin_uris:
+            # wrong scheme mailto, tel, callto --> should be Literal?
+            slash_uri = canonicalize_url(obj_ect)
+            if slash_uri is not None:
+                origin_uris.add(slash_uri)
+        for obj_uriref in origin_uris:
+            origin, _created = Origin.objects.get_or_create(uri=obj_uriref)
+            if self.frontier is not None:
+                self.frontier.add(origin, discovered_depth)
+
+        resources = Resource.objects.bulk_get_or_create(
+            set(triples_by_subject.keys()) | resource_uris,
+            origin=self.origin)
+
+        for subject, predicates_objects in triples_by_subject.items():
+            resource = resources[subject]
+            for predicate, obj_ect in predicates_objects:
+                if obj_ect in resource_uris:
+                    obj_ect = resources[obj_ect]
+                resource._set_property(pyattrs[predicate], obj_ect)
 
         now = datetime.datetime.now()
         self.origin.graph_handler_time = now - reference_time
 
-        for resource in self.origin.get_resources():
+        for resource in list(self.origin._dirty_resources):
+            resource._has_changes = False
+
+    def remove_triples(self, graph, triples):
+        """Removes triples from the existing Resources of the origin and
+        returns these Resources. Pass them to delete_empty_resources()
+        after the added triples were populated"""
+        translator = self._get_translator(graph)
+        resources = Resource.objects.bulk_get_or_create(
+            set(s for s, _p, _o in triples) |
+            set(o for _s, _p, o in triples if is_resource_uri(o)),
+            origin=self.origin)
+
+        for subject, predicate, obj_ect in triples:
+            if is_resource_uri(obj_ect):
+                obj_ect = resources[obj_ect]
+            resources[subject]._remove_property(
+                translator.predicate2pyattr(predicate), obj_ect)
+
+        for resource in list(self.origin._dirty_resources):
             resource._has_changes = False
+        return list(resources.values())
+
+    def delete_empty_resources(self, resources):
+        """Deletes the Resources that are left without any statement.
+        Resources whose statements were only replaced keep their
+        identity"""
+        for resource in resources:
+            if not resource._has_statements():
+                resource.delete()
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import array
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from xml.sax._exceptions import SAXParseException
+
+import rdflib
+from rdflib.store import Store
+from six.moves import cPickle as pickle
+
+from ldtools.terms import decode_term, encode_term, lookup, lookup_triple
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:  # Python 2 without the futures backport
+    ProcessPoolExecutor = None
+
+logger = logging.getLogger(__name__)
+
+
+def array_to_bytes(values):
+    """Returns the machine values of the array as bytes"""
+    if hasattr(values, "tobytes"):
+        return values.tobytes()
+    return values.tostring()  # Python 2
+
+
+def array_from_bytes(typecode, data):
+    """Returns an array of typecode holding the machine values data"""
+    values = array.array(str(typecode))
+    if hasattr(values, "frombytes"):
+        values.frombytes(data)
+    else:  # Python 2
+        values.fromstring(data)
+    return values
+
+
+class GraphSizeLimitExceeded(Exception):
+    "The parsed graph has more triples than allowed"
+
+
+_limited_store_classes = {}
+
+
+def get_limited_store(limit):
+    """Returns an instance of rdflib's default store that raises
+    GraphSizeLimitExceeded as soon as more than limit triples were added.
+
+    The limit is checked while parsing, so oversized documents are
+    aborted early instead of being parsed completely"""
+    base = rdflib.plugin.get("default", Store)
+    if base not in _limited_store_classes:
+
+        class LimitedStore(base):
+            def add(self, triple, context, quoted=False):
+                # graphs share the instances of interned terms. Terms are
+                # only interned when the graph is accepted, documents
+                # exceeding the limit do not grow the dictionary
+                triple = lookup_triple(triple)
+                base.add(self, triple, context, quoted=quoted)
+                if self.limit is None:
+                    return
+                self.added += 1
+                if self.added > self.limit:
+                    # duplicate triples were counted --> ask the store
+                    self.added = base.__len__(self, context)
+                    if self.added > self.limit:
+                        raise GraphSizeLimitExceeded(
+                            "More than %s triples" % self.limit)
+
+        _limited_store_classes[base] = LimitedStore
+
+    store = _limited_store_classes[base]()
+    store.limit = limit
+    store.added = 0
+    return store
+
+
+def parse_graph(identifier, data, format, limit=None):
+    """Parses data into a new ConjunctiveGraph. data is either the
+    document or a file-like object which is read while parsing.
+
+    Raises GraphSizeLimitExceeded if the graph exceeds limit triples"""
+    graph = rdflib.graph.ConjunctiveGraph(
+        store=get_limited_store(limit), identifier=identifier)
+
+    # Important: Do not pass data=data without publicID=uri because
+    # relative URIs (#deri) won't be an absolute uri in that case!
+    if isinstance(data, (bytes, unicode)):
+        graph.parse(data=data, publicID=identifier, format=format)
+    else:
+        graph.parse(source=data, publicID=identifier, format=format)
+
+    # the graph is complete, later additions are not limited
+    graph.store.limit = None
+    return graph
+
+
+def _parse_to_batch(identifier, data, format, limit):
+    """Parses data in a worker process. Returns the namespace bindings and
+    the triples as a table of distinct terms plus an array of term indexes,
+    which is much cheaper to send back than the pickled triples"""
+    try:
+        graph = parse_graph(identifier, data, format, limit=limit)
+    except SAXParseException as e:
+        # the exception holds the parser's locator, it cannot be pickled
+        raise rdflib.exceptions.ParserError("SAXParseException: %s" % e)
+    return graph_to_batch(graph)
+
+
+def graph_to_batch(graph):
+    """Returns the namespace bindings of graph and its triples as a table
+    of distinct terms plus an array of term indexes"""
+    term_ids = {}
+    terms = []
+    triples = array.array(str("l"))
+    for triple in graph:
+        for term in triple:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(terms)
+                terms.append(term)
+            triples.append(term_id)
+    namespaces = [(prefix, namespace) for prefix, namespace
+                  in graph.namespace_manager.namespaces()]
+    return namespaces, terms, triples
+
+
+def graph_from_batch(identifier, namespaces, terms, triples):
+    """Builds the ConjunctiveGraph returned by graph_to_batch again"""
+    terms = [lookup(term) for term in terms]
+
+    graph = rdflib.graph.ConjunctiveGraph(identifier=identifier)
+    for prefix, namespace in namespaces:
+        graph.bind(prefix, namespace, override=True)
+    context = graph.get_context(identifier)
+    graph.addN(
+        (terms[triples[i]], terms[triples[i + 1]],
+         terms[triples[i + 2]], context)
+        for i in range(0, len(triples), 3))
+    return graph
+
+
+class ParsePool(object):
+    """Parses documents in a pool of worker processes. rdflib's parsers are
+    pure Python and hold the GIL, so crawler threads can only parse in
+    parallel by handing the work to other processes.
+
+    parse_graph() can be used instead of the module function"""
+
+    def __init__(self, processes=None):
+        if ProcessPoolExecutor is None:
+            raise ImportError("ParsePool requires concurrent.futures. "
+                              "Install the futures backport")
+        self.executor = ProcessPoolExecutor(max_workers=processes)
+
+    def parse_graph(self, identifier, data, format, limit=None):
+        if not isinstance(data, (bytes, unicode)):
+            # file-like objects cannot be sent to other processes
+            data = data.read()
+        namespaces, terms, triples = self.executor.submit(
+            _parse_to_batch, identifier, data, format, limit).result()
+        return graph_from_batch(identifier, namespaces, terms, triples)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class GraphCache(object):
+    """Keeps parsed graphs in directory, keyed by the digest of the
+    document, its format and the URI it was parsed for: relative
+    references in the document are resolved against that URI. Documents
+    parsed before, in this or an earlier run, are not parsed again.
+
+    A cache file holds the namespace bindings and the table of distinct
+    terms, followed by the triples as array of term indexes which is read
+    by memory-mapping the file"""
+
+    magic = b"LDGRAPH1"
+    _header = struct.Struct(str("<8sI"))
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, identifier, data, format):
+        digest = hashlib.sha1(data)
+        digest.update(b"\0" + format.encode("utf-8"))
+        digest.update(b"\0" + unicode(identifier).encode("utf-8"))
+        return os.path.join(self.directory, digest.hexdigest() + ".graph")
+
+    def parse_graph(self, identifier, data, format, limit=None,
+                    parse=parse_graph):
+        """Returns the graph of data like parse_graph, parse is called
+        for documents that are not in the cache. File-like data is read
+        completely first to compute its digest"""
+        if not isinstance(data, (bytes, unicode)):
+            data = data.read()
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+
+        path = self._path(identifier, data, format)
+        if os.path.exists(path):
+            try:
+                graph = self._load(path, identifier, limit)
+            except (IOError, OSError, ValueError, struct.error,
+                    pickle.UnpicklingError) as e:
+                logger.warning("Ignoring broken graph cache file %s: %s"
+                               % (path, e))
+            else:
+                self.hits += 1
+                return graph
+
+        self.misses += 1
+        graph = parse(identifier=identifier, data=data, format=format,
+                      limit=limit)
+        self._store(path, graph)
+        return graph
+
+    def _store(self, path, graph):
+        namespaces, terms, triples = graph_to_batch(graph)
+        table = pickle.dumps(
+            ([(prefix, unicode(namespace)) for prefix, namespace
+              in namespaces], [encode_term(term) for term in terms]),
+            pickle.HIGHEST_PROTOCOL)
+        # the triples start 4-byte aligned
+        padding = b"\0" * (-(self._header.size + len(table)) % 4)
+
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory,
+                                              suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._header.pack(self.magic, len(table)))
+            f.write(table)
+            f.write(padding)
+            f.write(array_to_bytes(array.array(str("i"), triples)))
+        if os.path.exists(path):
+            # another thread stored the same document
+            os.remove(temporary_path)
+        else:
+            os.rename(temporary_path, path)
+
+    def _load(self, path, identifier, limit):
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, table_size = self._header.unpack_from(mapped, 0)
+            if magic != self.magic:
+                raise ValueError("Not a graph cache file")
+            offset = self._header.size + table_size
+            namespaces, terms = pickle.loads(mapped[self._header.size:offset])
+            offset += -offset % 4
+
+            if hasattr(memoryview, "cast"):
+                triples = memoryview(mapped)[offset:].cast(str("i"))
+            else:  # Python 2
+                triples = array_from_bytes("i", mapped[offset:])
+            try:
+                if limit is not None and len(triples) // 3 > limit:
+                    raise GraphSizeLimitExceeded(
+                        "More than %s triples" % limit)
+                return graph_from_batch(
+                    identifier, namespaces,
+                    [decode_term(term) for term in terms], triples)
+            finally:
+                # the map cannot be closed while a view of it exists
+                if isinstance(triples, memoryview):
+                    triples.release()
+        finally:
+            mapped.close()
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".graph"):
+                os.remove(os.path.join(self.directory, filename))
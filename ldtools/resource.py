@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
+import collections
 import logging
+import weakref
+
 import rdflib
+from six.moves import zip
 
-from ldtools.metamodels import Manager, Model
+from ldtools.metamodels import Manager, Model, store_lock
 from ldtools.models import URIRefField, ObjectField
+from ldtools.terms import TermDictionary, intern, terms
 from ldtools.utils import (
+    get_predicate_translator,
     get_rdflib_uriref,
     get_slash_url,
     predicate2pyattr,
@@ -13,11 +19,290 @@ from ldtools.utils import (
 
 logger = logging.getLogger(__name__)
 
+# the python attribute names of rdf properties, e.g. "foaf_name"
+attribute_names = TermDictionary()
+
+
+def is_resource_uri(obj):
+    """BNodes and http URIs are represented as Resource objects"""
+    if isinstance(obj, rdflib.BNode):
+        return True
+    elif isinstance(obj, rdflib.URIRef):
+        if not isinstance(obj, rdflib.Literal):
+            o = urlparse.urlparse(obj)
+            if o.scheme == "http":
+                return True
+            else:
+                logger.debug("Not a Resource URI because not valid: %s "
+                             "--> should be rdflib.Literals?" % obj)
+    return False
+
+
+_storage_attributes = frozenset(["_properties", "_referrers", "_lazy"])
+_collection_types = (tuple, set)
+
+_missing = object()
+
+# several values are kept in a tuple, which is much smaller than a set, and
+# in a set once there are more than this many
+MAX_TUPLE_VALUES = 8
+
+
+def iter_pairs(values):
+    """Iterates the (name, value) pairs of a property dict"""
+    for name, value in values.items():
+        if type(value) in _collection_types:
+            for member in value:
+                yield name, member
+        else:
+            yield name, value
+
+
+def _as_dict(values):
+    return dict(
+        (name, frozenset(value) if type(value) in _collection_types
+         else value)
+        for name, value in values.items())
+
+
+def _is_same(value, obj):
+    # Resources are the same object, Model.__eq__ compares all attributes
+    return value is obj or (not isinstance(obj, Model) and value == obj)
+
+
+def _add_value(values, name, obj):
+    """Adds obj to the values of name in the property dict values.
+    Returns False if it is there already"""
+    value = values.get(name, _missing)
+    if value is _missing:
+        values[name] = obj
+    elif type(value) is set:
+        if obj in value:
+            return False
+        value.add(obj)
+    elif type(value) is tuple:
+        if any(_is_same(member, obj) for member in value):
+            return False
+        if len(value) < MAX_TUPLE_VALUES:
+            values[name] = value + (obj,)
+        else:
+            values[name] = set(value + (obj,))
+    elif _is_same(value, obj):
+        return False
+    else:
+        values[name] = (value, obj)
+    return True
+
+
+def _discard_value(values, name, obj):
+    """Removes obj from the values of name in the property dict values.
+    Returns False if it is not there"""
+    value = values.get(name, _missing)
+    if type(value) is set:
+        if obj not in value:
+            return False
+        value.discard(obj)
+        if len(value) == 1:
+            values[name] = value.pop()
+    elif type(value) is tuple:
+        rest = tuple(member for member in value
+                     if not _is_same(member, obj))
+        if len(rest) == len(value):
+            return False
+        values[name] = rest[0] if len(rest) == 1 else rest
+    elif value is not _missing and _is_same(value, obj):
+        del values[name]
+    else:
+        return False
+    return True
+
 
 class ResourceManager(Manager):
+    """Resources of lazy Origins are not created when the Origin is
+    retrieved. get(), filter() and all() build a view of a Resource from
+    the Origin's graph on first access, its properties are read from the
+    graph when they are first used. Of the views, only the max_views most
+    recently used are kept in the store, clean views beyond that are
+    evicted and rebuilt when they are accessed again"""
+    max_views = 100000
+
+    def reset_store(self):
+        super(ResourceManager, self).reset_store()
+        # the shared instances of terms and names are only used by
+        # Resources and the graphs of their Origins
+        terms.clear()
+        attribute_names.clear()
+        # lazy Origin --> PredicateTranslator of its graph
+        self._lazy_origins = {}
+        # evicted views are reused as long as they are referenced
+        self._views = weakref.WeakValueDictionary()
+        self._recent_views = collections.OrderedDict()
+
     def get_pk(self, origin_uri, uri):
         return origin_uri + uri
 
+    def add_lazy_origin(self, origin):
+        """Resources of origin are built from origin._graph on access"""
+        with store_lock:
+            self._lazy_origins[origin] = get_predicate_translator(
+                origin.get_namespaces())
+
+    def is_lazy(self, origin):
+        return origin in self._lazy_origins
+
+    def discard_views(self, origin):
+        """Forgets the views of origin, e.g. because its graph changed"""
+        with store_lock:
+            for pk, view in list(self._views.items()):
+                if view._origin is origin:
+                    self.delete(pk)
+
+    def get_loaded(self, origin):
+        """Returns the Resources of origin whose properties are in
+        memory: the loaded views and the Resources that were created"""
+        with store_lock:
+            resources = set(super(ResourceManager, self).filter(
+                _origin=origin))
+            resources.update(view for view in list(self._views.values())
+                             if view._origin is origin)
+        return [resource for resource in resources if not resource._lazy]
+
+    def _get_view(self, origin, uri, check_graph=True):
+        """Returns the Resource of uri of the lazy origin or None if the
+        graph of origin does not mention uri"""
+        pk = self.get_pk(origin_uri=origin.uri, uri=uri)
+        with store_lock:
+            view = self._storage.get(pk)
+            if view is None:
+                view = self._views.get(pk)
+                if view is not None:
+                    self.add(view)
+            if view is None:
+                graph = origin._graph
+                if check_graph and (uri in origin._deleted_resources or (
+                        (uri, None, None) not in graph and
+                        (None, None, uri) not in graph)):
+                    return None
+                view, = self.bulk_create([
+                    (pk, dict(_uri=intern(uri), _origin=origin))])
+                view.__dict__["_lazy"] = True
+                view._has_changes = False
+                self._views[pk] = view
+            if pk in self._views:
+                self._touch_view(pk)
+        return view
+
+    def _touch_view(self, pk):
+        recent = self._recent_views
+        recent.pop(pk, None)
+        recent[pk] = None
+        excess = len(recent) - self.max_views
+        if excess <= 0:
+            return
+        evicted = []
+        for old_pk in recent:
+            view = self._storage.get(old_pk)
+            if view is None or not view._has_changes:
+                evicted.append(old_pk)
+                if len(evicted) == excess:
+                    break
+        for old_pk in evicted:
+            del recent[old_pk]
+            if old_pk in self._storage:
+                # the view stays in _views while it is referenced
+                super(ResourceManager, self).delete(old_pk)
+
+    def _get_all_views(self, origin):
+        graph = origin._graph
+        uris = set(graph.subjects())
+        uris.update(obj_ect for obj_ect in graph.objects()
+                    if is_resource_uri(obj_ect))
+        uris.difference_update(origin._deleted_resources)
+        return [self._get_view(origin, uri, check_graph=False)
+                for uri in uris]
+
+    def _get_lazy_views(self, origin=None, uri=None):
+        if not self._lazy_origins:
+            return []
+        if uri is not None and (
+                isinstance(uri, rdflib.Literal) or
+                not isinstance(uri, (rdflib.URIRef, rdflib.BNode))):
+            return []
+        if origin is None:
+            origins = list(self._lazy_origins)
+        elif origin in self._lazy_origins:
+            origins = [origin]
+        else:
+            return []
+
+        views = []
+        for lazy_origin in origins:
+            if uri is None:
+                views.extend(self._get_all_views(lazy_origin))
+            else:
+                view = self._get_view(lazy_origin, uri)
+                if view is not None:
+                    views.append(view)
+        return views
+
+    def load_view(self, view):
+        """Adds the properties of view from the graph of its Origin"""
+        with store_lock, self.pinned():
+            if not view.__dict__.pop("_lazy", False):
+                return
+            origin = view._origin
+            translator = self._lazy_origins[origin]
+            for predicate, obj_ect in origin._graph.predicate_objects(
+                    view._uri):
+                if is_resource_uri(obj_ect):
+                    obj_ect = self._get_view(origin, obj_ect,
+                                             check_graph=False)
+                view._set_property(translator.predicate2pyattr(predicate),
+                                   obj_ect)
+
+    def load_referrers(self, view):
+        """Loads the views referencing view, they link back to view"""
+        with store_lock:
+            origin = view._origin
+            for subject in set(origin._graph.subjects(None, view._uri)):
+                self.load_view(
+                    self._get_view(origin, subject, check_graph=False))
+
+    def all(self):
+        views = self._get_lazy_views()
+        resources = list(super(ResourceManager, self).all())
+        if views:
+            stored = set(id(resource) for resource in resources)
+            resources.extend(view for view in views
+                             if id(view) not in stored)
+        return resources
+
+    def filter(self, **kwargs):
+        views = self._get_lazy_views(kwargs.get("_origin"),
+                                     kwargs.get("_uri"))
+        results = super(ResourceManager, self).filter(**kwargs)
+        if not views:
+            return results
+        # views evicted meanwhile are not found in the store
+        return self._add_views(results, views, kwargs)
+
+    def _add_views(self, results, views, kwargs):
+        found = set()
+        for resource in results:
+            found.add(id(resource))
+            yield resource
+        for view in views:
+            if id(view) not in found and all(
+                    self._matches(view, key, value)
+                    for key, value in kwargs.items()):
+                yield view
+
+    def delete(self, pk):
+        with store_lock:
+            self._views.pop(pk, None)
+            self._recent_views.pop(pk, None)
+            super(ResourceManager, self).delete(pk)
+
     def create(self, uri, origin, **kwargs):
 
         # from ldtools.origin import Origin <-- import circle problem
@@ -25,7 +310,11 @@ class ResourceManager(Manager):
         assert origin is not None
         assert origin.processed, ("Origin has to be processed before creating more Resource objects: origin.GET()")
 
-        uri = get_rdflib_uriref(uri)
+        uri = intern(get_rdflib_uriref(uri))
+
+        if origin in self._lazy_origins:
+            # a Resource described by the graph already exists
+            self._get_view(origin, uri)
 
         pk = self.get_pk(origin_uri=origin.uri, uri=uri)
         return super(ResourceManager, self).create(
@@ -62,6 +351,11 @@ class ResourceManager(Manager):
                     % ", ".join([unicode(r._origin.uri) for r in filter_result])
                 )
 
+        if origin in self._lazy_origins:
+            view = self._get_view(origin, uri)
+            if view is not None:
+                return view
+
         pk = self.get_pk(origin_uri=origin.uri, uri=uri)
         return super(ResourceManager, self).get(pk=pk)
         assert 0, "implement!"
@@ -73,6 +367,68 @@ class ResourceManager(Manager):
         except self.model.DoesNotExist:
             return self.create(uri=uri, origin=origin), True
 
+    def bulk_get_or_create(self, uris, origin):
+        """Returns a dict mapping every uri to its Resource of origin.
+        Missing Resources are created with a single bulk_create"""
+        assert origin is not None
+        assert origin.processed, ("Origin has to be processed before creating more Resource objects: origin.GET()")
+
+        resources = {}
+        missing = []
+        for uri in uris:
+            uriref = get_rdflib_uriref(uri)
+            pk = self.get_pk(origin_uri=origin.uri, uri=uriref)
+            resource = self._storage.get(pk)
+            if resource is not None:
+                resources[uri] = resource
+            else:
+                missing.append((uri, pk, uriref))
+
+        created = self.bulk_create([
+            (pk, dict(_uri=intern(uriref), _origin=origin))
+            for _uri, pk, uriref in missing
+        ])
+        for (uri, _pk, _uriref), resource in zip(missing, created):
+            resources[uri] = resource
+        return resources
+
+    def restore(self, origin, uris, statements):
+        """Adds the Resources of origin with the interned uris and their
+        statements (subject, attribute name, value), e.g. of a snapshot.
+        Values among uris are linked to their Resources, statements about
+        other subjects are skipped. The store must not hold Resources of
+        origin yet, nothing is checked or compared"""
+        resources = {}
+        for uri in uris:
+            resource = self.model.__new__(self.model)
+            resource.__dict__.update(
+                pk=self.get_pk(origin_uri=origin.uri, uri=uri),
+                _uri=uri, _origin=origin)
+            resources[uri] = resource
+
+        names = {}
+        for subject, name, value in statements:
+            resource = resources.get(subject)
+            if resource is None:
+                continue
+            if name not in names:
+                names[name] = attribute_names.intern_name(name)
+            name = names[name]
+            value = resources.get(value, value)
+            properties = resource.__dict__.get("_properties")
+            if properties is None:
+                properties = resource.__dict__["_properties"] = {}
+            if _add_value(properties, name, value) and (
+                    isinstance(value, Resource)):
+                referrers = value.__dict__.get("_referrers")
+                if referrers is None:
+                    referrers = value.__dict__["_referrers"] = {}
+                _add_value(referrers, name, resource)
+
+        for resource in resources.values():
+            self.add(resource)
+        return resources
+
 
 class Resource(Model):
     _uri = URIRefField()
@@ -101,53 +457,183 @@ class Resource(Model):
         assert isinstance(predicate, rdflib.URIRef), "Not an URIRef: %s" % predicate
         assert hasattr(predicate, "n3"), "property %s is not a rdflib object" % predicate
 
-        # add Resource object directly instead of uriref
-        # hash function is important for that!
-        is_resource = False
-        if isinstance(obj, rdflib.BNode):
-            is_resource = True
-        elif isinstance(obj, rdflib.URIRef):
-            if not isinstance(obj, rdflib.Literal):
-                o = urlparse.urlparse(obj)
-                if o.scheme == "http":
-                    is_resource = True
-                else:
-                    logger.debug("Not a Resource URI because not valid: %s "
-                                 "--> should be rdflib.Literals?" % obj)
-
         predicate = predicate2pyattr(
             predicate, namespace_short_notation_reverse_dict)
 
-        if is_resource:
+        # add Resource object directly instead of uriref
+        # hash function is important for that!
+        if is_resource_uri(obj):
             logger.debug(
                 "%s . %s = Resource( %s )" % (self._uri, predicate, obj))
             obj, _created = Resource.objects.get_or_create(
                 uri=obj, origin=self._origin)
 
-            if not hasattr(obj, "_reverse"):
-                obj._reverse = {}
-            if predicate in obj._reverse:
-                if not isinstance(obj._reverse[predicate], set):
-                    obj._reverse[predicate] = set([obj._reverse[predicate]])
-                obj._reverse[predicate].add(self)
-            else:
-                obj._reverse[predicate] = self
-
-        if predicate in self.__dict__:
-            attr = self.__dict__[predicate]
-            if not type(attr) == set:
-                self.__dict__[predicate] = set([attr])
-                attr = self.__dict__[predicate]
-            attr.add(obj)
-            assert obj in self.__dict__[predicate]
-        else:
-            self.__dict__[predicate] = obj
+        self._set_property(predicate, obj)
+
+    # rdf properties are stored in dicts instead of instance attributes:
+    # _properties maps attribute names to the values of self, _referrers
+    # to the Resources referencing self. A name maps to its single value,
+    # to a tuple of several values or to a set of more than
+    # MAX_TUPLE_VALUES. The names are the shared instances of
+    # attribute_names. The dicts are created when the first value is
+    # added, the class defaults are never modified. Views of lazy Origins
+    # are _lazy until their properties are read from the graph
+    _properties = {}
+    _referrers = {}
+    _has_changes = False
+    _lazy = False
+
+    def __getattr__(self, key):
+        """Returns the value of the rdf property key: a single value or a
+        frozenset if there are several. Assign the attribute to change
+        the values"""
+        if key.startswith("_"):
+            raise AttributeError(key)
+        if self._lazy:
+            Resource.objects.load_view(self)
+        value = self._properties.get(key, _missing)
+        if value is _missing:
+            raise AttributeError(key)
+        if type(value) in _collection_types:
+            return frozenset(value)
+        return value
+
+    def __delattr__(self, key):
+        if key.startswith("_") or key == "pk" or key in self._meta.fields:
+            Model.__delattr__(self, key)
+            return
+        if not hasattr(self, key):
+            raise AttributeError(key)
+        self._remove_properties(key)
+        self._has_changes = True
 
-        assert predicate in self.__dict__
+    @property
+    def _reverse(self):
+        """Maps attribute names to the Resources referencing self"""
+        if Resource.objects.is_lazy(self._origin):
+            Resource.objects.load_referrers(self)
+        return _as_dict(self._referrers)
+
+    def get_properties(self):
+        """Returns a dict of the rdf properties: attribute name -> a single
+        value or a frozenset of values"""
+        if self._lazy:
+            Resource.objects.load_view(self)
+        return _as_dict(self._properties)
+
+    def as_dict(self):
+        properties = self.get_properties()
+        properties.update((name, getattr(self, name))
+                          for name in self._meta.fields)
+        return properties
+
+    def __setstate__(self, state):
+        # restores the shared instances of names and terms
+        for key in _storage_attributes & set(state):
+            values = state[key]
+            if isinstance(values, dict):
+                state[key] = dict(
+                    (attribute_names.intern_name(name),
+                     type(value)(intern(member) for member in value)
+                     if type(value) in _collection_types
+                     else intern(value))
+                    for name, value in values.items())
+        if "_uri" in state:
+            state["_uri"] = intern(state["_uri"])
+        Model.__setstate__(self, state)
+
+    def _attribute_names(self):
+        return [name for name in Model._attribute_names(self)
+                if name not in _storage_attributes] + list(
+            self.get_properties())
+
+    def _get_values(self, key):
+        if self._lazy:
+            Resource.objects.load_view(self)
+        value = self._properties.get(key, _missing)
+        if value is _missing:
+            return []
+        if type(value) in _collection_types:
+            return list(value)
+        return [value]
+
+    def _set_property(self, predicate, obj):
+        """Adds obj to the values of the python attribute predicate and
+        links Resource values back to self"""
+        if self._lazy:
+            Resource.objects.load_view(self)
+        if not isinstance(obj, Resource):
+            obj = intern(obj)
+        name = attribute_names.intern_name(predicate)
+        # self and obj are not evicted before their changes are reported
+        with Resource.objects.pinned():
+            if "_properties" not in self.__dict__:
+                self.__dict__["_properties"] = {}
+            if not _add_value(self._properties, name, obj):
+                return
+
+            if isinstance(obj, Resource):
+                if "_referrers" not in obj.__dict__:
+                    obj.__dict__["_referrers"] = {}
+                _add_value(obj._referrers, name, self)
+                Resource.objects.changed(obj)
+
+            Resource.objects.changed(self)
+            Resource.objects.index_add(self, name, obj)
+
+    def _remove_property(self, predicate, obj):
+        """Reverts _set_property: removes obj from the values of the
+        python attribute predicate and the reverse link of Resource values"""
+        if self._lazy:
+            Resource.objects.load_view(self)
+        if predicate not in attribute_names:
+            return
+        if not isinstance(obj, Resource):
+            obj = intern(obj)
+        name = attribute_names.intern_name(predicate)
+        with Resource.objects.pinned():
+            if not _discard_value(self._properties, name, obj):
+                return
+
+            if isinstance(obj, Resource):
+                if _discard_value(obj._referrers, name, self):
+                    Resource.objects.changed(obj)
+
+            Resource.objects.changed(self)
+            Resource.objects.index_remove(self, name, obj)
+
+    def _remove_properties(self, predicate):
+        for obj in self._get_values(predicate):
+            self._remove_property(predicate, obj)
+
+    def _has_statements(self):
+        """True if self is subject or object of any statement"""
+        if self._lazy:
+            Resource.objects.load_view(self)
+        return bool(self._properties) or bool(self._referrers)
+
+    def _track_changes(self, has_changes):
+        """Keeps the Origin's set of changed Resources up to date"""
+        origin = self.__dict__.get("_origin")
+        dirty_resources = getattr(origin, "_dirty_resources", None)
+        if dirty_resources is None:
+            return
+        if has_changes == (self in dirty_resources):
+            return
+        if has_changes:
+            dirty_resources.add(self)
+        else:
+            dirty_resources.discard(self)
+        origin._default_manager.changed(origin)
 
     def __setattr__(self, key, value):
         if key == "_has_changes":
-            Model.__setattr__(self, key, value)
+            # False is the class default, only changed Resources store it
+            if value:
+                Model.__setattr__(self, key, value)
+            elif self.__dict__.pop(key, None) is not None:
+                Resource.objects.changed(self)
+            self._track_changes(value)
             return
 
         if key in self._meta.fields:
@@ -156,14 +642,26 @@ class Resource(Model):
                 value = field.to_python(value)
         elif not key.startswith("_") and not key == "pk":
             # Assumption: rdf attributes do not start with "_"
-            pass
+            self._remove_properties(key)
+            for obj in (value if isinstance(value, (set, frozenset))
+                        else [value]):
+                self._set_property(key, obj)
+            self._has_changes = True
+            return
 
         Model.__setattr__(self, key, value)
         self._has_changes = True
 
     def delete(self):
         if hasattr(self, "pk") and self.pk is not None:
-            self.__class__.objects._storage.__delitem__(self.pk)
+            self._track_changes(False)
+            self.__class__.objects.delete(self.pk)
+            origin = self.__dict__.get("_origin")
+            if hasattr(origin, "_graph") and (
+                    self._uri, None, None) in origin._graph:
+                # the next PUT removes the Resource's statements
+                origin._deleted_resources.add(self._uri)
+                origin._default_manager.changed(origin)
 
     def save(self):
         created = not self.pk
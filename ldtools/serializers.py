@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Streaming N-Triples and Turtle writers.
+
+Triples are written as they are generated, no rdflib.Graph is built up
+in memory. Use serialize() to get the document chunk by chunk or write()
+to write it to a file-like object"""
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import re
+
+import rdflib
+
+CHUNK_SIZE = 64 * 1024
+
+_LOCAL_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_\-]*$")
+
+
+def _nt_term(term):
+    if isinstance(term, rdflib.Literal):
+        # N-Triples has no long strings, line breaks are escaped
+        value = (term.replace("\\", "\\\\").replace('"', '\\"')
+                 .replace("\n", "\\n").replace("\r", "\\r"))
+        if term.language:
+            return '"%s"@%s' % (value, term.language)
+        if term.datatype:
+            return '"%s"^^<%s>' % (value, term.datatype)
+        return '"%s"' % value
+    return term.n3()
+
+
+def _ntriples_lines(triples, namespaces):
+    for subject, predicate, obj_ect in triples:
+        yield "%s %s %s .\n" % (
+            _nt_term(subject), _nt_term(predicate), _nt_term(obj_ect))
+
+
+class _TurtleTerms(object):
+    """Abbreviates URIs with the given namespace prefixes"""
+
+    def __init__(self, namespaces):
+        self.prefixes = dict(
+            (unicode(namespace), prefix)
+            for prefix, namespace in (namespaces or {}).items())
+
+    def n3(self, term):
+        if isinstance(term, rdflib.URIRef):
+            for separator in "#/":
+                index = term.rfind(separator)
+                if index == -1:
+                    continue
+                prefix = self.prefixes.get(unicode(term[:index + 1]))
+                local_name = term[index + 1:]
+                if prefix is not None and _LOCAL_NAME.match(local_name):
+                    return "%s:%s" % (prefix, local_name)
+        return term.n3()
+
+
+def _turtle_lines(triples, namespaces):
+    terms = _TurtleTerms(namespaces)
+    for prefix, namespace in sorted((namespaces or {}).items()):
+        yield "@prefix %s: <%s> .\n" % (prefix, namespace)
+    yield "\n"
+
+    last_subject = last_predicate = None
+    for subject, predicate, obj_ect in triples:
+        if subject == last_subject and predicate == last_predicate:
+            line = " ,\n        %s" % terms.n3(obj_ect)
+        else:
+            if predicate == rdflib.RDF.type:
+                predicate_n3 = "a"
+            else:
+                predicate_n3 = terms.n3(predicate)
+            if subject == last_subject:
+                line = " ;\n    %s %s" % (predicate_n3, terms.n3(obj_ect))
+            else:
+                line = "%s%s\n    %s %s" % (
+                    " .\n\n" if last_subject is not None else "",
+                    terms.n3(subject), predicate_n3, terms.n3(obj_ect))
+        last_subject, last_predicate = subject, predicate
+        yield line
+
+    if last_subject is not None:
+        yield " .\n"
+
+
+_writers = {
+    "nt": _ntriples_lines,
+    "nt11": _ntriples_lines,
+    "ntriples": _ntriples_lines,
+    "n3": _turtle_lines,
+    "turtle": _turtle_lines,
+    "ttl": _turtle_lines,
+}
+
+STREAMING_FORMATS = frozenset(_writers)
+
+
+def serialize(triples, format, namespaces=None, chunk_size=CHUNK_SIZE):
+    """Generates the utf-8 encoded document of triples in chunks of about
+    chunk_size bytes. namespaces maps prefixes to namespaces, they are
+    used to abbreviate URIs in Turtle documents"""
+    if format not in _writers:
+        raise ValueError("No streaming serializer for format %s" % format)
+
+    buffered = []
+    size = 0
+    for line in _writers[format](triples, namespaces):
+        line = line.encode("utf8")
+        buffered.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b"".join(buffered)
+            buffered = []
+            size = 0
+    if buffered:
+        yield b"".join(buffered)
+
+
+def sparql_update(added, removed):
+    """Returns the utf-8 encoded SPARQL Update request that deletes the
+    triples removed and inserts the triples added. Blank nodes cannot be
+    deleted with DELETE DATA"""
+    operations = []
+    if removed:
+        operations.append("DELETE DATA {\n%s}" % "".join(
+            _ntriples_lines(removed, None)))
+    if added:
+        operations.append("INSERT DATA {\n%s}" % "".join(
+            _ntriples_lines(added, None)))
+    return (" ;\n".join(operations) + "\n").encode("utf8")
+
+
+def write(triples, stream, format, namespaces=None):
+    """Writes the document of triples to the file-like object stream"""
+    for chunk in serialize(triples, format, namespaces=namespaces):
+        stream.write(chunk)
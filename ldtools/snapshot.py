@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""Snapshots of everything a crawl produced.
+
+A snapshot holds one table of the distinct RDF terms of all Origins and,
+per Origin, its attributes plus arrays of term indexes: the triples of
+the retrieved graph, the Resources and the unsaved changes. Loading it
+rebuilds the Origins and Resources much faster than parsing the
+documents again. Use Origin.objects.save_snapshot(path) and
+Origin.objects.load_snapshot(path)"""
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import array
+import logging
+import os
+
+import rdflib
+from six.moves import cPickle as pickle
+
+from ldtools.metamodels import store_lock
+from ldtools.origin import Origin
+from ldtools.parsing import array_from_bytes, array_to_bytes
+from ldtools.resource import Resource, is_resource_uri
+from ldtools.terms import decode_term, encode_term, intern
+from ldtools.utils import get_predicate_translator
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+# Origin attributes that are stored as term arrays or rebuilt on load
+_origin_skip_attributes = frozenset(["_graph", "_dirty_resources",
+                                     "_deleted_resources"])
+
+
+class SnapshotError(Exception):
+    "The file is not a snapshot of a supported version"
+
+
+class _TermTable(object):
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+
+    def id_array(self, terms):
+        """Returns the ids of terms as bytes of an array"""
+        ids = array.array(str("i"))
+        for term in terms:
+            term_id = self.ids.get(term)
+            if term_id is None:
+                term_id = self.ids[term] = len(self.terms)
+                self.terms.append(term)
+            ids.append(term_id)
+        return array_to_bytes(ids)
+
+
+def _flatten(triples):
+    for triple in triples:
+        for term in triple:
+            yield term
+
+
+def _origin_record(origin, table):
+    meta = dict((key, value) for key, value in origin.__dict__.items()
+                if key not in _origin_skip_attributes)
+    record = dict(meta=meta, lazy=Resource.objects.is_lazy(origin))
+    if not hasattr(origin, "_graph"):
+        return record
+
+    record["namespaces"] = [
+        (prefix, unicode(namespace))
+        for prefix, namespace in origin._graph.namespace_manager.namespaces()]
+    record["graph"] = table.id_array(_flatten(origin._graph))
+
+    if record["lazy"]:
+        resources = Resource.objects.get_loaded(origin)
+    else:
+        resources = list(origin.get_resources())
+    record["resources"] = table.id_array(
+        resource._uri for resource in resources)
+
+    added, removed = origin.get_changes()
+    record["added"] = table.id_array(_flatten(added))
+    record["removed"] = table.id_array(_flatten(removed))
+    dirty = set(resource._uri for resource in origin._dirty_resources)
+    record["dirty"] = table.id_array(dirty)
+    # Resources created again after their deletion are restored as dirty
+    record["deleted"] = table.id_array(origin._deleted_resources - dirty)
+    return record
+
+
+def save_snapshot(path):
+    """Writes every Origin and Resource to the file path"""
+    table = _TermTable()
+    with store_lock:
+        records = [_origin_record(origin, table)
+                   for origin in Origin.objects.all()]
+    snapshot = dict(
+        version=VERSION,
+        terms=[encode_term(term) for term in table.terms],
+        origins=records)
+
+    # a crash while writing does not destroy an older snapshot
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(temporary_path, path)
+    logger.info("Saved %s Origins and %s terms to %s"
+                % (len(records), len(table.terms), path))
+
+
+def _terms_of(data, terms):
+    return [terms[term_id] for term_id in array_from_bytes("i", data)]
+
+
+def _triples_of(data, terms):
+    values = _terms_of(data, terms)
+    return list(zip(values[0::3], values[1::3], values[2::3]))
+
+
+def _restore_origin(record, terms, lazy):
+    origin = Origin.__new__(Origin)
+    origin.__dict__.update(record["meta"])
+    origin.__dict__["_dirty_resources"] = set()
+    origin.__dict__["_deleted_resources"] = set()
+    Origin.objects.add(origin)
+    if "graph" not in record:
+        return
+
+    graph = rdflib.graph.ConjunctiveGraph(identifier=origin.uri)
+    for prefix, namespace in record["namespaces"]:
+        graph.bind(prefix, namespace, override=True)
+    context = graph.get_context(origin.uri)
+    triples = _triples_of(record["graph"], terms)
+    # the terms are known to be valid, the store takes them directly
+    graph.store.addN((s, p, o, context) for s, p, o in triples)
+    origin.__dict__["_graph"] = graph
+
+    # the Origins discovered by this one are part of the snapshot, the
+    # Resources are built from the triples without looking anything up
+    translator = get_predicate_translator(origin.get_namespaces())
+    resource_uris = _terms_of(record["resources"], terms)
+    dirty = set(_terms_of(record["dirty"], terms))
+    if record["lazy"] or lazy:
+        Resource.objects.add_lazy_origin(origin)
+        # views are built from the graph on access. Only changed
+        # Resources and the ones the graph does not mention are restored
+        mentioned = set(s for s, _p, _o in triples)
+        mentioned.update(o for _s, _p, o in triples)
+        resources = {}
+        for uri in resource_uris:
+            if uri in dirty or uri not in mentioned:
+                resources[uri], _created = Resource.objects.get_or_create(
+                    uri, origin=origin)
+    else:
+        names = dict((predicate, translator.predicate2pyattr(predicate))
+                     for predicate in set(p for _s, p, _o in triples))
+        resources = Resource.objects.restore(
+            origin, resource_uris,
+            ((s, names[p], o) for s, p, o in triples))
+
+    # unsaved changes of the Resources
+    def get_value(obj_ect):
+        if not is_resource_uri(obj_ect):
+            return obj_ect
+        resource, _created = Resource.objects.get_or_create(
+            obj_ect, origin=origin)
+        return resource
+
+    deleted = set(_terms_of(record.get("deleted", b""), terms))
+    for subject, predicate, obj_ect in _triples_of(record["removed"], terms):
+        if subject in deleted:
+            continue
+        resources[subject]._remove_property(
+            translator.predicate2pyattr(predicate), get_value(obj_ect))
+    for subject, predicate, obj_ect in _triples_of(record["added"], terms):
+        resources[subject]._set_property(
+            translator.predicate2pyattr(predicate), get_value(obj_ect))
+
+    for resource in list(origin._dirty_resources):
+        resource._has_changes = False
+    for uri in dirty:
+        resources[uri]._has_changes = True
+    for uri in deleted:
+        resource, _created = Resource.objects.get_or_create(uri, origin=origin)
+        resource.delete()
+
+
+def load_snapshot(path, lazy=False):
+    """Replaces all Origins and Resources with the ones of the snapshot
+    written to path by save_snapshot(). With lazy, all Origins are
+    restored as lazy Origins, their Resources are built on access"""
+    with open(path, "rb") as f:
+        try:
+            snapshot = pickle.load(f)
+        except Exception as e:
+            raise SnapshotError("Cannot read snapshot %s: %s" % (path, e))
+    if not isinstance(snapshot, dict) or snapshot.get("version") != VERSION:
+        raise SnapshotError("%s is not a snapshot of version %s"
+                            % (path, VERSION))
+
+    terms = [decode_term(value) for value in snapshot["terms"]]
+    with store_lock:
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        # the snapshot is accepted, its terms are shared from now on
+        terms = [intern(term) for term in terms]
+        for record in snapshot["origins"]:
+            _restore_origin(record, terms, lazy)
+    logger.info("Loaded %s Origins from %s"
+                % (len(snapshot["origins"]), path))
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""Storage engines for the managers of ldtools.metamodels.
+
+By default a manager keeps its objects in a MemoryStorage dict, so a
+crawl is lost when the process exits. SQLiteStorage keeps them in a
+SQLite database instead::
+
+    from ldtools.storage import open_sqlite
+    open_sqlite("crawl.db")
+    Origin.objects.GET_all()
+    ...
+    Origin.objects.flush()
+    Resource.objects.flush()
+
+Processed Origins are not fetched again when the crawl is continued
+after a restart"""
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import collections
+import contextlib
+import io
+import logging
+import sqlite3
+import weakref
+
+from six.moves import cPickle as pickle
+
+from ldtools.metamodels import MemoryStorage, Model, models, store_lock
+
+logger = logging.getLogger(__name__)
+
+
+def _persistent_id(obj):
+    # objects of other managers are stored by reference, they are restored
+    # from their own storage
+    if isinstance(obj, Model):
+        model = type(obj).__dict__.get("_ghost_model", type(obj))
+        return (model.__name__, obj.pk)
+    return None
+
+
+def _persistent_load(pid):
+    model_name, pk = pid
+    return models[model_name]._default_manager._storage.reference(pk)
+
+
+def _ghost_getattribute(self, name):
+    if name in ("pk", "__class__"):
+        return object.__getattribute__(self, name)
+    type(self)._ghost_storage._activate(self)
+    return getattr(self, name)
+
+
+class SQLiteStorage(object):
+    """Stores the objects of one manager pickled in a table of a SQLite
+    database, together with the values of the indexed attributes.
+
+    Objects are loaded on access and kept in an identity map, so there is
+    only one instance per pk. The cache_size most recently used objects
+    stay in memory, older ones are turned into ghosts: empty instances
+    that load their state again when an attribute is accessed. Changes
+    are written in batches of flush_size objects and by flush().
+
+    Objects are only evicted after their changes were reported with
+    changed(): modifications of several objects run in a pinned() block,
+    eviction waits until the block ends"""
+
+    def __init__(self, path, table, cache_size=10000, flush_size=10000):
+        self.path = path
+        self.table = table
+        self.cache_size = cache_size
+        self.flush_size = flush_size
+        self.model = None
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # pk holds the text of the pks for lookups, key the pickled pk
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS {table} (
+                pk TEXT PRIMARY KEY, key BLOB, state BLOB);
+            CREATE TABLE IF NOT EXISTS {table}_index (
+                pk TEXT, key TEXT, value BLOB);
+            CREATE INDEX IF NOT EXISTS {table}_index_pk
+                ON {table}_index (pk);
+        """.format(table=table))
+        # the managers call the storage while holding store_lock, sharing
+        # it keeps the lock order and evictions out of running operations
+        self._lock = store_lock
+        self._pins = 0
+        # text of pk --> object
+        self._live = weakref.WeakValueDictionary()
+        self._hot = collections.OrderedDict()
+        self._dirty = {}
+
+    def bind(self, model):
+        self.model = model
+        # ghosts are switched to this subclass of model
+        self._ghost_class = type.__new__(
+            type(model), str("Ghost%s" % model.__name__), (model,), {
+                "__module__": model.__module__,
+                "__getattribute__": _ghost_getattribute,
+                "_ghost_model": model,
+                "_ghost_storage": self,
+            })
+
+    def _dumps(self, value):
+        stream = io.BytesIO()
+        pickler = pickle.Pickler(stream, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = _persistent_id
+        pickler.dump(value)
+        return sqlite3.Binary(stream.getvalue())
+
+    def _loads(self, data):
+        unpickler = pickle.Unpickler(io.BytesIO(bytes(data)))
+        unpickler.persistent_load = _persistent_load
+        return unpickler.load()
+
+    def _select_state(self, pk):
+        row = self._connection.execute(
+            "SELECT state FROM %s WHERE pk = ?" % self.table,
+            (unicode(pk),)).fetchone()
+        return None if row is None else row[0]
+
+    def _exists(self, pk):
+        # the state is not read, checking a key is cheap
+        return self._connection.execute(
+            "SELECT 1 FROM %s WHERE pk = ? LIMIT 1" % self.table,
+            (unicode(pk),)).fetchone() is not None
+
+    def _touch(self, instance):
+        hot = self._hot
+        key = unicode(instance.pk)
+        hot.pop(key, None)
+        hot[key] = instance
+        if not self._pins:
+            self._evict()
+
+    def _evict(self):
+        hot = self._hot
+        if len(hot) > self.cache_size:
+            # ghosts load their state from the database again. A quarter
+            # of the cache is evicted at once, every eviction writes the
+            # pending changes first. The last touched object is kept
+            self.flush()
+            while len(hot) > max(self.cache_size * 3 // 4, 1):
+                _key, old = hot.popitem(last=False)
+                pk = old.pk
+                old.__dict__.clear()
+                old.__dict__["pk"] = pk
+                object.__setattr__(old, "__class__", self._ghost_class)
+
+    def _activate(self, ghost):
+        with self._lock:
+            if type(ghost) is not self._ghost_class:
+                return
+            pk = object.__getattribute__(ghost, "pk")
+            object.__setattr__(ghost, "__class__", self.model)
+            data = self._select_state(pk)
+            if data is None:
+                raise self.model.DoesNotExist(pk)
+            ghost.__setstate__(self._loads(data))
+            self._touch(ghost)
+
+    @contextlib.contextmanager
+    def pinned(self):
+        """The objects loaded in the block stay in memory until it ends,
+        changes made in the block are not lost by evicting an object
+        before they were reported"""
+        with self._lock:
+            self._pins += 1
+            try:
+                yield
+            finally:
+                self._pins -= 1
+                if not self._pins:
+                    self._evict()
+
+    def reference(self, pk):
+        """Returns the object with pk, a ghost if it was not loaded yet"""
+        with self._lock:
+            instance = self._live.get(unicode(pk))
+            if instance is None:
+                instance = self._ghost_class.__new__(self._ghost_class)
+                object.__getattribute__(instance, "__dict__")["pk"] = pk
+                self._live[unicode(pk)] = instance
+            return instance
+
+    def __getitem__(self, pk):
+        with self._lock:
+            key = unicode(pk)
+            instance = self._live.get(key)
+            if instance is not None:
+                if type(instance) is not self._ghost_class:
+                    self._touch(instance)
+                elif not self._exists(pk):
+                    raise KeyError(pk)
+                return instance
+            data = self._select_state(pk)
+            if data is None:
+                raise KeyError(pk)
+            instance = self.model.__new__(self.model)
+            # references of the object to itself resolve to the instance
+            self._live[key] = instance
+            instance.__setstate__(self._loads(data))
+            self._touch(instance)
+            return instance
+
+    def get(self, pk, default=None):
+        try:
+            return self[pk]
+        except KeyError:
+            return default
+
+    def __contains__(self, pk):
+        with self._lock:
+            key = unicode(pk)
+            if key in self._dirty:
+                return True
+            instance = self._live.get(key)
+            if (instance is not None and
+                    type(instance) is not self._ghost_class):
+                # loaded from the database
+                return True
+            return self._exists(pk)
+
+    def __setitem__(self, pk, instance):
+        with self._lock:
+            self._live[unicode(pk)] = instance
+            self._dirty[unicode(pk)] = instance
+            self._touch(instance)
+            if len(self._dirty) >= self.flush_size:
+                self.flush()
+
+    def __delitem__(self, pk):
+        with self._lock:
+            if pk not in self:
+                raise KeyError(pk)
+            key = unicode(pk)
+            self._live.pop(key, None)
+            self._hot.pop(key, None)
+            self._dirty.pop(key, None)
+            with self._connection:
+                self._connection.execute(
+                    "DELETE FROM %s WHERE pk = ?" % self.table, (key,))
+                self._connection.execute(
+                    "DELETE FROM %s_index WHERE pk = ?" % self.table, (key,))
+
+    def is_stored(self, instance):
+        pk = getattr(instance, 'pk', None)
+        return pk is not None and self._live.get(unicode(pk)) is instance
+
+    def changed(self, instance):
+        with self._lock:
+            if self.is_stored(instance):
+                self._dirty[unicode(instance.pk)] = instance
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+            rows = []
+            index_rows = []
+            for key, instance in dirty.items():
+                rows.append((key, self._dumps(instance.pk),
+                             self._dumps(instance.__getstate__())))
+                for name in self.model._meta.indexes:
+                    if name in instance.__dict__:
+                        index_rows.append((key, name, self._dumps(
+                            (instance.pk, instance.__dict__[name]))))
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO %s (pk, key, state) "
+                    "VALUES (?, ?, ?)" % self.table, rows)
+                self._connection.executemany(
+                    "DELETE FROM %s_index WHERE pk = ?" % self.table,
+                    [(key,) for key in dirty])
+                self._connection.executemany(
+                    "INSERT INTO %s_index (pk, key, value) VALUES (?, ?, ?)"
+                    % self.table, index_rows)
+            logger.debug("Wrote %s objects to %s" % (len(rows), self.table))
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def keys(self):
+        with self._lock:
+            self.flush()
+            return [self._loads(row[0]) for row in self._connection.execute(
+                "SELECT key FROM %s" % self.table)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM %s" % self.table).fetchone()[0]
+
+    def values(self):
+        for pk in self.keys():
+            instance = self.get(pk)
+            if instance is not None:
+                yield instance
+
+    def items(self):
+        for instance in self.values():
+            yield instance.pk, instance
+
+    def iter_indexed(self, keys):
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(
+                "SELECT key, value FROM %s_index" % self.table).fetchall()
+        for name, value in rows:
+            if name in keys:
+                pk, value = self._loads(value)
+                yield pk, name, value
+
+
+def open_sqlite(path, cache_size=10000):
+    """Keeps the Origins and Resources in the SQLite database path, the
+    objects stored by a previous run are available again"""
+    from ldtools.origin import Origin
+    from ldtools.resource import Resource
+
+    # Resources refer to Origins, they are restored first
+    Origin.objects.set_storage(
+        SQLiteStorage(path, "origin", cache_size=cache_size))
+    Resource.objects.set_storage(
+        SQLiteStorage(path, "resource", cache_size=cache_size))
+
+
+__all__ = ["MemoryStorage", "SQLiteStorage", "open_sqlite"]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Process-wide dictionary of RDF terms.
+
+The same URIs and Literals occur in many graphs and Resources. Interning
+them keeps one instance per distinct term in memory, no matter how many
+graphs, Resource attributes and reverse links refer to it"""
+from __future__ import print_function, unicode_literals
+
+try:
+    unicode
+except NameError:
+    basestring = unicode = str  # Python 3
+
+import threading
+
+import rdflib
+
+
+class TermDictionary(object):
+    """Maps every distinct URIRef and Literal to one shared instance and a
+    stable integer id.
+
+    BNodes are local to their document and are not interned. Only terms
+    of accepted graphs are interned, parsing merely looks them up. The
+    dictionary lives as long as the Resources using its instances, it is
+    cleared with their store"""
+
+    def __init__(self):
+        self._ids = {}
+        self._terms = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, term):
+        return term in self._ids
+
+    def get_id(self, term):
+        """Returns the id of term, a new id is assigned to unknown terms"""
+        try:
+            return self._ids[term]
+        except KeyError:
+            with self._lock:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    term_id = len(self._terms)
+                    self._terms.append(term)
+                    self._ids[term] = term_id
+                return term_id
+
+    def get_term(self, term_id):
+        return self._terms[term_id]
+
+    def lookup(self, term):
+        """Returns the shared instance equal to term if there is one,
+        otherwise term. Unlike intern(), term is not added"""
+        term_id = self._ids.get(term)
+        return term if term_id is None else self._terms[term_id]
+
+    def lookup_triple(self, triple):
+        subject, predicate, obj_ect = triple
+        return self.lookup(subject), self.lookup(predicate), self.lookup(obj_ect)
+
+    def clear(self):
+        """Forgets all terms. Ids handed out before become invalid"""
+        with self._lock:
+            self._ids = {}
+            self._terms = []
+
+    def intern_name(self, name):
+        """Returns the shared instance equal to name, for any hashable"""
+        return self._terms[self.get_id(name)]
+
+    def intern(self, term):
+        """Returns the shared instance equal to term. Values that are not
+        URIRefs or Literals are returned unchanged"""
+        if isinstance(term, (rdflib.URIRef, rdflib.Literal)):
+            return self._terms[self.get_id(term)]
+        return term
+
+    def intern_triple(self, triple):
+        subject, predicate, obj_ect = triple
+        return self.intern(subject), self.intern(predicate), self.intern(obj_ect)
+
+
+terms = TermDictionary()
+intern = terms.intern
+intern_triple = terms.intern_triple
+lookup = terms.lookup
+lookup_triple = terms.lookup_triple
+
+
+def encode_term(term):
+    """Returns term as plain values that are cheap to pickle, URIRefs
+    are their text"""
+    if isinstance(term, rdflib.Literal):
+        return ("L", unicode(term),
+                None if term.datatype is None else unicode(term.datatype),
+                term.language)
+    elif isinstance(term, rdflib.BNode):
+        return ("B", unicode(term))
+    return unicode(term)
+
+
+def decode_term(value):
+    """Returns the term encoded by encode_term(), the shared instance if
+    the term is interned"""
+    if not isinstance(value, tuple):
+        return lookup(rdflib.URIRef(value))
+    if value[0] == "B":
+        return rdflib.BNode(value[1])
+    _kind, lexical, datatype, language = value
+    return lookup(rdflib.Literal(lexical, lang=language, datatype=datatype))
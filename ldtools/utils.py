@@ -12,14 +12,65 @@ try:
 except:
     import urllib.request as urllib2  # used in other modules
 
+import collections
+import threading
+
 import rdflib
 from rdflib.namespace import split_uri
 
 import logging
 
+try:
+    unicode
+except NameError:
+    unicode = str  # Python 3
+
 logger = logging.getLogger(__name__)
 
 
+class LRUCache(object):
+    """Bounded mapping that forgets the least recently used entries"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self))
+
+
 def get_parsed_uri(uri, scheme_check=False):
     parsed = urlparse.urlparse(uri)
     if scheme_check:
@@ -38,18 +89,30 @@ def get_parsed_uri(uri, scheme_check=False):
     return uri
 
 
+_MISSING = object()
+_canonical_urls = LRUCache(maxsize=65536)
+
+
+def canonicalize_url(uri):
+    """Returns the slash url of uri as rdflib.URIRef: scheme checked to be
+    http(s), parsed once and the fragment stripped. Returns None if uri is
+    not a http(s) url. Results are memoized in a bounded LRU cache"""
+    slash_url = _canonical_urls.get(uri, _MISSING)
+    if slash_url is _MISSING:
+        try:
+            slash_url = rdflib.URIRef(get_parsed_uri(uri, scheme_check=True))
+        except ValueError:
+            slash_url = None
+        # TODO: implement canonalization of URI. Problem: graph comparison
+        # not trivial
+        _canonical_urls[uri] = slash_url
+    return slash_url
+
+
 def is_valid_url(uri):
     if not uri:
         raise UriNotValid("An empty url is not valid")
-    try:
-        uri = get_parsed_uri(uri, scheme_check=True)
-    except ValueError:
-        return False
-    # TODO: implement canonalization of URI. Problem: graph comparison not
-    # trivial
-    if "http" not in uri:
-        return False
-    return True
+    return canonicalize_url(uri) is not None
 
 
 class UriNotValid(Exception):
@@ -88,10 +151,9 @@ def get_rdflib_uriref(uri):
 def get_slash_url(uri):
     """Converts Hash to Slash uri http://www.w3.org/wiki/HashURI"""
     assert is_valid_url(uri)
-    if not isinstance(uri, rdflib.URIRef):
-        uri = get_rdflib_uriref(uri)
-    uri = get_parsed_uri(uri)
-    return rdflib.URIRef(uri)
+    if isinstance(uri, rdflib.Literal):
+        raise UriNotValid("Cannot convert Literals")
+    return canonicalize_url(uri)
 
 
 def catchKeyboardInterrupt(func):
@@ -181,3 +243,51 @@ def pyattr2predicate(pyattr, namespace_dict):
         assert namespace_dict[prefix], (u"%s not in namespace_dict") % prefix
 
     return rdflib.URIRef(u"%s%s" % (namespace_dict[prefix], property_name))
+
+
+class PredicateTranslator(object):
+    """Memoizes predicate2pyattr and pyattr2predicate for one namespace
+    mapping {prefix: namespace}"""
+
+    def __init__(self, namespace_dict, maxsize=4096):
+        self.namespace_dict = namespace_dict
+        self.namespace_short_notation_reverse_dict = dict(
+            (unicode(namespace), prefix)
+            for prefix, namespace in namespace_dict.items())
+        self._pyattrs = LRUCache(maxsize)
+        self._predicates = LRUCache(maxsize)
+
+    def predicate2pyattr(self, predicate):
+        pyattr = self._pyattrs.get(predicate)
+        if pyattr is None:
+            pyattr = predicate2pyattr(
+                predicate, self.namespace_short_notation_reverse_dict)
+            self._pyattrs[predicate] = pyattr
+        return pyattr
+
+    def pyattr2predicate(self, pyattr):
+        predicate = self._predicates.get(pyattr)
+        if predicate is None:
+            predicate = pyattr2predicate(pyattr, self.namespace_dict)
+            self._predicates[pyattr] = predicate
+        return predicate
+
+    @property
+    def stats(self):
+        return dict(predicate2pyattr=self._pyattrs.stats,
+                    pyattr2predicate=self._predicates.stats)
+
+
+_predicate_translators = LRUCache(maxsize=128)
+
+
+def get_predicate_translator(namespace_dict):
+    """Returns the shared PredicateTranslator for a namespace mapping"""
+    key = frozenset(
+        (prefix, unicode(namespace))
+        for prefix, namespace in namespace_dict.items())
+    translator = _predicate_translators.get(key)
+    if translator is None:
+        translator = PredicateTranslator(dict(namespace_dict))
+        _predicate_translators[key] = translator
+    return translator
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP/1.1 server to test RestBackend without network access"""
+import socket
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+
+SAMPLE_RDF = b'''<rdf:RDF
+      xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+      xmlns:foaf="http://xmlns.com/foaf/0.1/">
+    <foaf:Person rdf:about="#me">
+        <foaf:name>Max Mustermann</foaf:name>
+    </foaf:Person></rdf:RDF>'''
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = self._read_chunked()
+        else:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+        self.server.requests.append(
+            (self.command, self.path, dict(self.headers.items()), body))
+        self.server.connections.add(self.client_address)
+
+        response = self.server.responses.get(self.path, (404, {}, b""))
+        if callable(response):
+            response = response(self)
+        status, headers, body = response
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304 and isinstance(body, bytes):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status == 304:
+            return
+        if isinstance(body, bytes):
+            self.wfile.write(body)
+            return
+        # other bodies are iterables sent chunk by chunk, e.g. slowly.
+        # Their headers have to include the Content-Length
+        try:
+            for chunk in body:
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except socket.error:
+            # the client gave up
+            self.close_connection = True
+
+    def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            chunk = self.rfile.read(size)
+            self.rfile.readline()
+            if not size:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    do_GET = do_PUT = do_PATCH = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class LocalServer(object):
+    """Serves self.responses: path -> (status, headers, body) or a callable
+    returning that tuple for the request handler"""
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+        self.httpd.responses = self.responses = {}
+        self.httpd.requests = self.requests = []
+        self.httpd.connections = self.connections = set()
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs=dict(poll_interval=0.05))
+        self.thread.daemon = True
+
+    def url(self, path):
+        return "http://127.0.0.1:%s%s" % (self.httpd.server_address[1], path)
+
+    def serve_rdf(self, path, body=SAMPLE_RDF, headers=None):
+        response_headers = {"Content-Type": "application/rdf+xml"}
+        response_headers.update(headers or {})
+        self.responses[path] = (200, response_headers, body)
+        return self.url(path)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
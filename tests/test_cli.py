@@ -7,12 +7,23 @@ class ParserTestCase(TestCase):
     def setUp(self):
         self.default_arguments_dict = dict(
             depth=0,
+            workers=1,
+            host_concurrency=None,
+            host_delay=None,
+            robots=False,
+            parse_processes=0,
+            store=None,
+            lazy=False,
+            http_cache=None,
+            graph_cache=None,
             follow_all=False,
             follow_uris=[],
             only_print_uris=False,
             origin_urls=[],
             verbosity=2,
             socket_timeout=None,
+            request_timeout=None,
+            crawl_timeout=None,
             only_negotiate=False,
             only_print_uri_content=False,
             GRAPH_SIZE_LIMIT=None,
@@ -38,6 +49,50 @@ class ParserTestCase(TestCase):
             "http://a.com --depth 5",
             dict(depth=5, origin_urls=["http://a.com"]))
 
+    def test_arguments_workers(self):
+        self._check_equals(
+            "http://a.com --depth 2 --workers 8",
+            dict(depth=2, workers=8, origin_urls=["http://a.com"]))
+
+    def test_arguments_host_scheduling(self):
+        self._check_equals(
+            "http://a.com --workers 8 --host-concurrency 2 --host-delay 0.5 "
+            "--robots",
+            dict(workers=8, host_concurrency=2, host_delay=0.5, robots=True,
+                 origin_urls=["http://a.com"]))
+
+    def test_arguments_timeouts(self):
+        self._check_equals(
+            "http://a.com --socket-timeout 2.5 --request-timeout 30 "
+            "--crawl-timeout 600",
+            dict(socket_timeout=2.5, request_timeout=30, crawl_timeout=600,
+                 origin_urls=["http://a.com"]))
+
+    def test_arguments_parse_processes(self):
+        self._check_equals(
+            "http://a.com --workers 4 --parse-processes 4",
+            dict(workers=4, parse_processes=4, origin_urls=["http://a.com"]))
+
+    def test_arguments_store(self):
+        self._check_equals(
+            "http://a.com --store crawl.db",
+            dict(store="crawl.db", origin_urls=["http://a.com"]))
+
+    def test_arguments_lazy(self):
+        self._check_equals(
+            "http://a.com --depth 2 --lazy",
+            dict(depth=2, lazy=True, origin_urls=["http://a.com"]))
+
+    def test_arguments_http_cache(self):
+        self._check_equals(
+            "http://a.com --http-cache cache",
+            dict(http_cache="cache", origin_urls=["http://a.com"]))
+
+    def test_arguments_graph_cache(self):
+        self._check_equals(
+            "http://a.com --graph-cache graphs",
+            dict(graph_cache="graphs", origin_urls=["http://a.com"]))
+
     def test_urls_and_follow_uris(self):
         self._check_equals(
             "http://a.com "
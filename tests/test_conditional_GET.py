@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from ldtools.backends import MemoryBackend, RestBackend, NOT_MODIFIED
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+
+from tests.httpserver import LocalServer, SAMPLE_RDF
+
+
+class RestBackendConditionalGETTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.server = LocalServer().start()
+
+        def respond(handler):
+            if handler.headers.get("If-None-Match") == '"v1"':
+                return 304, {"ETag": '"v1"'}, b""
+            return 200, {"Content-Type": "application/rdf+xml",
+                         "ETag": '"v1"'}, SAMPLE_RDF
+        self.server.responses["/foaf"] = respond
+        self.uri = self.server.url("/foaf")
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_backend_returns_not_modified(self):
+        backend = RestBackend()
+        self.assertTrue(backend.GET(self.uri, conditional=True))
+        self.assertEqual(backend.etag, '"v1"')
+        self.assertIs(backend.GET(self.uri, conditional=True), NOT_MODIFIED)
+        self.assertTrue(backend.GET(self.uri))
+
+    def test_origin_GET_skips_unchanged_graph(self):
+        origin = Origin.objects.create(self.uri)
+        origin.GET()
+        graph = origin._graph
+        resources = set(origin.get_resources())
+
+        origin.GET()
+
+        self.assertEqual(self.server.requests[-1][2].get("If-None-Match"),
+                         '"v1"')
+        self.assertIs(origin._graph, graph)
+        self.assertEqual(set(origin.get_resources()), resources)
+        self.assertTrue(origin.processed)
+
+
+class MemoryBackendConditionalGETTestCase(TestCase):
+    def test_replaced_data_is_modified(self):
+        backend = MemoryBackend(data=SAMPLE_RDF)
+        self.assertEqual(backend.GET("http://example.org/", conditional=True),
+                         SAMPLE_RDF)
+        self.assertIs(backend.GET("http://example.org/", conditional=True),
+                      NOT_MODIFIED)
+        backend.data = SAMPLE_RDF.replace(b"Max", b"Moritz")
+        self.assertNotEqual(
+            backend.GET("http://example.org/", conditional=True),
+            NOT_MODIFIED)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import socket
+import time
+from unittest import TestCase
+
+from ldtools.backends import RestBackend
+from ldtools.connectionpool import ConnectionPool, DeadlineExceeded
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+from ldtools.utils import urllib2
+
+from tests.httpserver import LocalServer, SAMPLE_RDF
+
+
+class ConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.server = LocalServer().start()
+        self.old_pool = RestBackend.connection_pool
+        self.pool = RestBackend.connection_pool = ConnectionPool(maxsize=2)
+
+    def tearDown(self):
+        self.pool.clear()
+        RestBackend.connection_pool = self.old_pool
+        self.server.stop()
+
+    def test_connection_is_reused_for_same_host(self):
+        for i in range(3):
+            uri = self.server.serve_rdf("/resource%s" % i)
+            data = RestBackend().GET(uri)
+            self.assertTrue(data.startswith(b"<rdf:RDF"))
+
+        self.assertEqual(self.pool.stats,
+                         dict(created=1, reused=2, discarded=0))
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_idle_timeout(self):
+        self.pool.idle_timeout = -1
+        for i in range(2):
+            RestBackend().GET(self.server.serve_rdf("/resource%s" % i))
+        self.assertEqual(self.pool.stats,
+                         dict(created=2, reused=0, discarded=1))
+
+    def test_unknown_content_type_releases_connection(self):
+        uri = self.server.url("/unknown")
+        self.server.responses["/unknown"] = (
+            200, {"Content-Type": "application/x-unknown"}, b"data")
+        with self.assertRaises(Exception):
+            RestBackend().GET(uri)
+        RestBackend().GET(self.server.serve_rdf("/resource"))
+        self.assertEqual(self.pool.created, 2)
+
+    def test_origins_GET(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        for i in range(3):
+            uri = self.server.serve_rdf("/person%s" % i)
+            Origin.objects.create(uri).GET()
+        self.assertEqual(self.pool.reused, 2)
+        self.assertEqual(len(Resource.objects.all()), 6)
+
+
+class RestBackendTimeoutTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.server = LocalServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def drip(self, path, delay=0.05):
+        def body():
+            for i in range(len(SAMPLE_RDF)):
+                time.sleep(delay)
+                yield SAMPLE_RDF[i:i + 1]
+        self.server.responses[path] = lambda handler: (
+            200, {"Content-Type": "application/rdf+xml",
+                  "Content-Length": str(len(SAMPLE_RDF))}, body())
+        return self.server.url(path)
+
+    def test_import_keeps_default_timeout(self):
+        self.assertIsNone(socket.getdefaulttimeout())
+
+    def test_slow_body_exceeds_request_timeout(self):
+        backend = RestBackend()
+        backend.request_timeout = 0.3
+        stream = backend.GET(self.drip("/slow"), stream=True)
+        started = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            stream.read()
+        self.assertLess(time.time() - started, 1)
+
+    def test_origin_records_timeout(self):
+        origin = Origin.objects.create(self.drip("/slow"),
+                                       BACKEND=RestBackend())
+        origin.backend.request_timeout = 0.3
+        origin.GET(raise_errors=False)
+        self.assertEqual(origin.errors, ["timeout"])
+
+    def test_slow_headers_exceed_connect_timeout(self):
+        def respond(handler):
+            time.sleep(0.5)
+            return 200, {"Content-Type": "application/rdf+xml"}, SAMPLE_RDF
+        self.server.responses["/slow"] = respond
+        backend = RestBackend()
+        backend.connect_timeout = 0.1
+        with self.assertRaises(urllib2.URLError):
+            backend.GET(self.server.url("/slow"))
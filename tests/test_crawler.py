@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from unittest import TestCase
+
+from rdflib.namespace import FOAF
+
+from ldtools.backends import MemoryBackend, RestBackend
+from ldtools.crawler import (
+    crawl_concurrently, CircuitBreaker, CrawlFrontier, HostScheduler,
+    HostUnavailable
+)
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+
+from tests.httpserver import LocalServer
+
+
+ORIGIN_COUNT = 20
+
+DATA = '''<rdf:RDF
+      xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+      xmlns:foaf="http://xmlns.com/foaf/0.1/">
+    <foaf:Person rdf:about="#me">
+        <foaf:name>Person %(i)s</foaf:name>
+        <foaf:knows rdf:resource="http://example.org/person%(next)s#me"/>
+    </foaf:Person></rdf:RDF>'''
+
+
+def setup_origins():
+    Origin.objects.reset_store()
+    Resource.objects.reset_store()
+    for i in range(ORIGIN_COUNT):
+        data = DATA % dict(i=i, next=(i + 1) % ORIGIN_COUNT)
+        Origin.objects.create("http://example.org/person%s" % i,
+                              BACKEND=MemoryBackend(data))
+
+
+class CrawlConcurrentlyTestCase(TestCase):
+    def test_all_items_processed(self):
+        processed = []
+        lock = threading.Lock()
+
+        def func(item):
+            with lock:
+                processed.append(item)
+
+        crawl_concurrently(func, range(100), workers=8)
+        self.assertEqual(sorted(processed), list(range(100)))
+
+    def test_no_items_started_after_deadline(self):
+        processed = []
+
+        def func(item):
+            processed.append(item)
+            time.sleep(0.03)
+
+        for workers in (1, 2):
+            del processed[:]
+            skipped = crawl_concurrently(func, range(10), workers=workers,
+                                         deadline=time.time() + 0.05)
+            self.assertEqual(skipped, 10 - len(processed))
+            self.assertTrue(0 < len(processed) < 10)
+
+    def test_first_error_is_raised(self):
+        def func(item):
+            if item == 3:
+                raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            crawl_concurrently(func, range(10), workers=4)
+
+
+class GETAllConcurrentTestCase(TestCase):
+    def _crawl(self, workers):
+        setup_origins()
+        Origin.objects.GET_all(
+            depth=2, workers=workers, only_follow_uris=[FOAF.knows])
+        self.assertTrue(all(o.processed for o in Origin.objects.all()))
+        return (len(Origin.objects.all()), len(Resource.objects.all()))
+
+    def test_concurrent_crawl_equals_sequential_crawl(self):
+        self.assertEqual(self._crawl(workers=1), self._crawl(workers=8))
+
+
+    def test_crawl_timeout(self):
+        setup_origins()
+        Origin.objects.GET_all(depth=2, crawl_timeout=0,
+                               only_follow_uris=[FOAF.knows])
+        self.assertFalse(any(o.processed for o in Origin.objects.all()))
+
+
+class CrawlFrontierTestCase(TestCase):
+    def test_depth_is_recorded_while_populating(self):
+        setup_origins()
+        frontier = CrawlFrontier()
+        frontier.add(Origin.objects.get("http://example.org/person0"))
+
+        Origin.objects.GET_all(
+            depth=3, frontier=frontier, only_follow_uris=[FOAF.knows])
+
+        processed = sorted(
+            str(o.uri) for o in Origin.objects.all() if o.processed)
+        self.assertEqual(processed, ["http://example.org/person%s" % i
+                                     for i in range(3)])
+        self.assertEqual(
+            frontier.depth_of(Origin.objects.get("http://example.org/person3")),
+            3)
+
+    def test_origin_is_scheduled_once(self):
+        setup_origins()
+        origin = Origin.objects.get("http://example.org/person0")
+        frontier = CrawlFrontier()
+        self.assertTrue(frontier.add(origin, depth=0))
+        self.assertFalse(frontier.add(origin, depth=1))
+        self.assertEqual(frontier.pop_round(0), [origin])
+        self.assertEqual(frontier.pop_round(1), [])
+
+
+class HostSchedulerTestCase(TestCase):
+    def urls(self, hosts, count):
+        return ["http://%s/%s" % (host, i)
+                for host in hosts for i in range(count)]
+
+    def test_hosts_take_turns(self):
+        processed = []
+        crawl_concurrently(processed.append,
+                           self.urls(["a.org", "b.org", "c.org"], 2),
+                           scheduler=HostScheduler())
+        self.assertEqual(processed, [
+            "http://a.org/0", "http://b.org/0", "http://c.org/0",
+            "http://a.org/1", "http://b.org/1", "http://c.org/1"])
+
+    def test_concurrency_per_host(self):
+        active = {}
+        maximum = {}
+        lock = threading.Lock()
+
+        def func(url):
+            host = url.split("/")[2]
+            with lock:
+                active[host] = active.get(host, 0) + 1
+                maximum[host] = max(maximum.get(host, 0), active[host])
+                maximum["all"] = max(maximum.get("all", 0),
+                                     sum(active.values()))
+            time.sleep(0.02)
+            with lock:
+                active[host] -= 1
+
+        crawl_concurrently(func, self.urls(["a.org", "b.org"], 5), workers=8,
+                           scheduler=HostScheduler(concurrency=2))
+        self.assertEqual(maximum, {"a.org": 2, "b.org": 2, "all": 4})
+
+    def test_delay_between_requests_to_a_host(self):
+        starts = {}
+
+        def func(url):
+            starts.setdefault(url.split("/")[2], []).append(time.time())
+
+        crawl_concurrently(func, self.urls(["a.org", "b.org"], 3), workers=4,
+                           scheduler=HostScheduler(delay=0.05))
+        for host_starts in starts.values():
+            self.assertEqual(len(host_starts), 3)
+            for first, second in zip(host_starts, host_starts[1:]):
+                self.assertGreaterEqual(second - first, 0.045)
+
+    def test_error_stops_crawl(self):
+        scheduler = HostScheduler()
+
+        def func(url):
+            raise ValueError(url)
+
+        with self.assertRaises(ValueError):
+            crawl_concurrently(func, self.urls(["a.org"], 3), workers=2,
+                               scheduler=scheduler)
+        self.assertIsNone(scheduler.acquire())
+
+    def test_robots_crawl_delay(self):
+        server = LocalServer().start()
+        try:
+            server.responses["/robots.txt"] = (
+                200, {"Content-Type": "text/plain"},
+                b"User-agent: *\nCrawl-delay: 3\n")
+            scheduler = HostScheduler(robots=True)
+            scheduler.add([server.url("/a"), server.url("/b")])
+            self.assertEqual(scheduler.acquire(), server.url("/a"))
+            scheduler.release(server.url("/a"))
+            host = server.url("").split("/")[2]
+            self.assertGreater(scheduler._next_start[host] - time.time(), 2)
+
+            self.assertEqual(scheduler.get_crawl_delay(server.url("/a")), 3)
+            server.responses.pop("/robots.txt")
+            self.assertEqual(scheduler.get_crawl_delay(server.url("/a")), 0)
+        finally:
+            server.stop()
+
+    def test_host_waits_for_robots(self):
+        server = LocalServer().start()
+        requested, answer = threading.Event(), threading.Event()
+
+        def robots(handler):
+            requested.set()
+            answer.wait(5)
+            return 200, {"Content-Type": "text/plain"}, b"User-agent: *\n"
+        server.responses["/robots.txt"] = robots
+        try:
+            scheduler = HostScheduler(concurrency=2, robots=True)
+            scheduler.add([server.url("/a"), server.url("/b")])
+            first = threading.Thread(target=scheduler.acquire)
+            first.start()
+            self.assertTrue(requested.wait(5))
+
+            # the second item of the host waits for the robots.txt
+            with scheduler._condition:
+                item, _host, _wait = scheduler._pop(time.time())
+            self.assertIsNone(item)
+            answer.set()
+            first.join(5)
+            self.assertEqual(scheduler.acquire(), server.url("/b"))
+        finally:
+            answer.set()
+            server.stop()
+
+    def test_GET_all(self):
+        setup_origins()
+        Origin.objects.GET_all(
+            depth=2, workers=4, scheduler=HostScheduler(concurrency=2),
+            only_follow_uris=[FOAF.knows])
+        self.assertTrue(all(o.processed for o in Origin.objects.all()))
+
+
+class CircuitBreakerTestCase(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        uri = "http://a.org/1"
+        self.breaker.failed(uri)
+        self.breaker.succeeded(uri)
+        self.breaker.failed(uri)
+        self.breaker.before_request(uri)
+        self.assertFalse(self.breaker.is_open(uri))
+
+        self.breaker.failed(uri)
+        self.assertTrue(self.breaker.is_open("http://a.org/2"))
+        with self.assertRaises(HostUnavailable):
+            self.breaker.before_request("http://a.org/2")
+        self.breaker.before_request("http://b.org/1")
+
+    def test_half_open_probe(self):
+        for i in range(2):
+            self.breaker.failed("http://a.org/")
+        self.breaker.reset_timeout = 0
+
+        # one probe at a time
+        self.breaker.before_request("http://a.org/1")
+        with self.assertRaises(HostUnavailable):
+            self.breaker.before_request("http://a.org/2")
+        self.breaker.failed("http://a.org/1")
+        self.assertTrue(self.breaker.is_open("http://a.org/"))
+
+        self.breaker.before_request("http://a.org/2")
+        self.breaker.succeeded("http://a.org/2")
+        self.assertFalse(self.breaker.is_open("http://a.org/"))
+        self.breaker.before_request("http://a.org/3")
+
+
+class RestBackendCircuitBreakerTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.old_breaker = RestBackend.circuit_breaker
+        RestBackend.circuit_breaker = CircuitBreaker(threshold=2)
+        self.server = LocalServer().start()
+
+    def tearDown(self):
+        RestBackend.circuit_breaker = self.old_breaker
+        self.server.stop()
+
+    def test_dead_host_fails_fast(self):
+        origins = []
+        for i in range(4):
+            path = "/resource%s" % i
+            self.server.responses[path] = (503, {}, b"")
+            origins.append(Origin.objects.create(self.server.url(path),
+                                                 BACKEND=RestBackend()))
+        for origin in origins:
+            origin.GET(raise_errors=False)
+
+        self.assertEqual([origin.errors for origin in origins],
+                         [[503], [503], ["HostUnavailable"],
+                          ["HostUnavailable"]])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_client_errors_do_not_open_circuit(self):
+        uri = self.server.url("/missing")
+        for i in range(3):
+            Origin.objects.create(uri + str(i), BACKEND=RestBackend()).GET(
+                raise_errors=False)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertFalse(RestBackend.circuit_breaker.is_open(uri))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import time
+from email.utils import formatdate
+from unittest import TestCase
+
+from ldtools.backends import RestBackend, NOT_MODIFIED
+from ldtools.httpcache import HTTPCache
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+
+from tests.httpserver import LocalServer, SAMPLE_RDF
+
+
+class HTTPCacheTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.directory = tempfile.mkdtemp()
+        self.cache = RestBackend.cache = HTTPCache(self.directory)
+        self.server = LocalServer().start()
+
+    def tearDown(self):
+        RestBackend.cache = None
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def serve(self, path, **headers):
+        headers.setdefault("Content-Type", "application/rdf+xml")
+        return self.server.serve_rdf(path, headers=headers)
+
+    def count_requests(self, path):
+        return len([request for request in self.server.requests
+                    if request[1] == path])
+
+    def test_fresh_response_is_not_requested_again(self):
+        uri = self.serve("/fresh", **{"Cache-Control": "max-age=60"})
+        self.assertEqual(RestBackend().GET(uri), SAMPLE_RDF)
+
+        backend = RestBackend()
+        self.assertEqual(backend.GET(uri), SAMPLE_RDF)
+        self.assertEqual(backend.format, "xml")
+        self.assertEqual(self.count_requests("/fresh"), 1)
+
+    def test_cache_survives_restart(self):
+        uri = self.serve("/fresh", **{"Cache-Control": "max-age=60"})
+        RestBackend().GET(uri)
+
+        RestBackend.cache = HTTPCache(self.directory)
+        stream = RestBackend().GET(uri, stream=True)
+        try:
+            self.assertEqual(stream.read(), SAMPLE_RDF)
+        finally:
+            stream.close()
+        self.assertEqual(self.count_requests("/fresh"), 1)
+
+    def test_expires(self):
+        uri = self.serve("/expired", Expires=formatdate(time.time() - 60),
+                         Date=formatdate(time.time()))
+        fresh_uri = self.serve("/expires", Date=formatdate(time.time()),
+                               Expires=formatdate(time.time() + 60))
+        for i in range(2):
+            RestBackend().GET(uri)
+            RestBackend().GET(fresh_uri)
+        self.assertEqual(self.count_requests("/expired"), 2)
+        self.assertEqual(self.count_requests("/expires"), 1)
+
+    def test_no_store(self):
+        uri = self.serve("/private",
+                         **{"Cache-Control": "no-store, max-age=60"})
+        for i in range(2):
+            RestBackend().GET(uri)
+        self.assertEqual(self.count_requests("/private"), 2)
+        self.assertEqual(self.cache.size, 0)
+
+    def test_stale_response_is_revalidated(self):
+        def respond(handler):
+            if handler.headers.get("If-None-Match") == '"v1"':
+                return 304, {"ETag": '"v1"'}, b""
+            return 200, {"Content-Type": "application/rdf+xml",
+                         "Cache-Control": "no-cache",
+                         "ETag": '"v1"'}, SAMPLE_RDF
+        self.server.responses["/stale"] = respond
+        uri = self.server.url("/stale")
+
+        self.assertEqual(RestBackend().GET(uri), SAMPLE_RDF)
+        self.assertEqual(RestBackend().GET(uri), SAMPLE_RDF)
+        self.assertEqual(self.server.requests[-1][2].get("If-None-Match"),
+                         '"v1"')
+
+    def test_conditional_GET_of_cached_response(self):
+        uri = self.serve("/fresh", ETag='"v1"',
+                         **{"Cache-Control": "max-age=60"})
+        backend = RestBackend()
+        self.assertEqual(backend.GET(uri, conditional=True), SAMPLE_RDF)
+        self.assertIs(backend.GET(uri, conditional=True), NOT_MODIFIED)
+        self.assertEqual(self.count_requests("/fresh"), 1)
+
+    def test_incomplete_response_is_not_stored(self):
+        uri = self.serve("/fresh", **{"Cache-Control": "max-age=60"})
+        stream = RestBackend().GET(uri, stream=True)
+        stream.read(10)
+        stream.close()
+        RestBackend().GET(uri)
+        self.assertEqual(self.count_requests("/fresh"), 2)
+
+    def test_least_recently_used_responses_are_evicted(self):
+        self.cache.max_size = 2 * len(SAMPLE_RDF)
+        uris = [self.serve("/resource%s" % i,
+                           **{"Cache-Control": "max-age=60"})
+                for i in range(3)]
+        RestBackend().GET(uris[0])
+        RestBackend().GET(uris[1])
+        RestBackend().GET(uris[0])
+        RestBackend().GET(uris[2])
+
+        self.assertEqual(self.cache.size, 2 * len(SAMPLE_RDF))
+        RestBackend().GET(uris[0])
+        self.assertEqual(self.count_requests("/resource0"), 1)
+        RestBackend().GET(uris[1])
+        self.assertEqual(self.count_requests("/resource1"), 2)
+
+    def test_PUT_invalidates_cached_response(self):
+        uri = self.serve("/fresh", **{"Cache-Control": "max-age=60"})
+        backend = RestBackend()
+        backend.GET(uri)
+        self.server.responses["/fresh"] = (201, {}, b"")
+        backend.PUT(SAMPLE_RDF)
+        self.assertIsNone(self.cache.get(uri, RestBackend.GET_headers))
+
+    def test_origin_GET_uses_cache(self):
+        uri = self.serve("/foaf", **{"Cache-Control": "max-age=60"})
+        Origin.objects.create(uri).GET()
+        resources = set(r._uri for r in Resource.objects.all())
+
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        Origin.objects.create(uri).GET()
+
+        self.assertEqual(set(r._uri for r in Resource.objects.all()),
+                         resources)
+        self.assertEqual(self.count_requests("/foaf"), 1)
@@ -150,3 +150,64 @@ class ModelFilterAndSetattrTestCase(TestCase):
         o2.another_attr = "test"
         self.assertEqual(len(list(
             Sample3.objects.filter(another_attr="test2"))), 1)
+
+
+class IndexedSample(Model):
+    attr1 = StringField()
+    objects = Manager()
+
+    class Meta:
+        indexes = ["tags"]
+
+
+class ManagerIndexTestCase(TestCase):
+    def setUp(self):
+        IndexedSample.objects.reset_store()
+
+    def test_fields_and_meta_indexes_are_indexed(self):
+        self.assertEqual(IndexedSample._meta.indexes,
+                         frozenset(["attr1", "tags"]))
+
+    def test_index_follows_setattr(self):
+        o = IndexedSample.objects.create(pk="1", attr1="a")
+        IndexedSample.objects.create(pk="2", attr1="b")
+        self.assertEqual(list(IndexedSample.objects.filter(attr1="a")), [o])
+
+        o.attr1 = "b"
+        self.assertEqual(list(IndexedSample.objects.filter(attr1="a")), [])
+        self.assertEqual(len(list(IndexedSample.objects.filter(attr1="b"))), 2)
+
+    def test_set_membership(self):
+        o = IndexedSample.objects.create(pk="1", attr1="a")
+        o.tags = set(["x", "y"])
+        self.assertEqual(list(IndexedSample.objects.filter(tags="y")), [o])
+        self.assertEqual(
+            list(IndexedSample.objects.filter(tags="x", attr1="a")), [o])
+        self.assertEqual(
+            list(IndexedSample.objects.filter(tags="x", attr1="b")), [])
+
+    def test_indexed_sets_cannot_be_changed_in_place(self):
+        o = IndexedSample.objects.create(pk="1", attr1="a")
+        o.tags = set(["x", "y"])
+        with self.assertRaises(AttributeError):
+            o.tags.add("z")
+        o.tags = o.tags - set(["x"]) | set(["z"])
+        self.assertEqual(list(IndexedSample.objects.filter(tags="x")), [])
+        self.assertEqual(list(IndexedSample.objects.filter(tags="z")), [o])
+
+    def test_index_candidates_are_checked(self):
+        o = IndexedSample.objects.create(pk="1", attr1="a")
+        # bypasses the index
+        o.__dict__["attr1"] = "b"
+        self.assertEqual(list(IndexedSample.objects.filter(attr1="a")), [])
+
+    def test_delete_removes_from_index(self):
+        IndexedSample.objects.create(pk="1", attr1="a")
+        IndexedSample.objects.delete("1")
+        self.assertEqual(list(IndexedSample.objects.filter(attr1="a")), [])
+        self.assertEqual(IndexedSample.objects._indexes["attr1"], {})
+
+    def test_unhashable_values_fall_back_to_scan(self):
+        o = IndexedSample.objects.create(pk="1")
+        o.tags = [["x"]]
+        self.assertEqual(list(IndexedSample.objects.filter(tags=["x"])), [o])
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 from unittest import TestCase
 
+import rdflib
+
 from ldtools.resource import Resource
 from ldtools.backends import MemoryBackend
 from ldtools.origin import Origin, check_shortcut_consistency
+from ldtools.utils import (
+    LRUCache, PredicateTranslator, get_predicate_translator, predicate2pyattr
+)
 
 
 class NamespaceShortcutConsistencyTestCase(TestCase):
@@ -40,3 +45,44 @@ class NamespaceShortcutConsistencyTestCase(TestCase):
         self._scenario_setup(self.foaf_uri1, self.foaf_uri2)
         with self.assertRaises(AssertionError):
             check_shortcut_consistency()
+
+
+class PredicateTranslatorTestCase(TestCase):
+    def setUp(self):
+        self.namespace_dict = {
+            "foaf": rdflib.URIRef("http://xmlns.com/foaf/0.1/"),
+            "wgs84_pos": rdflib.URIRef("http://www.w3.org/2003/01/geo/wgs84_pos#"),
+        }
+
+    def test_translation_matches_uncached_functions(self):
+        translator = PredicateTranslator(self.namespace_dict)
+        for predicate in [rdflib.FOAF.name,
+                          rdflib.URIRef("http://www.w3.org/2003/01/geo/wgs84_pos#lat")]:
+            pyattr = translator.predicate2pyattr(predicate)
+            self.assertEqual(pyattr, predicate2pyattr(
+                predicate, translator.namespace_short_notation_reverse_dict))
+            self.assertEqual(translator.pyattr2predicate(pyattr), predicate)
+
+    def test_stats(self):
+        translator = PredicateTranslator(self.namespace_dict)
+        for _i in range(3):
+            translator.predicate2pyattr(rdflib.FOAF.name)
+        self.assertEqual(translator.stats["predicate2pyattr"],
+                         dict(hits=2, misses=1, size=1))
+
+    def test_translators_are_shared_per_mapping(self):
+        self.assertIs(get_predicate_translator(self.namespace_dict),
+                      get_predicate_translator(dict(self.namespace_dict)))
+        self.assertIsNot(get_predicate_translator(self.namespace_dict),
+                         get_predicate_translator({}))
+
+
+class LRUCacheTestCase(TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+        self.assertNotIn("b", cache)
+        self.assertEqual(len(cache), 2)
@@ -5,6 +5,8 @@ from ldtools.origin import Origin
 from ldtools.resource import Resource
 from ldtools.backends import MemoryBackend
 
+from tests.httpserver import SAMPLE_RDF
+
 
 class OriginIsDirtyTestCase(TestCase):
     def setUp(self):
@@ -72,3 +74,57 @@ class OriginManagerCreateTestCase(TestCase):
 
         self.assertEqual(len(list(Resource.objects.all())), 1)
         self.assertEqual(len(list(Origin.objects.all())), 1)
+
+
+class OriginDirtyResourcesTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.origin1 = Origin.objects.create("http://example.org/1",
+                                             BACKEND=MemoryBackend())
+        self.origin2 = Origin.objects.create("http://example.org/2",
+                                             BACKEND=MemoryBackend())
+        self.origin1.GET()
+        self.origin2.GET()
+
+    def test_changes_are_tracked_per_origin(self):
+        resource = Resource.objects.create("http://example.org/1#me",
+                                           origin=self.origin1)
+        self.assertEqual(self.origin1._dirty_resources, set([resource]))
+        self.assertFalse(self.origin2.has_unsaved_changes())
+
+        resource._has_changes = False
+        self.assertFalse(self.origin1.has_unsaved_changes())
+
+        resource.foaf_name = "Max"
+        self.assertTrue(self.origin1.has_unsaved_changes())
+
+    def test_PUT_clears_only_own_changes(self):
+        resource1 = Resource.objects.create("http://example.org/1#me",
+                                            origin=self.origin1)
+        Resource.objects.create("http://example.org/2#me",
+                                origin=self.origin2)
+        resource1.save()
+        self.assertFalse(self.origin1.has_unsaved_changes())
+        self.assertTrue(self.origin2.has_unsaved_changes())
+
+    def test_delete(self):
+        resource = Resource.objects.create("http://example.org/1#me",
+                                           origin=self.origin1)
+        resource.delete()
+        self.assertFalse(self.origin1.has_unsaved_changes())
+
+    def test_deleting_stored_resources_is_a_change(self):
+        origin = Origin.objects.create("http://example.org/foaf",
+                                       BACKEND=MemoryBackend(SAMPLE_RDF))
+        origin.GET()
+        Resource.objects.get("http://example.org/foaf#me").delete()
+        self.assertTrue(origin.has_unsaved_changes())
+        # like changed attributes, deletions are saved before the next GET
+        self.assertRaises(Exception, origin.GET)
+
+        origin.PUT()
+        self.assertFalse(origin.has_unsaved_changes())
+        origin.GET()
+        self.assertRaises(Resource.DoesNotExist, Resource.objects.get,
+                          "http://example.org/foaf#me")
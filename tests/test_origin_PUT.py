@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+import rdflib
+from rdflib import Literal, URIRef
+
+from ldtools import serializers
+from ldtools.backends import MemoryBackend, RestBackend
+from ldtools.helpers import graph_fingerprint
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+
+from tests.httpserver import LocalServer, SAMPLE_RDF
+
+
+URI = "http://example.org/foaf"
+ME = URIRef(URI + "#me")
+FOAF = rdflib.Namespace("http://xmlns.com/foaf/0.1/")
+
+
+class RecordingBackend(MemoryBackend):
+    def __init__(self, *args, **kwargs):
+        super(RecordingBackend, self).__init__(*args, **kwargs)
+        self.patches = []
+
+    def PATCH(self, added, removed):
+        self.patches.append((added, removed))
+        super(RecordingBackend, self).PATCH(added, removed)
+
+
+class OriginPATCHTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.origin = Origin.objects.create(
+            URI, BACKEND=RecordingBackend(SAMPLE_RDF))
+        self.origin.GET()
+        self.me = Resource.objects.get(uri=ME)
+
+    def test_only_changes_are_sent(self):
+        self.me.foaf_name = Literal("Moritz Mustermann")
+        self.me.foaf_nick = Literal("Mo")
+        self.origin.PUT()
+
+        self.assertEqual(self.origin.backend.patches, [(
+            set([(ME, FOAF.name, Literal("Moritz Mustermann")),
+                 (ME, FOAF.nick, Literal("Mo"))]),
+            set([(ME, FOAF.name, Literal("Max Mustermann"))]),
+        )])
+        self.assertFalse(self.origin.has_unsaved_changes())
+
+        graph = rdflib.Graph().parse(data=self.origin.backend.data,
+                                     format="xml")
+        self.assertEqual(set(graph), set(self.origin.get_graph()))
+
+    def test_stored_graph_is_updated(self):
+        self.me.foaf_name = Literal("Moritz Mustermann")
+        self.origin.PUT()
+
+        self.assertEqual(set(self.origin._graph), set(self.origin.get_graph()))
+        self.assertEqual(self.origin._graph_fingerprint,
+                         graph_fingerprint(self.origin._graph))
+
+        # the next GET retrieves the patched document, nothing changed
+        resources = set(self.origin.get_resources())
+        self.origin.GET()
+        self.assertEqual(set(self.origin.get_resources()), resources)
+
+    def test_deleted_resources_are_removed(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        data = ("<%s#a> <%s> \"A\" .\n<%s#b> <%s> \"B\" .\n"
+                % (URI, FOAF.name, URI, FOAF.name)).encode("utf-8")
+        origin = Origin.objects.create(
+            URI, BACKEND=RecordingBackend(data, format="nt"))
+        origin.GET()
+        a = Resource.objects.get(uri=URIRef(URI + "#a"))
+        b = Resource.objects.get(uri=URIRef(URI + "#b"))
+
+        b.delete()
+        self.assertTrue(origin.has_unsaved_changes())
+        a.foaf_name = Literal("A2")
+        origin.PUT()
+
+        self.assertEqual(origin.backend.patches[0][1], set([
+            (a._uri, FOAF.name, Literal("A")),
+            (b._uri, FOAF.name, Literal("B"))]))
+        self.assertFalse(origin.has_unsaved_changes())
+        self.assertEqual(set(origin._graph), set(origin.get_graph()))
+        graph = rdflib.Graph().parse(data=origin.backend.data, format="nt")
+        self.assertEqual(set(graph), set(origin.get_graph()))
+
+    def test_unpatchable_changes_are_PUT(self):
+        self.me.foaf_knows = rdflib.BNode()
+        self.origin.PUT()
+        self.assertEqual(self.origin.backend.patches, [])
+        graph = rdflib.Graph().parse(data=self.origin.backend.data,
+                                     format="xml")
+        self.assertEqual(len(graph), 3)
+
+
+class RestBackendPATCHTestCase(TestCase):
+    def test_sparql_update(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        server = LocalServer().start()
+        try:
+            uri = server.serve_rdf("/foaf")
+            origin = Origin.objects.create(uri, BACKEND=RestBackend())
+            origin.backend.supports_patch = True
+            origin.GET()
+            me = Resource.objects.get(uri=uri + "#me")
+            me.foaf_name = Literal("Moritz Mustermann")
+            origin.PUT()
+
+            method, path, headers, body = server.requests[-1]
+            self.assertEqual(method, "PATCH")
+            self.assertEqual(headers["Content-Type"],
+                             "application/sparql-update")
+            self.assertEqual(body, serializers.sparql_update(
+                added=[(me._uri, FOAF.name, Literal("Moritz Mustermann"))],
+                removed=[(me._uri, FOAF.name, Literal("Max Mustermann"))]))
+        finally:
+            server.stop()
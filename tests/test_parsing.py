@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import array
+import io
+import shutil
+import tempfile
+from unittest import TestCase
+
+import rdflib
+
+from rdflib import Literal, URIRef, RDFS, compare
+
+from ldtools.backends import (
+    MemoryBackend, RestBackend, ResponseSizeLimitExceeded, SizeLimitedReader
+)
+from ldtools.origin import Origin
+from ldtools.parsing import (
+    array_from_bytes, array_to_bytes, parse_graph, GraphCache,
+    GraphSizeLimitExceeded, ParsePool
+)
+from ldtools.resource import Resource
+
+from tests.httpserver import LocalServer, SAMPLE_RDF
+
+
+URI = "http://example.org/foaf"
+
+
+class ParseGraphTestCase(TestCase):
+    def test_parse_data_and_stream(self):
+        graph1 = parse_graph(URI, SAMPLE_RDF, format="xml")
+        graph2 = parse_graph(URI, io.BytesIO(SAMPLE_RDF), format="xml")
+        self.assertEqual(len(graph1), 2)
+        self.assertEqual(set(graph1), set(graph2))
+
+    def test_limit_aborts_parsing(self):
+        self.assertEqual(
+            len(parse_graph(URI, SAMPLE_RDF, format="xml", limit=2)), 2)
+        with self.assertRaises(GraphSizeLimitExceeded):
+            parse_graph(URI, SAMPLE_RDF, format="xml", limit=1)
+
+    def test_limit_is_lifted_after_parsing(self):
+        graph = parse_graph(URI, SAMPLE_RDF, format="xml", limit=2)
+        graph.add((URIRef(URI), RDFS.label, Literal("third triple")))
+        self.assertEqual(len(graph), 3)
+
+
+class ParsePoolTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ParsePool(processes=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_parse_graph(self):
+        graph = parse_graph(URI, SAMPLE_RDF, format="xml")
+        for data in [SAMPLE_RDF, io.BytesIO(SAMPLE_RDF)]:
+            pooled = self.pool.parse_graph(URI, data, format="xml")
+            self.assertTrue(compare.isomorphic(graph, pooled))
+            self.assertEqual(dict(graph.namespace_manager.namespaces()),
+                             dict(pooled.namespace_manager.namespaces()))
+            self.assertEqual([c.identifier for c in pooled.contexts()],
+                             [URIRef(URI)])
+
+    def test_errors(self):
+        with self.assertRaises(GraphSizeLimitExceeded):
+            self.pool.parse_graph(URI, SAMPLE_RDF, format="xml", limit=1)
+        with self.assertRaises(rdflib.exceptions.ParserError):
+            self.pool.parse_graph(URI, b"<rdf:RDF", format="xml")
+
+    def test_origin_GET(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        origin = Origin.objects.create(URI, BACKEND=MemoryBackend(SAMPLE_RDF))
+        origin.GET(parse_pool=self.pool)
+        me = Resource.objects.get(uri=URI + "#me")
+        self.assertEqual(me.foaf_name, Literal("Max Mustermann"))
+
+
+class GraphCacheTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = GraphCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_graph(self):
+        graph = parse_graph(URI, SAMPLE_RDF, format="xml")
+        for data in [SAMPLE_RDF, io.BytesIO(SAMPLE_RDF)]:
+            cached = self.cache.parse_graph(URI, data, format="xml")
+            self.assertTrue(compare.isomorphic(graph, cached))
+            self.assertEqual(dict(graph.namespace_manager.namespaces()),
+                             dict(cached.namespace_manager.namespaces()))
+            self.assertEqual([c.identifier for c in cached.contexts()],
+                             [URIRef(URI)])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_includes_format_and_uri(self):
+        self.cache.parse_graph(URI, SAMPLE_RDF, format="xml")
+        graph = self.cache.parse_graph(URI + "/copy", SAMPLE_RDF,
+                                       format="xml")
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertIn(URIRef(URI + "/copy#me"), graph.subjects())
+
+        GraphCache(self.directory).parse_graph(URI, SAMPLE_RDF, format="xml")
+        with self.assertRaises(rdflib.exceptions.ParserError):
+            self.cache.parse_graph(URI, SAMPLE_RDF, format="nt")
+
+    def test_array_bytes(self):
+        values = array.array(str("i"), [0, 1, -1, 2 ** 31 - 1])
+        data = array_to_bytes(values)
+        self.assertEqual(len(data), 4 * values.itemsize)
+        self.assertEqual(array_from_bytes("i", data), values)
+
+    def test_limit(self):
+        self.cache.parse_graph(URI, SAMPLE_RDF, format="xml")
+        with self.assertRaises(GraphSizeLimitExceeded):
+            self.cache.parse_graph(URI, SAMPLE_RDF, format="xml", limit=1)
+
+    def test_broken_file_is_parsed_again(self):
+        self.cache.parse_graph(URI, SAMPLE_RDF, format="xml")
+        path = self.cache._path(URI, SAMPLE_RDF, "xml")
+        with open(path, "wb") as f:
+            f.write(b"broken")
+        graph = self.cache.parse_graph(URI, SAMPLE_RDF, format="xml")
+        self.assertEqual(len(graph), 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_origin_GET(self):
+        for i in range(2):
+            Origin.objects.reset_store()
+            Resource.objects.reset_store()
+            origin = Origin.objects.create(
+                URI, BACKEND=MemoryBackend(SAMPLE_RDF))
+            origin.GET(graph_cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        me = Resource.objects.get(uri=URI + "#me")
+        self.assertEqual(me.foaf_name, Literal("Max Mustermann"))
+
+
+class SizeLimitedReaderTestCase(TestCase):
+    def test_read(self):
+        self.assertEqual(
+            SizeLimitedReader(io.BytesIO(b"12345"), 5).read(), b"12345")
+        with self.assertRaises(ResponseSizeLimitExceeded):
+            SizeLimitedReader(io.BytesIO(b"123456"), 5).read()
+
+        reader = SizeLimitedReader(io.BytesIO(b"123456"), 5)
+        self.assertEqual(reader.read(3), b"123")
+        with self.assertRaises(ResponseSizeLimitExceeded):
+            reader.read(3)
+
+
+class OriginGETLimitsTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+
+    def test_graph_size_limit(self):
+        origin = Origin.objects.create(URI, BACKEND=MemoryBackend(SAMPLE_RDF))
+        origin.GET(GRAPH_SIZE_LIMIT=1)
+        self.assertTrue(origin.processed)
+        self.assertFalse(hasattr(origin, "_graph"))
+        self.assertEqual(len(Resource.objects.all()), 0)
+
+    def test_content_length_is_checked_before_download(self):
+        server = LocalServer().start()
+        try:
+            origin = Origin.objects.create(server.serve_rdf("/foaf"),
+                                           BACKEND=RestBackend())
+            origin.GET(BYTE_SIZE_LIMIT=10, raise_errors=False)
+            self.assertEqual(origin.errors, ["ResponseSizeLimitExceeded"])
+
+            origin.GET(BYTE_SIZE_LIMIT=len(SAMPLE_RDF))
+            self.assertTrue(origin.processed)
+        finally:
+            server.stop()
@@ -2,7 +2,10 @@ from unittest import TestCase
 
 import datetime
 
+import rdflib
+
 from ldtools.backends import MemoryBackend
+from ldtools.helpers import graph_fingerprint
 from ldtools.origin import Origin
 from ldtools.resource import Resource
 
@@ -54,3 +57,125 @@ class GraphHandlerTestCase(TestCase):
         # delete all resources and regenerate
 
         Origin.objects.post_create_hook = old_post_create_hook
+
+    def test_recrawl_changed_graph(self):
+        self._setUpScenario()
+        fingerprint = self.origin._graph_fingerprint
+
+        self.origin.backend.data = self.origin.backend.data.replace(
+            "Max", "Moritz")
+        self.origin.GET()
+
+        self.assertNotEqual(self.origin._graph_fingerprint, fingerprint)
+        me = Resource.objects.get(uri="http://example.com/foaf#me")
+        self.assertEqual(me.foaf_name, rdflib.Literal("Moritz Mustermann"))
+
+
+class GraphFingerprintTestCase(TestCase):
+    def _graph(self, data):
+        graph = rdflib.Graph()
+        graph.parse(data=data, format="turtle")
+        return graph
+
+    def test_order_independent(self):
+        graph1 = self._graph("<http://a.org/s> <http://a.org/p> 1, 2 .")
+        graph2 = self._graph("<http://a.org/s> <http://a.org/p> 2, 1 .")
+        graph3 = self._graph("<http://a.org/s> <http://a.org/p> 1, 3 .")
+        self.assertEqual(graph_fingerprint(graph1), graph_fingerprint(graph2))
+        self.assertNotEqual(graph_fingerprint(graph1),
+                            graph_fingerprint(graph3))
+
+    def test_blank_nodes(self):
+        data = "<http://a.org/s> <http://a.org/p> [ <http://a.org/q> 1 ] ."
+        graph1 = self._graph(data)
+        graph2 = self._graph(data)
+        self.assertNotEqual(set(graph1), set(graph2))
+        self.assertEqual(graph_fingerprint(graph1), graph_fingerprint(graph2))
+        self.assertNotEqual(
+            graph_fingerprint(graph1),
+            graph_fingerprint(self._graph(data.replace("1", "2"))))
+
+
+class IncrementalRecrawlTestCase(TestCase):
+    DATA = '''<rdf:RDF
+      xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+      xmlns:foaf="http://xmlns.com/foaf/0.1/">
+    <foaf:Person rdf:about="#me">
+        <foaf:name>Max Mustermann</foaf:name>
+        <foaf:knows rdf:resource="#friend"/>
+    </foaf:Person>
+    <foaf:Person rdf:about="#friend">
+        <foaf:name>Erika Mustermann</foaf:name>
+    </foaf:Person></rdf:RDF>'''
+
+    def setUp(self):
+        Resource.objects.reset_store()
+        Origin.objects.reset_store()
+        self.origin = Origin.objects.create(
+            uri="http://example.com/foaf", BACKEND=MemoryBackend(self.DATA))
+        self.origin.GET(only_follow_uris=[])
+        self.me = Resource.objects.get(uri="http://example.com/foaf#me")
+        self.friend = Resource.objects.get(
+            uri="http://example.com/foaf#friend")
+
+    def test_changed_literal(self):
+        self.origin.backend.data = self.DATA.replace("Max", "Moritz")
+        self.origin.GET(incremental=True)
+
+        me = Resource.objects.get(uri="http://example.com/foaf#me")
+        self.assertIs(me, self.me)
+        self.assertEqual(me.foaf_name, rdflib.Literal("Moritz Mustermann"))
+        self.assertEqual(
+            list(Resource.objects.filter(
+                foaf_name=rdflib.Literal("Max Mustermann"))), [])
+        self.assertFalse(self.origin.has_unsaved_changes())
+
+    def test_changed_only_statement(self):
+        data = '<http://example.com/a> <http://xmlns.com/foaf/0.1/name> "A" .'
+        origin = Origin.objects.create(
+            uri="http://example.com/a", BACKEND=MemoryBackend(data, "nt"))
+        origin.GET(only_follow_uris=[])
+        a = Resource.objects.get(uri="http://example.com/a")
+
+        origin.backend.data = data.replace('"A"', '"A2"')
+        origin.GET(incremental=True)
+
+        self.assertIs(Resource.objects.get(uri="http://example.com/a"), a)
+        self.assertEqual(a.foaf_name, rdflib.Literal("A2"))
+
+    def test_removed_resource(self):
+        self.origin.backend.data = self.DATA.replace(
+            '<foaf:knows rdf:resource="#friend"/>', '').replace(
+            '<foaf:name>Erika Mustermann</foaf:name>', '')
+        self.origin.GET(incremental=True)
+
+        self.assertIs(
+            Resource.objects.get(uri="http://example.com/foaf#me"), self.me)
+        self.assertFalse(hasattr(self.me, "foaf_knows"))
+        # the friend is only left with its rdf:type
+        self.assertEqual(self.friend._reverse, {})
+        self.assertIn(self.friend, self.origin.get_resources())
+
+        self.origin.backend.data = self.DATA.replace(
+            '<foaf:knows rdf:resource="#friend"/>', '').replace(
+            '''<foaf:Person rdf:about="#friend">
+        <foaf:name>Erika Mustermann</foaf:name>
+    </foaf:Person>''', '')
+        self.origin.GET(incremental=True)
+        self.assertNotIn(self.friend, self.origin.get_resources())
+
+    def test_result_equals_full_rebuild(self):
+        data = self.DATA.replace("Max", "Moritz").replace(
+            '<foaf:knows rdf:resource="#friend"/>',
+            '<foaf:knows rdf:resource="#friend2"/>')
+        self.origin.backend.data = data
+        self.origin.GET(incremental=True)
+        graph = self.origin.get_graph()
+
+        Resource.objects.reset_store()
+        Origin.objects.reset_store()
+        origin = Origin.objects.create(
+            uri="http://example.com/foaf", BACKEND=MemoryBackend(data))
+        origin.GET(only_follow_uris=[])
+
+        self.assertEqual(set(graph), set(origin.get_graph()))
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from unittest import TestCase
 
-from rdflib import Literal, BNode, URIRef
+from rdflib import Graph, Literal, BNode, URIRef
 
 from ldtools.backends import MemoryBackend
 from ldtools.origin import Origin
@@ -177,3 +177,195 @@ class ResourceSave(TestCase):
 
         # test
         self.assert_(not res._has_changes)
+
+
+class ResourceBulkGetOrCreate(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.origin = Origin.objects.create("http://example.org/resource",
+                                            BACKEND=MemoryBackend())
+        self.origin.GET()
+
+    def test_bulk_get_or_create(self):
+        existing = Resource.objects.create("http://example.org/resource#a",
+                                           origin=self.origin)
+        uris = [URIRef("http://example.org/resource#a"),
+                URIRef("http://example.org/resource#b"),
+                BNode()]
+        resources = Resource.objects.bulk_get_or_create(uris,
+                                                        origin=self.origin)
+        self.assertEqual(set(resources.keys()), set(uris))
+        self.assertIs(resources[uris[0]], existing)
+        self.assertEqual(len(Resource.objects.all()), 3)
+        self.assertEqual(
+            list(Resource.objects.filter(_uri=uris[1])), [resources[uris[1]]])
+
+
+class ResourcePropertyStorage(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.origin = Origin.objects.create("http://example.org/foaf",
+                                            BACKEND=MemoryBackend(DATA_XML))
+        self.origin.GET()
+        self.daniel = Resource.objects.get("http://example.org/foaf#daniel")
+        self.document = Resource.objects.get("http://example.org/foaf")
+
+    def test_attribute_api(self):
+        self.assertEqual(self.daniel.foaf_name, Literal("Daniel Rech"))
+        self.assertEqual(
+            set(r._uri for r in self.daniel.rdf_type),
+            set([URIRef("http://xmlns.com/foaf/0.1/Person"),
+                 URIRef("http://www.w3.org/2000/10/swap/pim/contact#Male")]))
+        self.assertFalse(hasattr(self.daniel, "foaf_nick"))
+        self.assertRaises(AttributeError, getattr, self.daniel, "foaf_nick")
+
+    def test_set_and_delete(self):
+        self.daniel.foaf_nick = set([Literal("dr"), Literal("daniel")])
+        self.assertEqual(self.daniel.foaf_nick,
+                         set([Literal("dr"), Literal("daniel")]))
+        self.daniel.foaf_nick = Literal("dr")
+        self.assertEqual(self.daniel.foaf_nick, Literal("dr"))
+        self.assertTrue(self.origin.has_unsaved_changes())
+
+        del self.daniel.foaf_nick
+        self.assertFalse(hasattr(self.daniel, "foaf_nick"))
+        self.assertRaises(AttributeError, delattr, self.daniel, "foaf_nick")
+
+    def test_many_values(self):
+        nicks = set(Literal("nick%s" % i) for i in range(20))
+        for nick in nicks:
+            self.daniel._set_property("foaf_nick", nick)
+            self.daniel._set_property("foaf_nick", nick)
+        self.assertEqual(self.daniel.foaf_nick, nicks)
+        self.assertEqual(set(Resource.objects.filter(foaf_nick=Literal("nick3"))),
+                         set([self.daniel]))
+
+        for nick in sorted(nicks)[1:]:
+            self.daniel._remove_property("foaf_nick", nick)
+        self.assertEqual(self.daniel.foaf_nick, sorted(nicks)[0])
+
+    def test_values_cannot_be_changed_in_place(self):
+        self.daniel.foaf_nick = set([Literal("dr"), Literal("daniel")])
+        self.assertRaises(AttributeError,
+                          lambda: self.daniel.foaf_nick.add(Literal("d")))
+        self.daniel.foaf_nick = self.daniel.foaf_nick | set([Literal("d")])
+        self.assertEqual(len(self.daniel.foaf_nick), 3)
+
+    def test_duplicate_values_are_ignored(self):
+        self.daniel._set_property("foaf_name", Literal("Daniel Rech"))
+        self.assertEqual(self.daniel.foaf_name, Literal("Daniel Rech"))
+
+    def test_reverse(self):
+        self.assertEqual(self.daniel._reverse,
+                         {"foaf_primaryTopic": self.document})
+        self.document.foaf_primaryTopic = Literal("nobody")
+        self.assertEqual(self.daniel._reverse, {})
+
+    def test_properties(self):
+        self.assertEqual(self.daniel.get_properties()["foaf_name"],
+                         Literal("Daniel Rech"))
+        self.assertEqual(self.daniel.as_dict()["_uri"], self.daniel._uri)
+        self.assertEqual(
+            set(Resource.objects.filter_has_key("foaf_name")),
+            set([self.daniel]))
+
+
+class LazyResources(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.origin = Origin.objects.create("http://example.org/foaf",
+                                            BACKEND=MemoryBackend(DATA_XML))
+        self.origin.GET(lazy=True, only_follow_uris=None)
+
+    def tearDown(self):
+        Resource.objects.reset_store()
+
+    def test_resources_are_built_on_access(self):
+        self.assertEqual(Resource.objects._storage, {})
+        # discovered Origins are created nevertheless
+        Origin.objects.get("http://creativecommons.org/licenses/by-nc/3.0/")
+
+        daniel = Resource.objects.get("http://example.org/foaf#daniel")
+        self.assertIs(daniel._lazy, True)
+        self.assertEqual(daniel.foaf_name, Literal("Daniel Rech"))
+        self.assertIs(daniel._lazy, False)
+        self.assertIs(
+            Resource.objects.get("http://example.org/foaf#daniel"), daniel)
+        self.assertIs(Resource.objects.get(
+            "http://example.org/foaf#daniel", origin=self.origin), daniel)
+        self.assertRaises(Resource.DoesNotExist, Resource.objects.get,
+                          "http://example.org/foaf#nobody")
+
+    def test_same_resources_as_eager_origin(self):
+        lazy_graph = set(self.origin.get_graph())
+        self.assertEqual(len(lazy_graph), 7)
+        self.assertEqual(len(list(self.origin.get_resources())), 6)
+
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        origin = Origin.objects.create("http://example.org/foaf",
+                                       BACKEND=MemoryBackend(DATA_XML))
+        origin.GET()
+        self.assertEqual(set(origin.get_graph()), lazy_graph)
+
+    def test_reverse(self):
+        daniel = Resource.objects.get("http://example.org/foaf#daniel")
+        document = Resource.objects.get("http://example.org/foaf")
+        self.assertEqual(daniel._reverse, {"foaf_primaryTopic": document})
+
+    def test_changes(self):
+        daniel = Resource.objects.get("http://example.org/foaf#daniel")
+        daniel.foaf_nick = Literal("dr")
+        self.assertEqual(self.origin.get_changes(), (
+            set([(daniel._uri, URIRef("http://xmlns.com/foaf/0.1/nick"),
+                  Literal("dr"))]),
+            set()))
+        self.assertIn((daniel._uri, URIRef("http://xmlns.com/foaf/0.1/nick"),
+                       Literal("dr")), set(self.origin.get_graph()))
+        self.origin.PUT()
+        self.assertFalse(self.origin.has_unsaved_changes())
+
+    def test_deleted_resources_are_not_saved(self):
+        uri = URIRef("http://example.org/foaf#daniel")
+        Resource.objects.get(uri).delete()
+        self.assertRaises(Resource.DoesNotExist, Resource.objects.get, uri)
+        self.assertNotIn(uri, [triple[0] for triple in self.origin.get_graph()])
+
+        # without PATCH the whole graph is written
+        self.origin.backend.supports_patch = False
+        self.origin.PUT()
+        graph = Graph().parse(data=self.origin.backend.data, format="xml")
+        self.assertEqual(len(graph), len(self.origin._graph))
+        self.assertNotIn((uri, None, None), graph)
+
+    def test_clean_views_are_evicted(self):
+        Resource.objects.max_views = 2
+        try:
+            daniel = Resource.objects.get("http://example.org/foaf#daniel")
+            daniel.foaf_nick = Literal("dr")
+            document = Resource.objects.get("http://example.org/foaf")
+            resources = list(Resource.objects.all())
+        finally:
+            del Resource.objects.max_views
+        self.assertEqual(len(resources), 6)
+        # the changed view stays in the store
+        self.assertEqual(len(Resource.objects._storage), 2)
+        self.assertIn(daniel.pk, Resource.objects._storage)
+        # evicted views are the same objects while they are referenced
+        self.assertIs(Resource.objects.get("http://example.org/foaf"),
+                      document)
+
+    def test_changed_graph_discards_views(self):
+        daniel = Resource.objects.get("http://example.org/foaf#daniel")
+        self.assertEqual(daniel.foaf_name, Literal("Daniel Rech"))
+        self.assertFalse(self.origin.has_unsaved_changes())
+
+        self.origin.backend.data = DATA_XML.replace("Daniel Rech", "D. Rech")
+        self.origin.GET()
+        self.assertEqual(Resource.objects._storage, {})
+        self.assertEqual(
+            Resource.objects.get("http://example.org/foaf#daniel").foaf_name,
+            Literal("D. Rech"))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import rdflib
+from rdflib import BNode, Literal, URIRef, RDF, XSD
+
+from ldtools import serializers
+from ldtools.backends import FileBackend, MemoryBackend, RestBackend
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+
+from tests.httpserver import LocalServer, SAMPLE_RDF
+
+
+EX = rdflib.Namespace("http://example.org/ns#")
+FOAF = rdflib.Namespace("http://xmlns.com/foaf/0.1/")
+
+TRIPLES = [
+    (EX.me, RDF.type, FOAF.Person),
+    (EX.me, FOAF.name, Literal("Max \"Max\"\nMustermann")),
+    (EX.me, FOAF.name, Literal(u"Mäx", lang="de")),
+    (EX.me, FOAF.age, Literal(42)),
+    (EX.me, FOAF.birthday, Literal("1970-01-01", datatype=XSD.date)),
+    (EX.me, FOAF.knows, BNode("friend")),
+    (BNode("friend"), FOAF.homepage, URIRef("http://example.org/a?b=c")),
+    (EX.other, URIRef("http://example.org/ns#1st"), EX["with.dot"]),
+]
+
+
+def parse(data, format):
+    graph = rdflib.Graph()
+    graph.parse(data=data, format=format)
+    return graph
+
+
+class SerializeTestCase(TestCase):
+    def assertRoundTrip(self, format):
+        data = b"".join(serializers.serialize(
+            TRIPLES, format, namespaces={"ex": EX, "foaf": FOAF}))
+        graph = parse(data, format)
+        expected = rdflib.Graph()
+        for triple in TRIPLES:
+            expected.add(triple)
+        self.assertTrue(rdflib.compare.isomorphic(graph, expected))
+        return data
+
+    def test_ntriples(self):
+        data = self.assertRoundTrip("nt")
+        self.assertEqual(len(data.splitlines()), len(TRIPLES))
+
+    def test_turtle(self):
+        data = self.assertRoundTrip("turtle")
+        self.assertIn(b"foaf:Person", data)
+        self.assertIn(b"<http://example.org/ns#1st>", data)
+
+    def test_n3(self):
+        self.assertRoundTrip("n3")
+
+    def test_chunks(self):
+        chunks = list(serializers.serialize(TRIPLES * 100, "nt",
+                                            chunk_size=1024))
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all(len(chunk) < 2048 for chunk in chunks))
+
+    def test_write(self):
+        stream = io.BytesIO()
+        serializers.write(TRIPLES, stream, "nt")
+        self.assertEqual(len(parse(stream.getvalue(), "nt")), len(TRIPLES))
+
+    def test_unsupported_format(self):
+        self.assertRaises(ValueError, list,
+                          serializers.serialize(TRIPLES, "xml"))
+
+
+class OriginPUTStreamTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.uri = "http://example.org/foaf"
+        self.data = rdflib.Graph().parse(
+            data=SAMPLE_RDF, format="xml", publicID=self.uri).serialize(
+            format="nt", encoding="utf-8")
+
+    def modify(self, origin):
+        me = Resource.objects.get(uri=self.uri + "#me")
+        me.foaf_name = Literal("Moritz Mustermann")
+        self.assertTrue(origin.has_unsaved_changes())
+
+    def assertPUT(self, data, origin):
+        self.assertFalse(origin.has_unsaved_changes())
+        graph = parse(data, "nt")
+        self.assertEqual(set(graph), set(origin.get_graph()))
+        self.assertIn(Literal("Moritz Mustermann"),
+                      set(graph.objects(None, FOAF.name)))
+
+    def test_iter_triples(self):
+        origin = Origin.objects.create(
+            self.uri, BACKEND=MemoryBackend(self.data, format="nt"))
+        origin.GET()
+        self.assertEqual(set(origin.iter_triples()), set(origin._graph))
+
+    def test_memory_backend(self):
+        origin = Origin.objects.create(
+            self.uri, BACKEND=MemoryBackend(self.data, format="nt"))
+        origin.backend.supports_patch = False
+        origin.GET()
+        self.modify(origin)
+        origin.PUT()
+        self.assertIsInstance(origin.backend.data, bytes)
+        self.assertPUT(origin.backend.data, origin)
+
+    def test_file_backend(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "foaf.nt")
+            with open(filename, "wb") as f:
+                f.write(self.data)
+            origin = Origin.objects.create(
+                self.uri, BACKEND=FileBackend(filename,
+                                              store_old_versions=False))
+            origin.backend.supports_patch = False
+            origin.GET()
+            self.modify(origin)
+            origin.PUT()
+            with open(filename, "rb") as f:
+                self.assertPUT(f.read(), origin)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_rest_backend_chunked(self):
+        server = LocalServer().start()
+        try:
+            uri = server.serve_rdf(
+                "/foaf", body=self.data,
+                headers={"Content-Type": "application/n-triples"})
+            origin = Origin.objects.create(uri, BACKEND=RestBackend())
+            origin.GET()
+            self.modify(origin)
+            origin.PUT()
+
+            method, path, headers, body = server.requests[-1]
+            self.assertEqual((method, path), ("PUT", "/foaf"))
+            self.assertEqual(headers.get("Transfer-Encoding"), "chunked")
+            self.assertNotIn("Content-Length", headers)
+            self.assertPUT(body, origin)
+        finally:
+            server.stop()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from rdflib import BNode, Literal, URIRef
+
+from ldtools.backends import MemoryBackend
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+from ldtools.snapshot import SnapshotError
+
+from tests.test_resource import DATA_XML
+
+
+URI = "http://example.org/foaf"
+
+
+class SnapshotTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "crawl.snapshot")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def crawl(self, **kwargs):
+        origin = Origin.objects.create(URI, BACKEND=MemoryBackend(DATA_XML))
+        origin.GET(only_follow_uris=None, **kwargs)
+        return origin
+
+    def save_and_load(self):
+        Origin.objects.save_snapshot(self.path)
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        Origin.objects.load_snapshot(self.path)
+        return Origin.objects.get(URI)
+
+    def test_origins_and_resources(self):
+        origin = self.crawl()
+        origin.graph_parse_time = None
+        graph = set(origin._graph)
+        namespaces = origin.get_namespaces()
+        origins = set(o.uri for o in Origin.objects.all())
+
+        origin = self.save_and_load()
+        self.assertTrue(origin.processed)
+        self.assertEqual(set(origin._graph), graph)
+        self.assertEqual(set(origin.get_graph()), graph)
+        self.assertEqual(origin.get_namespaces(), namespaces)
+        self.assertEqual(set(o.uri for o in Origin.objects.all()), origins)
+        self.assertIsNone(origin.graph_parse_time)
+        self.assertFalse(origin.has_unsaved_changes())
+
+        daniel = Resource.objects.get(URI + "#daniel")
+        self.assertEqual(daniel.foaf_name, Literal("Daniel Rech"))
+        self.assertEqual(daniel._reverse,
+                         {"foaf_primaryTopic": Resource.objects.get(URI)})
+
+        # nothing changed, the next GET is no update
+        resources = set(origin.get_resources())
+        origin.GET()
+        self.assertEqual(set(origin.get_resources()), resources)
+
+    def test_unsaved_changes(self):
+        self.crawl()
+        daniel = Resource.objects.get(URI + "#daniel")
+        daniel.foaf_name = Literal("D. Rech", lang="de")
+        daniel.foaf_knows = BNode()
+        Resource.objects.create(URI + "#new", origin=daniel._origin)
+        changes = daniel._origin.get_changes()
+
+        origin = self.save_and_load()
+        self.assertTrue(origin.has_unsaved_changes())
+        daniel = Resource.objects.get(URI + "#daniel")
+        self.assertEqual(daniel.foaf_name, Literal("D. Rech", lang="de"))
+        self.assertIsInstance(daniel.foaf_knows, Resource)
+        Resource.objects.get(URI + "#new")
+        self.assertEqual(set(triple[:2] for triple in origin.get_changes()[0]),
+                         set(triple[:2] for triple in changes[0]))
+        self.assertEqual(origin.get_changes()[1], changes[1])
+
+    def test_deleted_resources(self):
+        origin = self.crawl()
+        Resource.objects.get(URI).delete()
+        changes = origin.get_changes()
+        self.assertTrue(changes[1])
+
+        origin = self.save_and_load()
+        self.assertEqual(origin.get_changes(), changes)
+        self.assertRaises(Resource.DoesNotExist, Resource.objects.get, URI)
+
+    def test_lazy_origin(self):
+        self.crawl(lazy=True)
+        daniel = Resource.objects.get(URI + "#daniel")
+        daniel.foaf_nick = Literal("dr")
+
+        origin = self.save_and_load()
+        self.assertTrue(Resource.objects.is_lazy(origin))
+        self.assertEqual(origin.get_changes(), (
+            set([(URIRef(URI + "#daniel"),
+                  URIRef("http://xmlns.com/foaf/0.1/nick"), Literal("dr"))]),
+            set()))
+        self.assertEqual(
+            Resource.objects.get(URI).foaf_primaryTopic.foaf_nick,
+            Literal("dr"))
+
+    def test_load_as_lazy_origins(self):
+        graph = set(self.crawl().get_graph())
+        Origin.objects.save_snapshot(self.path)
+        Origin.objects.load_snapshot(self.path, lazy=True)
+        origin = Origin.objects.get(URI)
+        self.assertTrue(Resource.objects.is_lazy(origin))
+        self.assertEqual(Resource.objects.get_loaded(origin), [])
+        self.assertEqual(set(origin.get_graph()), graph)
+
+    def test_load_changed_resources_as_lazy_origins(self):
+        origin = self.crawl()
+        Resource.objects.get(URI + "#daniel").foaf_nick = Literal("dr")
+        Resource.objects.create(URI + "#new", origin=origin)
+        graph = set(origin.get_graph())
+        Origin.objects.save_snapshot(self.path)
+        Origin.objects.load_snapshot(self.path, lazy=True)
+
+        # unchanged Resources are built from the graph when accessed
+        stored = set(resource._uri
+                     for resource in Resource.objects._storage.values())
+        self.assertIn(URIRef(URI + "#daniel"), stored)
+        self.assertIn(URIRef(URI + "#new"), stored)
+        self.assertNotIn(URIRef(URI), stored)
+        origin = Origin.objects.get(URI)
+        self.assertEqual(set(origin.get_graph()), graph)
+        self.assertEqual(Resource.objects.get(URI + "#daniel").foaf_nick,
+                         Literal("dr"))
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"no snapshot")
+        self.assertRaises(SnapshotError, Origin.objects.load_snapshot,
+                          self.path)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import gc
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from rdflib import Literal
+
+from ldtools.backends import MemoryBackend
+from ldtools.metamodels import MemoryStorage
+from ldtools.origin import Origin
+from ldtools.resource import Resource
+from ldtools.storage import SQLiteStorage, open_sqlite
+
+from tests.test_resource import DATA_XML
+
+
+URI = "http://example.org/foaf"
+
+
+class SQLiteStorageTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "crawl.db")
+        self.restart()
+        self.origin = Origin.objects.create(URI,
+                                            BACKEND=MemoryBackend(DATA_XML))
+        self.origin.GET()
+
+    def tearDown(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+        shutil.rmtree(self.directory)
+
+    def restart(self, cache_size=10000):
+        for manager in [Origin.objects, Resource.objects]:
+            manager.flush()
+            if isinstance(manager._storage, SQLiteStorage):
+                manager._storage.close()
+            manager.reset_store()
+        self.origin = None
+        gc.collect()
+        open_sqlite(self.path, cache_size=cache_size)
+
+    def test_objects_survive_restart(self):
+        graph = set(self.origin.get_graph())
+        self.restart()
+
+        self.assertEqual(len(Resource.objects.all()), 6)
+        origin = Origin.objects.get(URI)
+        self.assertTrue(origin.processed)
+        self.assertEqual(set(origin.get_graph()), graph)
+
+        daniel = Resource.objects.get(URI + "#daniel")
+        self.assertEqual(daniel.foaf_name, Literal("Daniel Rech"))
+        self.assertIs(daniel._origin, origin)
+        self.assertIs(Resource.objects.get(URI + "#daniel", origin=origin),
+                      daniel)
+        self.assertEqual(daniel._reverse,
+                         {"foaf_primaryTopic": Resource.objects.get(URI)})
+
+    def test_changes_are_stored(self):
+        daniel = Resource.objects.get(URI + "#daniel")
+        daniel.foaf_nick = Literal("dr")
+        Resource.objects.get(URI).delete()
+        self.restart()
+
+        daniel = Resource.objects.get(URI + "#daniel")
+        self.assertEqual(daniel.foaf_nick, Literal("dr"))
+        self.assertTrue(Origin.objects.get(URI).has_unsaved_changes())
+        self.assertRaises(Resource.DoesNotExist, Resource.objects.get, URI)
+
+    def test_evicted_objects_are_reloaded(self):
+        self.restart(cache_size=1)
+        daniel = Resource.objects.get(URI + "#daniel")
+        document = Resource.objects.get(URI)
+        self.assertEqual(document.dc_title, Literal("Daniel Rech's FOAF file"))
+        # daniel was evicted, its state is loaded again on access
+        self.assertEqual(type(daniel).__name__, "GhostResource")
+        self.assertEqual(daniel.foaf_name, Literal("Daniel Rech"))
+        self.assertIs(type(daniel), Resource)
+        self.assertIs(document.foaf_primaryTopic, daniel)
+        self.assertIs(Resource.objects.get(URI + "#daniel"), daniel)
+
+    def test_changes_survive_eviction(self):
+        count = 40
+        for cache_size in (1, 8):
+            self.restart(cache_size=cache_size)
+            uri = URI + "/ring%s" % cache_size
+            origin = Origin.objects.create(uri, BACKEND=MemoryBackend())
+            origin.GET()
+            people = [Resource.objects.create("%s#%s" % (uri, i),
+                                              origin=origin)
+                      for i in range(count)]
+            for step in (1, 2):
+                for i, person in enumerate(people):
+                    person.foaf_knows = people[(i + step) % count]
+                    person.foaf_name = Literal("Person %s" % i)
+            self.assertTrue(any(type(person).__name__ == "GhostResource"
+                                for person in people))
+            knows = set((person._uri, person.foaf_knows._uri)
+                        for person in people)
+            self.assertEqual(knows, set(
+                (people[i]._uri, people[(i + 2) % count]._uri)
+                for i in range(count)))
+            self.assertEqual(len(set(origin.get_graph())), 2 * count)
+
+        origin.add_error("first")
+        Origin.objects.flush()
+        origin.add_error("second")
+        self.restart()
+        origin = Origin.objects.get(uri)
+        self.assertEqual(origin.errors, ["first", "second"])
+        self.assertEqual(len(set(origin.get_graph())), 2 * count)
+
+    def test_state_is_read_once(self):
+        self.restart()
+        storage = Resource.objects._storage
+        statements = []
+        storage._connection.set_trace_callback(statements.append)
+        pk = Resource.objects.get_pk(URI, URI + "#daniel")
+
+        self.assertIn(pk, storage)
+        self.assertNotIn("nothing", storage)
+        self.assertFalse(any("SELECT state" in s for s in statements))
+
+        Resource.objects.get(URI + "#daniel")
+        self.assertEqual(
+            len([s for s in statements if "SELECT state" in s]), 1)
+
+    def test_processed_origins_are_not_fetched_again(self):
+        self.restart()
+        origin = Origin.objects.get(URI)
+        origin.backend.data = DATA_XML.replace("Daniel Rech", "D. Rech")
+        Origin.objects.GET_all()
+        self.assertEqual(Resource.objects.get(URI + "#daniel").foaf_name,
+                         Literal("Daniel Rech"))
+
+    def test_reset_store(self):
+        Resource.objects.reset_store()
+        self.assertIsInstance(Resource.objects._storage, MemoryStorage)
+        self.assertEqual(len(Resource.objects.all()), 0)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from rdflib import BNode, Literal, URIRef, XSD
+
+from ldtools.backends import MemoryBackend
+from ldtools.origin import Origin
+from ldtools.parsing import parse_graph
+from ldtools.resource import Resource
+from ldtools.terms import TermDictionary, terms
+
+from tests.httpserver import SAMPLE_RDF
+
+
+class TermDictionaryTestCase(TestCase):
+    def test_intern(self):
+        dictionary = TermDictionary()
+        uri = dictionary.intern(URIRef("http://example.org/"))
+        self.assertIs(dictionary.intern(URIRef("http://example.org/")), uri)
+        self.assertEqual(len(dictionary), 1)
+
+        for value in [BNode("b"), 1, "http://example.org/"]:
+            self.assertIs(dictionary.intern(value), value)
+        self.assertEqual(len(dictionary), 1)
+
+    def test_distinct_terms(self):
+        dictionary = TermDictionary()
+        values = [
+            URIRef("http://example.org/1"),
+            Literal("http://example.org/1"),
+            Literal("1", datatype=XSD.integer),
+            Literal("1", lang="de"),
+            Literal("1"),
+        ]
+        ids = [dictionary.get_id(value) for value in values]
+        self.assertEqual(ids, list(range(len(values))))
+        for term_id, value in zip(ids, values):
+            self.assertIs(dictionary.get_term(term_id), value)
+            self.assertEqual(dictionary.get_id(value), term_id)
+
+
+class InterningTestCase(TestCase):
+    def setUp(self):
+        Origin.objects.reset_store()
+        Resource.objects.reset_store()
+
+    def GET(self):
+        origin = Origin.objects.create("http://example.org/foaf",
+                                       BACKEND=MemoryBackend(SAMPLE_RDF))
+        origin.GET()
+        return origin
+
+    def test_only_accepted_graphs_are_interned(self):
+        graph = parse_graph("http://example.org/foaf", SAMPLE_RDF, "xml")
+        self.assertEqual(len(terms), 0)
+
+        origin = self.GET()
+        self.assertTrue(len(terms) > 0)
+        for triple in origin._graph:
+            for term in triple:
+                self.assertIs(terms.intern(term), term)
+
+        # later graphs share the terms
+        graph = parse_graph("http://example.org/foaf", SAMPLE_RDF, "xml")
+        for triple1, triple2 in zip(sorted(origin._graph), sorted(graph)):
+            for term1, term2 in zip(triple1, triple2):
+                self.assertIs(term1, term2)
+
+    def test_resources_share_terms_with_graph(self):
+        origin = self.GET()
+        me = Resource.objects.get(uri="http://example.org/foaf#me")
+        name, = origin._graph.objects(
+            me._uri, URIRef("http://xmlns.com/foaf/0.1/name"))
+        self.assertIs(me.foaf_name, name)
+        self.assertIs(me._uri, terms.intern(URIRef(me._uri)))
+
+    def test_reset_store_clears_terms(self):
+        self.GET()
+        Resource.objects.reset_store()
+        self.assertEqual(len(terms), 0)
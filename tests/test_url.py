@@ -3,6 +3,8 @@ from unittest import TestCase
 import rdflib
 
 from ldtools.utils import (
+    canonicalize_url,
+    get_parsed_uri,
     is_valid_url,
     get_rdflib_uriref,
     UriNotValid,
@@ -54,6 +56,31 @@ class HashToSlashUriTestCase(TestCase):
             result = rdflib.URIRef(result)
             self.assertEqual(get_slash_url(test), result, msg=test)
 
+    def test_literal_is_not_converted(self):
+        self.assertRaises(UriNotValid, get_slash_url,
+                          rdflib.Literal("http://a.com/#b"))
+
+
+class CanonicalizeUrlTestCase(TestCase):
+    def test_canonicalize_url(self):
+        test_cases = [
+            "http://www.ifrade.es/#frade",
+            "https://a.com/path?query=bla#frag",
+            rdflib.URIRef("http://creativecommons.org/licenses/by-nc/3.0/"),
+        ]
+        for test in test_cases:
+            self.assertEqual(canonicalize_url(test),
+                             rdflib.URIRef(get_parsed_uri(test)), msg=test)
+            self.assertIsInstance(canonicalize_url(test), rdflib.URIRef)
+
+    def test_non_http_urls(self):
+        for test in ["mailto:max@example.org", "tel:+49123", "htp://a.com"]:
+            self.assertIsNone(canonicalize_url(test), msg=test)
+
+    def test_results_are_memoized(self):
+        uri = "http://memoized.example.org/#me"
+        self.assertIs(canonicalize_url(uri), canonicalize_url(uri))
+
 
 class GetRdflibUrirefTestCase(TestCase):
     def test_get_rdflib_uriref_exceptions(self):